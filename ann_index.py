@@ -0,0 +1,246 @@
+# ann_index.py
+"""
+Índice aproximado de vizinhos mais próximos (ANN) para corpora grandes, apenas com numpy.
+
+IVF (inverted file): um k-means esférico divide os trechos em `nlist` listas; na consulta,
+apenas as `nprobe` listas cujos centróides são mais similares à consulta são avaliadas.
+O índice é gravado com os trechos já reordenados por lista, de modo que cada lista é uma
+fatia contígua de embeddings.npy (sem cópia dos vetores e com leitura sequencial do memmap).
+
+Opcionalmente (IVF-PQ), os vetores também são codificados por quantização de produto:
+`pq_m` subespaços com 256 centróides cada (1 byte por subespaço e por trecho). As listas
+visitadas são pontuadas pelos códigos (tabela de produtos internos por subespaço) e apenas
+os melhores candidatos são reavaliados com os embeddings exatos.
+
+Arquivos (no diretório do índice): ivf_centroids.npy, ivf_offsets.npy e, com PQ,
+pq_codebooks.npy e pq_codes.npy. Os parâmetros ficam em manifest["ann"].
+"""
+import os
+
+import numpy as np
+
+ANN_NONE = "none"
+ANN_IVF = "ivf"
+ANN_IVFPQ = "ivfpq"
+ANN_AUTO = "auto"
+ANN_TYPES = (ANN_AUTO, ANN_NONE, ANN_IVF, ANN_IVFPQ)
+
+# Abaixo disso a busca exata é rápida o bastante e "auto" não constrói o índice aproximado
+ANN_MIN_CHUNKS = 20000
+
+CENTROIDS_FILE = "ivf_centroids.npy"
+LIST_OFFSETS_FILE = "ivf_offsets.npy"
+PQ_CODEBOOKS_FILE = "pq_codebooks.npy"
+PQ_CODES_FILE = "pq_codes.npy"
+
+PQ_CENTROIDS = 256
+PQ_RERANK_FACTOR = 10
+KMEANS_ITERATIONS = 15
+KMEANS_MAX_TRAINING_POINTS = 100000
+# Pontos de treino por centróide (amostra maior não melhora as listas de forma perceptível)
+KMEANS_POINTS_PER_CENTROID = 64
+ASSIGN_BLOCK_ROWS = 8192
+
+
+def default_nlist(n):
+    """Número de listas proporcional a sqrt(n), a heurística usual para IVF."""
+    return int(max(1, min(n, round(4 * np.sqrt(n)))))
+
+
+def default_nprobe(nlist):
+    """Listas visitadas por consulta: ~1/16 das listas, no mínimo 8."""
+    return int(min(nlist, max(8, nlist // 16)))
+
+
+def default_pq_m(dim):
+    """Maior número de subespaços (até dim / 8) que divide a dimensão."""
+    for m in range(max(1, dim // 8), 0, -1):
+        if dim % m == 0:
+            return m
+    return 1
+
+
+def _assign(data, centroids, spherical):
+    """Centróide mais próximo de cada linha, calculado em blocos para limitar a memória."""
+    labels = np.empty(len(data), dtype=np.int32)
+    centroid_norms = None if spherical else (centroids * centroids).sum(axis=1)
+    for start in range(0, len(data), ASSIGN_BLOCK_ROWS):
+        block = np.asarray(data[start:start + ASSIGN_BLOCK_ROWS], dtype=np.float32)
+        products = block @ centroids.T
+        if spherical:
+            labels[start:start + len(block)] = products.argmax(axis=1)
+        else:
+            # ||x - c||^2 = ||x||^2 - 2 x.c + ||c||^2; ||x||^2 é constante por linha
+            labels[start:start + len(block)] = (centroid_norms - 2 * products).argmin(axis=1)
+    return labels
+
+
+def kmeans(data, k, iterations=KMEANS_ITERATIONS, seed=0, spherical=False, max_training_points=KMEANS_MAX_TRAINING_POINTS):
+    """
+    k-means (Lloyd) sobre uma amostra de até `max_training_points` linhas (e no máximo
+    KMEANS_POINTS_PER_CENTROID pontos por centróide).
+    Com `spherical=True` a atribuição usa o produto interno e os centróides são normalizados (L2).
+    Centróides que ficam vazios são reiniciados em pontos aleatórios da amostra.
+    Retorna a matriz de centróides (k x dim, float32).
+    """
+    rng = np.random.default_rng(seed)
+    n = len(data)
+    max_training_points = min(max_training_points, KMEANS_POINTS_PER_CENTROID * k)
+    sample_ids = np.sort(rng.choice(n, max_training_points, replace=False)) if n > max_training_points else np.arange(n)
+    sample = np.asarray(data[sample_ids], dtype=np.float32)
+    k = min(k, len(sample))
+    centroids = sample[rng.choice(len(sample), k, replace=False)].copy()
+
+    for _ in range(iterations):
+        labels = _assign(sample, centroids, spherical)
+        counts = np.bincount(labels, minlength=k)
+        # Soma por centróide com a amostra ordenada por rótulo (bem mais rápido que np.add.at)
+        order = np.argsort(labels, kind='stable')
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        empty = counts == 0
+        sums = np.zeros_like(centroids)
+        sums[~empty] = np.add.reduceat(sample[order], starts[~empty], axis=0)
+        centroids = (sums / np.maximum(counts, 1)[:, None]).astype(np.float32)
+        if empty.any():
+            centroids[empty] = sample[rng.choice(len(sample), int(empty.sum()), replace=False)]
+        if spherical:
+            norms = np.linalg.norm(centroids, axis=1)
+            centroids /= np.where(norms > 0, norms, 1)[:, None]
+    return centroids.astype(np.float32, copy=False)
+
+
+class IVFIndex:
+    """
+    Índice IVF (opcionalmente IVF-PQ) sobre uma matriz de embeddings normalizados já
+    reordenada por lista: a lista i ocupa as linhas offsets[i]:offsets[i + 1].
+    """
+
+    def __init__(self, centroids, offsets, pq_codebooks=None, pq_codes=None, nprobe=None):
+        self.centroids = centroids
+        self.offsets = offsets
+        self.pq_codebooks = pq_codebooks
+        self.pq_codes = pq_codes
+        self.nprobe = nprobe or default_nprobe(self.nlist)
+
+    @property
+    def nlist(self):
+        return len(self.centroids)
+
+    @property
+    def kind(self):
+        return ANN_IVFPQ if self.pq_codebooks is not None else ANN_IVF
+
+    def manifest(self):
+        info = {"type": self.kind, "nlist": self.nlist, "nprobe": self.nprobe}
+        if self.pq_codebooks is not None:
+            info["pq_m"] = int(self.pq_codebooks.shape[0])
+        return info
+
+    def probe_lists(self, query_vector, nprobe):
+        """Listas cujos centróides são mais similares à consulta, em ordem crescente (leitura sequencial do memmap)."""
+        nprobe = min(nprobe, self.nlist)
+        if nprobe >= self.nlist:
+            return np.arange(self.nlist)
+        centroid_scores = self.centroids @ query_vector
+        return np.sort(np.argpartition(-centroid_scores, nprobe - 1)[:nprobe])
+
+    def _pq_scores(self, query_vector, rows):
+        m, _, dsub = self.pq_codebooks.shape
+        # tabela[j, c] = produto interno do subvetor j da consulta com o centróide c do subespaço j
+        table = np.einsum('jcd,jd->jc', self.pq_codebooks, query_vector.reshape(m, dsub))
+        codes = np.asarray(self.pq_codes[rows])
+        return table[np.arange(m), codes].sum(axis=1)
+
+    def search(self, embeddings, query_vector, candidates, nprobe=None, rerank_factor=PQ_RERANK_FACTOR):
+        """
+        Retorna (ids, scores) dos até `candidates` trechos mais similares entre as listas visitadas,
+        em ordem decrescente de similaridade exata. Com PQ, os `candidates * rerank_factor` melhores
+        pelos códigos são reavaliados com os embeddings exatos.
+        """
+        ranges = [(int(self.offsets[i]), int(self.offsets[i + 1])) for i in self.probe_lists(query_vector, nprobe or self.nprobe)]
+        ranges = [(start, end) for start, end in ranges if end > start]
+        if not ranges:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        rows = np.concatenate([np.arange(start, end) for start, end in ranges])
+
+        if self.pq_codes is not None and len(rows) > candidates * rerank_factor:
+            approx = self._pq_scores(query_vector, rows)
+            keep = np.argpartition(-approx, candidates * rerank_factor - 1)[:candidates * rerank_factor]
+            rows = np.sort(rows[keep])
+            scores = np.asarray(embeddings[rows]) @ query_vector
+        else:
+            # Cada lista é uma fatia contígua da matriz
+            scores = np.concatenate([np.asarray(embeddings[start:end]) @ query_vector for start, end in ranges])
+
+        if len(rows) > candidates:
+            top = np.argpartition(-scores, candidates - 1)[:candidates]
+            rows, scores = rows[top], scores[top]
+        order = np.argsort(-scores, kind='stable')
+        return rows[order], scores[order]
+
+    def save(self, index_dir):
+        """Grava os arquivos do índice em `index_dir` (o diretório de uma geração ainda não publicada)."""
+        arrays = {CENTROIDS_FILE: self.centroids, LIST_OFFSETS_FILE: self.offsets}
+        if self.pq_codebooks is not None:
+            arrays[PQ_CODEBOOKS_FILE] = self.pq_codebooks
+            arrays[PQ_CODES_FILE] = self.pq_codes
+        for name, array in arrays.items():
+            with open(os.path.join(index_dir, name), 'wb') as f:
+                np.save(f, array)
+        return list(arrays)
+
+
+def train_product_quantizer(matrix, m, seed=0):
+    """Treina os codebooks (m x 256 x dim/m) e codifica a matriz (n x m, uint8)."""
+    n, dim = matrix.shape
+    if dim % m:
+        raise ValueError(f"pq_m ({m}) deve dividir a dimensão dos embeddings ({dim}).")
+    dsub = dim // m
+    k = min(PQ_CENTROIDS, n)
+    codebooks = np.zeros((m, PQ_CENTROIDS, dsub), dtype=np.float32)
+    codes = np.empty((n, m), dtype=np.uint8)
+    for j in range(m):
+        sub = matrix[:, j * dsub:(j + 1) * dsub]
+        codebooks[j, :k] = kmeans(sub, k, seed=seed + j)
+        codes[:, j] = _assign(sub, codebooks[j, :k], spherical=False)
+    return codebooks, codes
+
+
+def build_ivf(matrix, kind=ANN_IVF, nlist=None, pq_m=None, nprobe=None, seed=0):
+    """
+    Constrói o índice para a matriz de embeddings normalizados (n x dim).
+    Retorna (ordem, índice): `ordem` é a permutação das linhas que agrupa os trechos por lista;
+    a matriz (e tudo alinhado a ela) deve ser gravada nessa ordem.
+    """
+    n, dim = matrix.shape
+    nlist = min(nlist or default_nlist(n), n)
+    centroids = kmeans(matrix, nlist, seed=seed, spherical=True)
+    labels = _assign(matrix, centroids, spherical=True)
+    order = np.argsort(labels, kind='stable')
+    offsets = np.zeros(nlist + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum(np.bincount(labels, minlength=nlist))
+
+    pq_codebooks = pq_codes = None
+    if kind == ANN_IVFPQ:
+        pq_codebooks, pq_codes = train_product_quantizer(matrix[order], pq_m or default_pq_m(dim), seed=seed)
+    return order, IVFIndex(centroids, offsets, pq_codebooks, pq_codes, nprobe)
+
+
+def resolve_ann_kind(kind, n):
+    """Tipo efetivo do índice: "auto" só constrói IVF a partir de ANN_MIN_CHUNKS trechos."""
+    if kind == ANN_AUTO:
+        return ANN_IVF if n >= ANN_MIN_CHUNKS else ANN_NONE
+    if kind not in ANN_TYPES:
+        raise ValueError(f"Tipo de índice aproximado desconhecido: {kind}. Opções: {', '.join(ANN_TYPES)}.")
+    return kind
+
+
+def load_ivf(index_dir, info):
+    """Abre o índice descrito em manifest["ann"] (códigos PQ mapeados em memória)."""
+    centroids = np.load(os.path.join(index_dir, CENTROIDS_FILE))
+    offsets = np.load(os.path.join(index_dir, LIST_OFFSETS_FILE))
+    pq_codebooks = pq_codes = None
+    if info.get("type") == ANN_IVFPQ:
+        pq_codebooks = np.load(os.path.join(index_dir, PQ_CODEBOOKS_FILE))
+        pq_codes = np.load(os.path.join(index_dir, PQ_CODES_FILE), mmap_mode='r')
+    return IVFIndex(centroids, offsets, pq_codebooks, pq_codes, info.get("nprobe"))
@@ -1,14 +1,27 @@
 # app.py (Versão final com separação de templates e arquivos estáticos)
 import os
 import json
-from flask import Flask, request, jsonify, render_template # Adicionado render_template
+from flask import Flask, request, jsonify, render_template, Response, stream_with_context, g # Adicionado render_template
 import google.generativeai as genai
-import numpy as np
 from dotenv import load_dotenv
-from scipy.spatial.distance import cosine
 import re
 import logging
+import hmac
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import closing
+from coverage_audit import STATUS_ERROR, STATUS_OK, parse_topics, topic_from_item, unique_topics
+from doc_index import MANIFEST_FILE, DocumentIndex, load_index
+from hybrid_search import RETRIEVAL_LEXICAL, HybridRetriever
+from index_reload import IndexSnapshot, IndexWatcher, file_fingerprint, manifest_version, resolve_index_dir
+from embedding_pipeline import DEFAULT_BATCH_SIZE, RateLimiter, embed_texts
+from lexical_index import LEXICAL_MANIFEST_FILE, lexical_index_exists, load_lexical_index
+from metrics import INDEX_DOCS, INDEX_INFO, REGISTRY, clear_request, current_timer, observe_request, observe_stage, record_tokens, stage, start_request, timed
+from prompt_context import DEFAULT_CONTEXT_TOKEN_BUDGET, build_context
+from query_cache import QueryEmbeddingCache, ResponseCache, analysis_cache_key
+from text_cleaning import content_hash, estimate_tokens
+from upstream import OPERATION_EMBED, OPERATION_GENERATE, CircuitOpenError, UpstreamBusy, UpstreamClient
 
 # --- Configuração de Logging ---
 logging.basicConfig(level=logging.INFO,
@@ -35,22 +48,148 @@ genai.configure(api_key=GOOGLE_API_KEY)
 EMBEDDING_MODEL = "models/embedding-001"
 GENERATIVE_MODEL = "models/gemini-1.5-pro-latest" # Ou "models/gemini-pro" se preferir
 
-# Variável global para armazenar os dados carregados
-PROCESSED_DOCS = []
+# Cache de embeddings das consultas (LRU + TTL em memória; SQLite opcional, compartilhado entre workers)
+QUERY_EMBEDDING_CACHE = QueryEmbeddingCache(
+    maxsize=int(os.getenv("QUERY_CACHE_SIZE", "1024")),
+    ttl=int(os.getenv("QUERY_CACHE_TTL", "86400")),
+    sqlite_path=os.getenv("QUERY_CACHE_DB") or None,
+)
+
+# Cache das respostas do modelo generativo (consulta + documentos recuperados + modelo + temperatura)
+ANALYSIS_CACHE = ResponseCache(
+    maxsize=int(os.getenv("ANALYSIS_CACHE_SIZE", "256")),
+    ttl=int(os.getenv("ANALYSIS_CACHE_TTL", "86400")),
+)
+
+# Orçamento (tokens estimados) do contexto de documentação enviado no prompt de análise
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", str(DEFAULT_CONTEXT_TOKEN_BUDGET)))
+
+# Diretório do índice binário (gerado por generate-embedings.py ou convertido com doc_index.py)
+INDEX_DIR = os.getenv("DOCS_INDEX_DIR", "processed_index")
+LEGACY_JSON_PATH = 'processed_docs.json'
+# Listas visitadas por consulta no índice aproximado (vazio: padrão gravado no índice)
+ANN_NPROBE = int(os.getenv("ANN_NPROBE", "0")) or None
+
+# Índice lexical BM25 (gerado por extract_data_from_markdown.py); se existir, a busca é híbrida
+LEXICAL_INDEX_DIR = os.getenv("LEXICAL_INDEX_DIR", "lexical_index")
+# Timeout (s) do embedding da consulta e tempo (s) sem chamar a API de embeddings depois que o
+# circuit breaker abre; nesse intervalo as consultas são respondidas pela busca lexical, se houver
+QUERY_EMBED_TIMEOUT = float(os.getenv("QUERY_EMBED_TIMEOUT", "5"))
+EMBEDDING_OUTAGE_COOLDOWN = float(os.getenv("EMBEDDING_OUTAGE_COOLDOWN", "30"))
+
+# Camada compartilhada de chamadas ao Gemini (upstream.py): chamadas simultâneas por processo
+# (ASYNC_MAX_INFLIGHT para o pipeline ASGI), espera máxima (s) por uma vaga (0 = sem limite),
+# falhas seguidas que abrem o circuit breaker e tempo (s) até testar de novo o modelo generativo
+UPSTREAM_MAX_INFLIGHT = int(os.getenv("UPSTREAM_MAX_INFLIGHT", "32"))
+UPSTREAM_QUEUE_TIMEOUT = float(os.getenv("UPSTREAM_QUEUE_TIMEOUT", "30"))
+UPSTREAM_BREAKER_FAILURES = int(os.getenv("UPSTREAM_BREAKER_FAILURES", "3"))
+GENERATION_BREAKER_RESET = float(os.getenv("GENERATION_BREAKER_RESET", "30"))
+UPSTREAM = UpstreamClient(
+    genai, EMBEDDING_MODEL, GENERATIVE_MODEL,
+    max_inflight=UPSTREAM_MAX_INFLIGHT,
+    async_max_inflight=int(os.getenv("ASYNC_MAX_INFLIGHT", str(UPSTREAM_MAX_INFLIGHT))),
+    queue_timeout=UPSTREAM_QUEUE_TIMEOUT or None,
+    failure_threshold=UPSTREAM_BREAKER_FAILURES,
+    embed_reset_timeout=EMBEDDING_OUTAGE_COOLDOWN,
+    generate_reset_timeout=GENERATION_BREAKER_RESET,
+)
+
+# Auditoria em lote (/analyze_coverage/batch): máximo de tópicos por requisição e de chamadas simultâneas ao modelo
+BATCH_MAX_TOPICS = int(os.getenv("BATCH_MAX_TOPICS", "1000"))
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "8"))
+# Tópicos recuperados de uma vez antes de enviar as análises (limita a memória dos scores do lote)
+BATCH_RETRIEVAL_SIZE = 256
+
+# Verificação periódica (s) de um novo índice em disco para recarga sem reiniciar os workers (0 desativa)
+INDEX_RELOAD_INTERVAL = float(os.getenv("INDEX_RELOAD_INTERVAL", "30"))
+# Token da rota POST /admin/reload_index; sem ele, a rota fica desativada (403)
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+# Requisições mais demoradas que isso (s) são registradas no log com o id e o tempo de cada etapa
+SLOW_REQUEST_SECONDS = float(os.getenv("SLOW_REQUEST_SECONDS", "10"))
+
+# Índice ativo (IndexSnapshot: índice vetorial mapeado em memória + recuperação híbrida + versão).
+# É substituído por inteiro, com uma única atribuição, quando um novo índice é carregado; cada
+# requisição lê a referência uma vez e usa o mesmo snapshot até o fim.
+SNAPSHOT = None
+_reload_lock = threading.Lock()
+_watcher_lock = threading.Lock()
+_index_watcher = None
+_index_watcher_pid = None
+
+def active_index_paths():
+    """Manifests das gerações ativas (ver index_reload.py): (índice vetorial, ou o JSON legado se não houver; índice lexical)."""
+    vector_path = os.path.join(resolve_index_dir(INDEX_DIR), MANIFEST_FILE)
+    if not os.path.exists(vector_path):
+        vector_path = LEGACY_JSON_PATH
+    return vector_path, os.path.join(resolve_index_dir(LEXICAL_INDEX_DIR), LEXICAL_MANIFEST_FILE)
+
+def index_fingerprint():
+    """Caminho (que inclui a versão da geração) e mtime/tamanho dos manifests ativos: muda a cada publicação de um índice."""
+    return file_fingerprint(active_index_paths())
+
+def load_snapshot():
+    """
+    Carrega o índice da documentação processada (trechos dos documentos com seus embeddings) em um novo IndexSnapshot.
+    Usa o índice binário mapeado em memória quando existir; caso contrário, lê o processed_docs.json legado.
+    O índice lexical (BM25), se existir, é carregado junto para a busca híbrida.
+    Exceções de leitura são propagadas.
+    """
+    # As gerações são resolvidas uma única vez: todos os arquivos lidos pertencem às gerações do fingerprint
+    fingerprint = index_fingerprint()
+    (vector_path, _, _), (lexical_path, _, _) = fingerprint
+    if vector_path != LEGACY_JSON_PATH:
+        source = os.path.dirname(vector_path)
+        doc_index = load_index(source)
+        version = manifest_version(doc_index.manifest, vector_path)
+        ann_info = doc_index.manifest.get("ann")
+        search_mode = f"busca aproximada {ann_info['type']} com {ann_info['nlist']} listas" if ann_info else "busca exata"
+        logging.info(f"Carregado índice binário '{source}' (versão {version}) com {len(doc_index)} documentos, {doc_index.chunk_count} trechos (dimensão {doc_index.dim}, {search_mode}).")
+    else:
+        with open(LEGACY_JSON_PATH, 'r', encoding='utf-8') as f:
+            processed_docs = json.load(f)
+        doc_index = DocumentIndex.from_docs(processed_docs)
+        version = manifest_version({}, LEGACY_JSON_PATH)
+        source = LEGACY_JSON_PATH
+        logging.warning(f"Índice binário '{INDEX_DIR}' não encontrado; usando '{LEGACY_JSON_PATH}'. Converta com 'python doc_index.py {LEGACY_JSON_PATH} {INDEX_DIR}'.")
+        logging.info(f"Carregados {len(processed_docs)} documentos indexados da documentação ({doc_index.chunk_count} com embedding válido).")
+    lexical_index = load_lexical(os.path.dirname(lexical_path))
+    lexical_version = manifest_version(lexical_index.manifest, lexical_path) if lexical_index else None
+    return IndexSnapshot(doc_index, HybridRetriever(doc_index, lexical_index), version, lexical_version, source, fingerprint)
+
+def reload_documentation(force=False):
+    """
+    Carrega o índice em disco e o coloca em uso, se ele mudou desde o snapshot ativo (ou se `force`).
+    O carregamento acontece fora do caminho das requisições, que continuam usando o snapshot
+    anterior até a troca. Retorna (recarregado, snapshot_ativo); exceções de leitura são
+    propagadas e o snapshot ativo é mantido.
+    """
+    global SNAPSHOT
+    with _reload_lock:
+        if not force and SNAPSHOT is not None and index_fingerprint() == SNAPSHOT.fingerprint:
+            return False, SNAPSHOT
+        snapshot = load_snapshot()
+        if index_fingerprint() != snapshot.fingerprint:
+            # Um novo índice foi publicado durante o carregamento (ou, no formato sem gerações, regravado):
+            # carrega a versão nova na próxima verificação em vez de ativar uma que já ficou para trás
+            raise RuntimeError("O índice foi alterado durante o carregamento; nova tentativa na próxima verificação.")
+        previous = SNAPSHOT
+        SNAPSHOT = snapshot
+    if previous is not None:
+        logging.info(f"Índice da documentação recarregado: versão {previous.version} -> {snapshot.version} "
+                     f"(índice lexical {previous.lexical_version} -> {snapshot.lexical_version}).")
+    return True, snapshot
 
 def load_documentation():
     """
-    Carrega a documentação processada (documentos completos com embeddings de título/resumo).
+    Carregamento inicial do índice da documentação (ver load_snapshot).
     Retorna True se o carregamento for bem-sucedido, False caso contrário.
     """
-    global PROCESSED_DOCS
     try:
-        with open('processed_docs.json', 'r', encoding='utf-8') as f:
-            PROCESSED_DOCS = json.load(f)
-        logging.info(f"Carregados {len(PROCESSED_DOCS)} documentos indexados da documentação.")
+        reload_documentation(force=True)
         return True
     except FileNotFoundError:
-        logging.error("Arquivo 'processed_docs.json' não encontrado. Por favor, execute 'generate_embeddings.py' primeiro.")
+        logging.error(f"Índice '{INDEX_DIR}' e arquivo '{LEGACY_JSON_PATH}' não encontrados. Por favor, execute 'generate-embedings.py' primeiro.")
         return False
     except json.JSONDecodeError as e:
         logging.error(f"Erro ao decodificar JSON do arquivo de documentação: {e}")
@@ -59,48 +198,242 @@ def load_documentation():
         logging.error(f"Erro inesperado ao carregar documentação: {e}")
         return False
 
+def start_index_watcher():
+    """
+    Inicia (uma vez por processo) a verificação periódica de um novo índice em disco.
+    Chamada na primeira requisição, e não na importação, para funcionar também com workers
+    criados por fork (gunicorn --preload), em que threads do processo pai não existem.
+    """
+    global _index_watcher, _index_watcher_pid
+    if INDEX_RELOAD_INTERVAL <= 0 or _index_watcher_pid == os.getpid():
+        return
+    with _watcher_lock:
+        if _index_watcher_pid != os.getpid():
+            _index_watcher = IndexWatcher(reload_documentation, INDEX_RELOAD_INTERVAL).start()
+            _index_watcher_pid = os.getpid()
+
+def documentation_loaded(snapshot=None):
+    snapshot = snapshot or SNAPSHOT
+    return snapshot is not None and len(snapshot) > 0
+
+def load_lexical(index_dir):
+    """Carrega o índice BM25 de `index_dir`, se existir. Retorna None caso contrário (busca só vetorial)."""
+    if not lexical_index_exists(index_dir):
+        logging.info(f"Índice lexical '{index_dir}' não encontrado; busca apenas vetorial.")
+        return None
+    try:
+        lexical_index = load_lexical_index(index_dir)
+        logging.info(f"Carregado índice lexical '{index_dir}' com {len(lexical_index)} documentos e {lexical_index.manifest['term_count']} termos (busca híbrida).")
+        return lexical_index
+    except Exception as e:
+        logging.error(f"Erro ao carregar o índice lexical '{index_dir}': {e}; busca apenas vetorial.")
+        return None
+
+def lexical_fallback_available(snapshot=None):
+    snapshot = snapshot or SNAPSHOT
+    return snapshot is not None and snapshot.retriever.has_lexical
+
+def embedding_available():
+    """False enquanto o circuit breaker dos embeddings está aberto (por EMBEDDING_OUTAGE_COOLDOWN após falhas seguidas)."""
+    return not UPSTREAM.breakers[OPERATION_EMBED].is_open()
+
 def generate_embedding(text):
-    """Gera um embedding para o texto fornecido."""
+    """Gera um embedding para o texto fornecido (chamadas simultâneas com o mesmo texto são coalescidas)."""
     try:
-        response = genai.embed_content(model=EMBEDDING_MODEL, content=text)
-        return response['embedding']
+        return UPSTREAM.embed(text, timeout=QUERY_EMBED_TIMEOUT)
+    except (CircuitOpenError, UpstreamBusy) as e:
+        logging.warning(f"Embedding não solicitado para '{text[:50]}': {e}")
+        return None
     except Exception as e:
         logging.error(f"Erro ao gerar embedding para o texto (primeiros 50 caracteres: '{text[:50]}'): {e}", exc_info=True)
         return None
 
-def get_relevant_documents(query_embedding, top_k=5):
+@timed("embedding")
+def get_query_embedding(query):
+    """
+    Embedding da consulta, reaproveitado do cache quando a consulta normalizada já foi vista.
+    Durante uma indisponibilidade da API de embeddings, apenas o cache é consultado.
+    """
+    compute_fn = generate_embedding if embedding_available() else (lambda _: None)
+    return QUERY_EMBEDDING_CACHE.get_or_compute(query, compute_fn, namespace=EMBEDDING_MODEL)
+
+@timed("retrieval")
+def get_relevant_documents(query_embedding, top_k=5, query=None, snapshot=None):
     """
     Encontra os documentos mais relevantes com base na similaridade de cosseno
-    entre o embedding da pergunta e o embedding de título/resumo de cada documento.
-    Retorna uma lista de tuplas: (similaridade, doc_info).
+    entre o embedding da pergunta e o embedding de cada trecho indexado; os trechos
+    são agrupados por documento. Com índice lexical e `query`, funde o ranking vetorial
+    com o BM25 (reciprocal rank fusion).
+    Usa `snapshot` (ou o snapshot ativo) do índice.
+    Retorna uma lista de tuplas: (similaridade, doc_info), com os trechos em doc_info["passages"].
     """
-    similarities = []
-    for doc_info in PROCESSED_DOCS:
-        doc_embedding = np.array(doc_info.get("embedding"))
-        
-        if doc_embedding is not None and len(doc_embedding) > 0 and len(query_embedding) == len(doc_embedding):
-            try:
-                similarity = 1 - cosine(query_embedding, doc_embedding)
-                similarities.append((similarity, doc_info))
-            except ValueError as e:
-                logging.warning(f"Erro ao calcular similaridade para documento '{doc_info.get('title', 'N/A')}': {e}. Verifique as dimensões dos embeddings.")
-        else:
-            logging.warning(f"Documento '{doc_info.get('title', 'N/A')}' com embedding inválido ou incompatível. Pulando.")
-    
-    similarities.sort(key=lambda x: x[0], reverse=True)
-    
-    return similarities[:top_k]
-
-def analyze_coverage_with_context(query, relevant_docs_with_similarity):
+    snapshot = snapshot or SNAPSHOT
+    if snapshot is None:
+        return []
+    return snapshot.retriever.search(query, query_embedding, top_k=top_k, nprobe=ANN_NPROBE)
+
+@timed("retrieval")
+def get_lexical_documents(query, top_k=5, snapshot=None):
+    """Busca apenas lexical (BM25), sem embedding da consulta. Mesmo formato de get_relevant_documents."""
+    snapshot = snapshot or SNAPSHOT
+    if snapshot is None:
+        return []
+    return snapshot.retriever.search_lexical(query, top_k=top_k)
+
+def retrieval_info(mode, fallback, snapshot):
+    return {"mode": mode, "fallback": fallback, "index_version": snapshot.version if snapshot else None}
+
+def retrieve_documents(query, top_k=5, lexical_only=False):
     """
-    Analisa a cobertura da documentação para uma query/tópico e sugere lacunas,
-    usando os documentos completos como contexto para a análise.
-    Retorna um dicionário com a resposta do modelo e informações dos documentos relevantes.
+    Recupera os documentos para a consulta: busca híbrida (ou vetorial) quando há embedding e,
+    se o embedding falhar ou a API estiver indisponível, busca apenas lexical. Toda a recuperação
+    usa o snapshot do índice ativo no início da chamada.
+    Retorna (documentos, informacoes_da_recuperacao), ou (None, None) se não houver como recuperar.
     """
-    if not PROCESSED_DOCS:
-        return {"response_text": "A documentação não foi carregada. Por favor, verifique a inicialização da aplicação.", "relevant_docs_info": []}
+    snapshot = SNAPSHOT
+    if not lexical_only:
+        query_embedding = get_query_embedding(query)
+        if query_embedding is not None:
+            return get_relevant_documents(query_embedding, top_k, query, snapshot), retrieval_info(snapshot.retriever.mode if snapshot else None, False, snapshot)
+    if not lexical_fallback_available(snapshot):
+        return None, None
+    if not lexical_only:
+        logging.warning(f"Embedding da consulta indisponível; usando busca lexical para: '{query[:70]}'")
+    return get_lexical_documents(query, top_k, snapshot), retrieval_info(RETRIEVAL_LEXICAL, not lexical_only, snapshot)
 
-    relevant_docs_info = []
+@timed("embedding_batch")
+def embed_queries_batch(queries, batch_size=DEFAULT_BATCH_SIZE, concurrency=2):
+    """
+    Embeddings de várias consultas: as que estão no cache são reaproveitadas e as demais
+    (sem repetição) são geradas em lotes de `batch_size` por chamada à API.
+    Retorna uma lista alinhada a `queries` (None para as que falharam).
+    """
+    embeddings = [QUERY_EMBEDDING_CACHE.get(query, namespace=EMBEDDING_MODEL) for query in queries]
+    missing = {}
+    for i, query in enumerate(queries):
+        if embeddings[i] is None:
+            missing.setdefault(QUERY_EMBEDDING_CACHE.make_key(query), []).append(i)
+    if not missing or not embedding_available():
+        return embeddings
+
+    positions = list(missing.values())
+    vectors, stats = embed_texts([queries[indexes[0]] for indexes in positions], UPSTREAM.embed_batch,
+                                 batch_size=batch_size, concurrency=concurrency, max_retries=2)
+    for indexes, vector in zip(positions, vectors):
+        if vector is None:
+            continue
+        QUERY_EMBEDDING_CACHE.set(queries[indexes[0]], vector, namespace=EMBEDDING_MODEL)
+        for i in indexes:
+            embeddings[i] = vector
+    logging.info(f"Embeddings de {len(queries)} consultas em lote: {len(queries) - sum(len(indexes) for indexes in positions)} do cache, "
+                 f"{stats['embedded']} geradas em {stats['requests']} requisições, {stats['failed']} falhas ({stats['elapsed_s']}s)")
+    return embeddings
+
+def retrieve_documents_batch(queries, top_k=5, lexical_only=False, embed_batch_size=None, snapshot=None):
+    """
+    Versão em lote de retrieve_documents: embeddings em lotes e ranking vetorial de todas as
+    consultas com produtos matriz-matriz (busca exata, sem o índice aproximado).
+    Retorna uma lista alinhada a `queries` de tuplas (documentos, informacoes_da_recuperacao).
+    """
+    snapshot = snapshot or SNAPSHOT
+    if snapshot is None:
+        return [(None, None)] * len(queries)
+    if lexical_only:
+        if not lexical_fallback_available(snapshot):
+            return [(None, None)] * len(queries)
+        return [(get_lexical_documents(query, top_k, snapshot), retrieval_info(RETRIEVAL_LEXICAL, False, snapshot)) for query in queries]
+    embeddings = embed_queries_batch(queries, batch_size=embed_batch_size or DEFAULT_BATCH_SIZE)
+    with stage("retrieval_batch"):
+        results = snapshot.retriever.search_batch(queries, embeddings, top_k=top_k)
+    return [(docs, retrieval_info(info["mode"], info["fallback"], snapshot) if info else None) for docs, info in results]
+
+def analyze_topic(topic, relevant_docs_with_similarity, retrieval, use_cache=True, limiter=None):
+    """Análise de cobertura de um tópico da auditoria em lote; retorna o resultado (uma linha do JSONL)."""
+    started = time.monotonic()
+    result = {"id": topic["id"], "query": topic["query"], "retrieval": retrieval}
+    if relevant_docs_with_similarity is None:
+        result.update(status=STATUS_ERROR, error="Não foi possível gerar o embedding para a consulta.", elapsed_s=0.0)
+        return result
+    coverage_request = build_coverage_request(topic["query"], relevant_docs_with_similarity)
+    result.update(relevant_docs_info=coverage_request["relevant_docs_info"], context=coverage_request["context"])
+    try:
+        response_text, cache_hit = generate_text_cached(coverage_request["prompt"], coverage_request["temperature"],
+                                                        coverage_request["cache_key"], use_cache, limiter)
+        result.update(status=STATUS_OK, response_text=coverage_request["response_prefix"] + response_text, cache_hit=cache_hit)
+    except Exception as e:
+        logging.error(f"Erro ao gerar análise de cobertura (lote) para '{topic['query'][:70]}': {e}", exc_info=True)
+        result.update(status=STATUS_ERROR, error=coverage_request["error_text"])
+    result["elapsed_s"] = round(time.monotonic() - started, 3)
+    return result
+
+def iter_coverage_audit(topics, concurrency=4, qps=None, tpm=None, use_cache=True, top_k=5, lexical_only=False, embed_batch_size=None):
+    """
+    Auditoria de cobertura de uma lista de tópicos ({"id", "query"}). A recuperação é feita em
+    lotes de BATCH_RETRIEVAL_SIZE tópicos e as análises de cada lote rodam com até `concurrency`
+    chamadas simultâneas ao modelo (limitadas também por `qps` e `tpm`, se informados).
+    Todos os tópicos usam o snapshot do índice ativo no início da auditoria.
+    Gera os resultados na ordem em que terminam. Se o consumidor parar antes do fim (cliente
+    desconectado, Ctrl-C), as análises ainda não iniciadas são canceladas.
+    """
+    snapshot = SNAPSHOT
+    limiter = RateLimiter(qps=qps, tpm=tpm) if qps or tpm else None
+    executor = ThreadPoolExecutor(max_workers=max(1, concurrency))
+    try:
+        for start in range(0, len(topics), BATCH_RETRIEVAL_SIZE):
+            group = topics[start:start + BATCH_RETRIEVAL_SIZE]
+            retrieved = retrieve_documents_batch([topic["query"] for topic in group], top_k, lexical_only, embed_batch_size, snapshot)
+            futures = [executor.submit(analyze_topic, topic, docs, retrieval, use_cache, limiter)
+                       for topic, (docs, retrieval) in zip(group, retrieved)]
+            for future in as_completed(futures):
+                yield future.result()
+    except BaseException:
+        # GeneratorExit/KeyboardInterrupt: não espera (nem paga) as gerações que ninguém vai ler
+        executor.shutdown(wait=False, cancel_futures=True)
+        raise
+    executor.shutdown()
+
+def doc_fingerprint(doc, context_text):
+    """Identificador do documento + hash do texto enviado ao modelo (usado na chave do cache de análises)."""
+    return [doc.get('filepath', doc.get('slug')), content_hash(f"{doc.get('title')}\n{doc.get('slug')}\n{context_text}")]
+
+def generate_text_cached(prompt, temperature, cache_key, use_cache=True, limiter=None):
+    """
+    Gera o texto do modelo para o prompt, reaproveitando o cache de análises quando possível.
+    Com `limiter` (RateLimiter), aguarda a vez antes de chamar o modelo (respostas do cache não consomem o limite).
+    Requisições simultâneas com o mesmo prompt compartilham a chamada ao modelo (UPSTREAM.generate).
+    Retorna (texto, hit). Exceções do modelo são propagadas e nada é armazenado.
+    """
+    if use_cache:
+        cached_text = ANALYSIS_CACHE.get(cache_key)
+        if cached_text is not None:
+            return cached_text, True
+    if limiter is not None:
+        limiter.acquire(estimate_tokens(prompt))
+    with stage("generation"):
+        response, shared = UPSTREAM.generate(prompt, temperature)
+    if not shared:
+        # Os tokens são contados uma vez por chamada ao modelo, não por requisição coalescida
+        record_generation_tokens(prompt, response, response.text)
+    ANALYSIS_CACHE.set(cache_key, response.text)
+    return response.text, False
+
+def record_generation_tokens(prompt, response, text):
+    """Tokens do prompt e da resposta: os informados pela API (usage_metadata) ou, na falta deles, estimados."""
+    usage = getattr(response, 'usage_metadata', None)
+    prompt_tokens = getattr(usage, 'prompt_token_count', None) or estimate_tokens(prompt)
+    response_tokens = getattr(usage, 'candidates_token_count', None) or estimate_tokens(text)
+    record_tokens(prompt_tokens, response_tokens)
+
+@timed("prompt")
+def build_coverage_request(query, relevant_docs_with_similarity):
+    """
+    Monta o prompt da análise de cobertura (ou de sugestões, se não houver documentos relevantes).
+    O contexto é montado dentro de CONTEXT_TOKEN_BUDGET: os documentos menos relevantes são
+    resumidos, truncados ou descartados quando o orçamento acaba.
+    Retorna um dicionário com o prompt, a temperatura, a chave do cache de análises, o texto
+    que antecede a resposta do modelo, a mensagem usada em caso de erro, os documentos incluídos
+    no contexto e o relatório do contexto (tokens do prompt, documentos recuperados x incluídos).
+    """
     if not relevant_docs_with_similarity:
         prompt_for_suggestions = f"""
         A documentação atual não contém informações diretas sobre o tópico: "{query}".
@@ -110,53 +443,180 @@ def analyze_coverage_with_context(query, relevant_docs_with_similarity):
 
         **Sugestões:**
         """
-        logging.info(f"Gerando sugestões de cobertura para: '{query}' (nenhum doc relevante)")
-        try:
-            model = genai.GenerativeModel(GENERATIVE_MODEL)
-            response = model.generate_content(
-                prompt_for_suggestions,
-                generation_config=genai.types.GenerationConfig(temperature=0.7)
-            )
-            return {"response_text": f"Não foi possível encontrar informações claras na documentação sobre '{query}'. \n\n**Possíveis tópicos para cobrir esta lacuna:**\n{response.text}", "relevant_docs_info": []}
-        except Exception as e:
-            logging.error(f"Erro ao gerar sugestões de cobertura: {e}", exc_info=True)
-            return {"response_text": f"Não foi possível encontrar informações claras na documentação sobre '{query}'. Erro ao gerar sugestões.", "relevant_docs_info": []}
-    else:
-        context_str = ""
-        for sim, doc in relevant_docs_with_similarity:
-            similarity_percent = f"{sim * 100:.2f}%"
-            context_str += f"Título: {doc['title']}\nSlug: {doc.get('slug', 'N/A')}\nCaminho do Arquivo: {doc.get('filepath', 'N/A')}\nConteúdo: {doc['content']}\n\n"
-            relevant_docs_info.append({
-                "title": doc['title'],
-                "slug": doc.get('slug', 'N/A'),
-                "relevance": similarity_percent
-            })
-
-        prompt_for_refinement = f"""
+        context_report = {"prompt_tokens": estimate_tokens(prompt_for_suggestions), "context_token_budget": CONTEXT_TOKEN_BUDGET, "context_tokens": 0,
+                          "retrieved_docs": 0, "included_docs": 0, "summarized_docs": 0, "truncated_docs": 0, "dropped_docs": 0}
+        return {
+            "prompt": prompt_for_suggestions,
+            "temperature": 0.7,
+            "cache_key": analysis_cache_key(query, [], GENERATIVE_MODEL, 0.7),
+            "response_prefix": f"Não foi possível encontrar informações claras na documentação sobre '{query}'. \n\n**Possíveis tópicos para cobrir esta lacuna:**\n",
+            "error_text": f"Não foi possível encontrar informações claras na documentação sobre '{query}'. Erro ao gerar sugestões.",
+            "log_message": f"Gerando sugestões de cobertura para: '{query}' (nenhum doc relevante, ~{context_report['prompt_tokens']} tokens no prompt)",
+            "relevant_docs_info": [],
+            "context": context_report,
+        }
+
+    context_str, included_docs, context_report = build_context(relevant_docs_with_similarity, CONTEXT_TOKEN_BUDGET)
+    relevant_docs_info = []
+    for sim, doc, _, mode in included_docs:
+        similarity_percent = f"{sim * 100:.2f}%"
+        relevant_docs_info.append({
+            "title": doc['title'],
+            "slug": doc.get('slug', 'N/A'),
+            "relevance": similarity_percent,
+            "context": mode
+        })
+
+    prompt_for_refinement = f"""
         A pergunta/tópico para análise de cobertura é: "{query}".
         Com base no contexto fornecido da documentação existente abaixo, e no seu conhecimento geral sobre documentação de produtos de segurança da informação,
         identifique **3 a 5 pontos de melhoria ou expansão** na documentação atual relacionados a este tópico.
         Formate cada sugestão como um item de lista numerada. Para cada sugestão, inclua um **título sugerido** e um **conteúdo sugerido** em sub-itens com asterisco. Se houver manuais ou documentos mencionados, sugira adicionar links diretos.
 
-        **Contexto de Documentação Relevante (conteúdo completo dos documentos com título, slug e caminho do arquivo):**
+        **Contexto de Documentação Relevante (trechos relevantes dos documentos com título, slug e caminho do arquivo):**
         {context_str}
 
         **Sugestões de Melhoria de Cobertura para '{query}':**
         """
-        logging.info(f"Gerando análise de cobertura com contexto para: '{query}'")
+    context_report = {"prompt_tokens": estimate_tokens(prompt_for_refinement), **context_report}
+    return {
+        "prompt": prompt_for_refinement,
+        "temperature": 0.4,
+        "cache_key": analysis_cache_key(query, [doc_fingerprint(doc, text) for _, doc, text, _ in included_docs], GENERATIVE_MODEL, 0.4),
+        "response_prefix": f"A documentação existente já aborda o tópico '{query}' em parte. Para uma cobertura mais abrangente, considere as seguintes melhorias:\n\n",
+        "error_text": f"A documentação existente já aborda o tópico '{query}' em parte. Erro ao analisar melhorias.",
+        "log_message": (f"Gerando análise de cobertura com contexto para: '{query}' "
+                        f"(~{context_report['prompt_tokens']} tokens no prompt; {context_report['included_docs']}/{context_report['retrieved_docs']} docs incluídos, "
+                        f"{context_report['summarized_docs']} resumidos, {context_report['truncated_docs']} truncados)"),
+        "relevant_docs_info": relevant_docs_info,
+        "context": context_report,
+    }
+
+def analyze_coverage_with_context(query, relevant_docs_with_similarity, use_cache=True):
+    """
+    Analisa a cobertura da documentação para uma query/tópico e sugere lacunas,
+    usando os trechos recuperados de cada documento como contexto para a análise.
+    Com `use_cache=False`, ignora o cache de análises (a nova resposta ainda é armazenada).
+    Retorna um dicionário com a resposta do modelo, informações dos documentos relevantes,
+    o relatório do contexto do prompt e se a resposta veio do cache.
+    """
+    if not documentation_loaded():
+        return {"response_text": "A documentação não foi carregada. Por favor, verifique a inicialização da aplicação.", "relevant_docs_info": []}
+
+    coverage_request = build_coverage_request(query, relevant_docs_with_similarity)
+    logging.info(coverage_request["log_message"])
+    try:
+        response_text, cache_hit = generate_text_cached(coverage_request["prompt"], coverage_request["temperature"], coverage_request["cache_key"], use_cache)
+        return {"response_text": coverage_request["response_prefix"] + response_text, "relevant_docs_info": coverage_request["relevant_docs_info"], "context": coverage_request["context"], "cache": {"hit": cache_hit, "bypassed": not use_cache}}
+    except Exception as e:
+        logging.error(f"Erro ao gerar análise de cobertura: {e}", exc_info=True)
+        return {"response_text": coverage_request["error_text"], "relevant_docs_info": [], "context": coverage_request["context"]}
+
+def track_stream(events):
+    """Corpo de resposta em streaming cuja duração é medida até o fim do envio (ver finish_request_timer)."""
+    g.streaming = True
+    def body():
         try:
-            model = genai.GenerativeModel(GENERATIVE_MODEL)
-            response = model.generate_content(
-                prompt_for_refinement,
-                generation_config=genai.types.GenerationConfig(temperature=0.4)
+            yield from events
+        finally:
+            g.stream_done = True
+    return stream_with_context(body())
+
+def with_timings(payload, timings):
+    """Acrescenta ao payload o tempo de cada etapa da requisição atual, se solicitado."""
+    timer = current_timer()
+    if timings and timer is not None:
+        payload["timings"] = timer.breakdown()
+    return payload
+
+def sse_event(event, payload):
+    """Formata um evento server-sent events com payload JSON."""
+    return f"event: {event}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+def stream_coverage_events(query, relevant_docs_with_similarity, use_cache=True, retrieval=None, timings=False):
+    """
+    Gerador de eventos SSE da análise de cobertura: "docs" (documentos relevantes e modo de
+    recuperação, enviado logo após a recuperação), "token" (trechos do texto à medida que o modelo gera),
+    "done" (informações de cache e do contexto do prompt e, com `timings`, o tempo de cada etapa) ou "error".
+    """
+    if not documentation_loaded():
+        yield sse_event("error", {"error": "A documentação não foi carregada. Por favor, verifique a inicialização da aplicação."})
+        return
+
+    coverage_request = build_coverage_request(query, relevant_docs_with_similarity)
+    yield sse_event("docs", {"relevant_docs_info": coverage_request["relevant_docs_info"], "retrieval": retrieval})
+
+    if use_cache:
+        cached_text = ANALYSIS_CACHE.get(coverage_request["cache_key"])
+        if cached_text is not None:
+            yield sse_event("token", {"text": coverage_request["response_prefix"] + cached_text})
+            yield sse_event("done", with_timings({"cache": {"hit": True, "bypassed": False}, "context": coverage_request["context"]}, timings))
+            return
+
+    logging.info(coverage_request["log_message"] + " (streaming)")
+    chunks = []
+    started = time.perf_counter()
+    response = None
+    try:
+        # Sem coalescência (cada cliente recebe o próprio stream), mas com circuit breaker e controle de admissão
+        with UPSTREAM.guarded(OPERATION_GENERATE):
+            response = UPSTREAM.model().generate_content(
+                coverage_request["prompt"],
+                generation_config=UPSTREAM.generation_config(coverage_request["temperature"]),
+                stream=True
             )
-            return {"response_text": f"A documentação existente já aborda o tópico '{query}' em parte. Para uma cobertura mais abrangente, considere as seguintes melhorias:\n\n{response.text}", "relevant_docs_info": relevant_docs_info}
-        except Exception as e:
-            logging.error(f"Erro ao gerar análise de cobertura com contexto: {e}", exc_info=True)
-            return {"response_text": f"A documentação existente já aborda o tópico '{query}' em parte. Erro ao analisar melhorias.", "relevant_docs_info": []}
+            yield sse_event("token", {"text": coverage_request["response_prefix"]})
+            for chunk in response:
+                if chunk.text:
+                    chunks.append(chunk.text)
+                    yield sse_event("token", {"text": chunk.text})
+    except Exception as e:
+        observe_stage("generation", time.perf_counter() - started)
+        logging.error(f"Erro ao gerar análise de cobertura (streaming): {e}", exc_info=True)
+        yield sse_event("error", {"error": coverage_request["error_text"]})
+        return
+
+    # Inclui o tempo de envio dos trechos ao cliente, que acompanha a geração
+    observe_stage("generation", time.perf_counter() - started)
+    response_text = "".join(chunks)
+    record_generation_tokens(coverage_request["prompt"], response, response_text)
+    ANALYSIS_CACHE.set(coverage_request["cache_key"], response_text)
+    yield sse_event("done", with_timings({"cache": {"hit": False, "bypassed": not use_cache}, "context": coverage_request["context"]}, timings))
 
 # --- Rotas da Aplicação ---
 
+@app.before_request
+def ensure_index_watcher():
+    start_index_watcher()
+
+@app.before_request
+def start_request_timer():
+    g.request_timer = start_request(request.headers.get('X-Request-ID'))
+
+@app.after_request
+def add_request_id(response):
+    timer = getattr(g, 'request_timer', None)
+    if timer is not None:
+        response.headers['X-Request-ID'] = timer.request_id
+    g.response_status = response.status_code
+    return response
+
+@app.teardown_request
+def finish_request_timer(error=None):
+    """Registra a duração da requisição (em streaming, ao fim do envio) e loga as requisições lentas."""
+    timer = getattr(g, 'request_timer', None)
+    if timer is None or (getattr(g, 'streaming', False) and not getattr(g, 'stream_done', False)):
+        # Respostas em streaming: o teardown também roda quando a rota retorna, antes do envio do corpo
+        return
+    route = request.url_rule.rule if request.url_rule else "not_found"
+    status = 500 if error is not None else getattr(g, 'response_status', 500)
+    elapsed = timer.elapsed()
+    observe_request(route, status, elapsed)
+    if elapsed >= SLOW_REQUEST_SECONDS:
+        logging.warning(f"Requisição lenta [{timer.request_id}] {request.method} {route} ({status}): {elapsed:.2f}s ({timer.summary()})")
+    g.request_timer = None
+    clear_request()
+
 @app.route('/')
 def index():
     """Página inicial com o formulário de análise de cobertura."""
@@ -172,24 +632,152 @@ def handle_analyze_coverage():
     """Rota para analisar a cobertura da documentação."""
     data = request.get_json()
     query = data.get('query', '').strip()
+    use_cache = not data.get('bypass_cache', False)
+    lexical_only = data.get('retrieval') == RETRIEVAL_LEXICAL
     if not query:
         return jsonify({"error": "Nenhuma informação/tópico fornecido para análise de cobertura."}), 400
 
     logging.info(f"Recebida solicitação de análise de cobertura para: '{query[:70]}...'")
     try:
-        query_embedding = generate_embedding(query)
-        if query_embedding is None:
+        relevant_docs_with_similarity, retrieval = retrieve_documents(query, top_k=5, lexical_only=lexical_only)
+        if relevant_docs_with_similarity is None:
             return jsonify({"error": "Não foi possível gerar o embedding para a consulta."}), 500
 
-        relevant_docs_with_similarity = get_relevant_documents(query_embedding, top_k=5)
-
-        coverage_result = analyze_coverage_with_context(query, relevant_docs_with_similarity)
+        coverage_result = analyze_coverage_with_context(query, relevant_docs_with_similarity, use_cache=use_cache)
+        coverage_result["retrieval"] = retrieval
+        with_timings(coverage_result, data.get('timings', False))
+        coverage_result.setdefault("cache", {"hit": False, "bypassed": not use_cache})
+        coverage_result["cache"]["stats"] = {
+            "analysis": ANALYSIS_CACHE.stats(),
+            "query_embedding": QUERY_EMBEDDING_CACHE.stats(),
+        }
         
         return jsonify(coverage_result)
     except Exception as e:
         logging.error(f"Erro na rota /analyze_coverage: {e}", exc_info=True)
         return jsonify({"error": f"Erro interno ao analisar cobertura: {e}", "response_text": "", "relevant_docs_info": []}), 500
 
+@app.route('/analyze_coverage/stream', methods=['POST'])
+def handle_analyze_coverage_stream():
+    """
+    Variante em streaming (server-sent events) de /analyze_coverage: os documentos relevantes
+    são enviados assim que a recuperação termina e o texto do modelo à medida que é gerado.
+    """
+    data = request.get_json()
+    query = data.get('query', '').strip()
+    use_cache = not data.get('bypass_cache', False)
+    lexical_only = data.get('retrieval') == RETRIEVAL_LEXICAL
+    if not query:
+        return jsonify({"error": "Nenhuma informação/tópico fornecido para análise de cobertura."}), 400
+
+    logging.info(f"Recebida solicitação de análise de cobertura (streaming) para: '{query[:70]}...'")
+    try:
+        relevant_docs_with_similarity, retrieval = retrieve_documents(query, top_k=5, lexical_only=lexical_only)
+        if relevant_docs_with_similarity is None:
+            return jsonify({"error": "Não foi possível gerar o embedding para a consulta."}), 500
+    except Exception as e:
+        logging.error(f"Erro na rota /analyze_coverage/stream: {e}", exc_info=True)
+        return jsonify({"error": f"Erro interno ao analisar cobertura: {e}", "response_text": "", "relevant_docs_info": []}), 500
+
+    return Response(
+        track_stream(stream_coverage_events(query, relevant_docs_with_similarity, use_cache, retrieval, data.get('timings', False))),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@app.route('/analyze_coverage/batch', methods=['POST'])
+def handle_analyze_coverage_batch():
+    """
+    Auditoria de cobertura em lote. Aceita um arquivo de tópicos (campo "file" multipart, CSV ou
+    JSONL) ou um JSON {"topics": [...]} e responde em NDJSON, um resultado por linha à medida
+    que as análises terminam. Opções (campos do formulário ou do JSON): concurrency,
+    bypass_cache, retrieval ("lexical").
+    """
+    if 'file' in request.files:
+        upload = request.files['file']
+        options = request.form
+        try:
+            topics = parse_topics(upload.read().decode('utf-8-sig'), upload.filename or "")
+        except (UnicodeDecodeError, ValueError) as e:
+            return jsonify({"error": f"Arquivo de tópicos inválido: {e}"}), 400
+    else:
+        options = request.get_json(silent=True) or {}
+        items = options.get('topics')
+        if not isinstance(items, list):
+            return jsonify({"error": "Envie um arquivo de tópicos (campo 'file') ou um JSON com a lista 'topics'."}), 400
+        topics = unique_topics(topic for topic in map(topic_from_item, items) if topic)
+
+    if not topics:
+        return jsonify({"error": "Nenhum tópico fornecido para análise de cobertura."}), 400
+    if len(topics) > BATCH_MAX_TOPICS:
+        return jsonify({"error": f"Máximo de {BATCH_MAX_TOPICS} tópicos por requisição ({len(topics)} recebidos)."}), 400
+    if not documentation_loaded():
+        return jsonify({"error": "A documentação não foi carregada. Por favor, verifique a inicialização da aplicação."}), 500
+    try:
+        concurrency = min(max(1, int(options.get('concurrency', 4))), BATCH_MAX_CONCURRENCY)
+    except (TypeError, ValueError):
+        return jsonify({"error": "O campo 'concurrency' deve ser um número inteiro."}), 400
+    use_cache = str(options.get('bypass_cache', False)).lower() not in ('true', '1')
+    lexical_only = options.get('retrieval') == RETRIEVAL_LEXICAL
+
+    logging.info(f"Recebida solicitação de auditoria de cobertura em lote: {len(topics)} tópicos (concorrência {concurrency})")
+
+    def generate():
+        try:
+            # closing: com o cliente desconectado, a auditoria é encerrada (e a fila cancelada) imediatamente
+            with closing(iter_coverage_audit(topics, concurrency=concurrency, use_cache=use_cache, lexical_only=lexical_only)) as results:
+                for result in results:
+                    yield json.dumps(result, ensure_ascii=False) + '\n'
+        except Exception as e:
+            logging.error(f"Erro na rota /analyze_coverage/batch: {e}", exc_info=True)
+            yield json.dumps({"status": STATUS_ERROR, "error": f"Erro interno na auditoria em lote: {e}"}, ensure_ascii=False) + '\n'
+
+    return Response(track_stream(generate()), mimetype='application/x-ndjson', headers={'X-Accel-Buffering': 'no'})
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Métricas deste processo no formato texto do Prometheus."""
+    snapshot = SNAPSHOT
+    if snapshot is not None:
+        INDEX_INFO.replace(1, version=snapshot.version, lexical_version=snapshot.lexical_version or "")
+        INDEX_DOCS.set(len(snapshot))
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/health', methods=['GET'])
+def health():
+    """Estado da aplicação e versão do índice ativo (503 se a documentação não estiver carregada)."""
+    snapshot = SNAPSHOT
+    payload = {
+        "status": "ok" if documentation_loaded(snapshot) else "unavailable",
+        "index": snapshot.describe() if snapshot else None,
+        "embedding_available": embedding_available(),
+        "upstream": UPSTREAM.status(),
+        "reload": _index_watcher.status() if _index_watcher is not None and _index_watcher_pid == os.getpid() else {"interval_s": INDEX_RELOAD_INTERVAL, "last_check": None, "last_error": None},
+    }
+    return jsonify(payload), 200 if payload["status"] == "ok" else 503
+
+@app.route('/admin/reload_index', methods=['POST'])
+def handle_reload_index():
+    """
+    Recarrega o índice em disco neste processo (com vários workers, cada um recarrega pela
+    verificação periódica). Exige o cabeçalho X-Admin-Token igual a ADMIN_TOKEN; sem
+    ADMIN_TOKEN configurado, a rota recusa todas as requisições. Envie {"force": true} para
+    recarregar mesmo sem mudança nos arquivos.
+    """
+    if not ADMIN_TOKEN:
+        return jsonify({"error": "Recarga administrativa desativada: configure ADMIN_TOKEN."}), 403
+    if not hmac.compare_digest(request.headers.get('X-Admin-Token', '').encode('utf-8'), ADMIN_TOKEN.encode('utf-8')):
+        return jsonify({"error": "Token administrativo inválido."}), 403
+
+    data = request.get_json(silent=True) or {}
+    previous = SNAPSHOT
+    try:
+        reloaded, snapshot = reload_documentation(force=bool(data.get('force', False)))
+    except Exception as e:
+        logging.error(f"Erro ao recarregar o índice da documentação: {e}", exc_info=True)
+        return jsonify({"error": f"Erro ao recarregar o índice: {e}", "index": previous.describe() if previous else None}), 500
+    return jsonify({"reloaded": reloaded, "previous_version": previous.version if previous else None, "index": snapshot.describe()})
+
 
 # Bloco de inicialização da aplicação Flask
 with app.app_context():
@@ -197,7 +785,7 @@ with app.app_context():
         logging.critical("!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!")
         logging.critical("ERRO CRÍTICO: Os dados da documentação não foram carregados com sucesso.")
         # Mensagem de erro atualizada para refletir a nova estrutura de arquivos
-        logging.critical("A aplicação pode não funcionar corretamente. Verifique 'processed_docs.json' e execute 'extract_data_from_markdown.py' seguido por 'generate_embeddings.py'.")
+        logging.critical("A aplicação pode não funcionar corretamente. Verifique o índice 'processed_index' (ou 'processed_docs.json') e execute 'extract_data_from_markdown.py' seguido por 'generate-embedings.py'.")
         logging.critical("!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!")
     else:
         logging.info("Dados da documentação e embeddings carregados com sucesso.")
@@ -0,0 +1,231 @@
+# asgi.py
+"""
+Ponto de entrada ASGI da aplicação.
+
+POST /analyze_coverage é atendido por um pipeline assíncrono (embedding -> recuperação ->
+geração), de modo que requisições aguardando o Gemini não prendem threads de worker.
+Todas as demais rotas (página inicial, ajuda, streaming) são delegadas ao app Flask.
+
+Execução:
+    uvicorn asgi:application --workers 2
+    gunicorn asgi:application -k uvicorn.workers.UvicornWorker
+
+As chamadas ao Gemini passam pela camada compartilhada app.UPSTREAM (upstream.py): pedidos
+idênticos simultâneos são coalescidos, com circuit breaker e controle de admissão.
+
+Configuração (variáveis de ambiente):
+    ASYNC_MAX_INFLIGHT: máximo de chamadas simultâneas ao Gemini pelo loop de eventos, por processo (padrão: UPSTREAM_MAX_INFLIGHT)
+    ASYNC_EMBED_TIMEOUT / ASYNC_RETRIEVAL_TIMEOUT / ASYNC_GENERATE_TIMEOUT: timeouts (s) por etapa
+"""
+import asyncio
+import json
+import logging
+import os
+
+from asgiref.wsgi import WsgiToAsgi
+
+import app as coverage_app
+import metrics
+from hybrid_search import RETRIEVAL_LEXICAL
+from upstream import CircuitOpenError, UpstreamBusy
+
+EMBED_TIMEOUT = float(os.getenv("ASYNC_EMBED_TIMEOUT", "10"))
+RETRIEVAL_TIMEOUT = float(os.getenv("ASYNC_RETRIEVAL_TIMEOUT", "5"))
+GENERATE_TIMEOUT = float(os.getenv("ASYNC_GENERATE_TIMEOUT", "90"))
+
+flask_application = WsgiToAsgi(coverage_app.app)
+
+
+class StageTimeout(Exception):
+    """Uma etapa do pipeline excedeu o tempo limite configurado."""
+
+    def __init__(self, stage, timeout):
+        super().__init__(f"A etapa '{stage}' excedeu o tempo limite de {timeout}s.")
+        self.stage = stage
+
+
+async def run_stage(stage, awaitable, timeout):
+    try:
+        return await asyncio.wait_for(awaitable, timeout)
+    except asyncio.TimeoutError:
+        raise StageTimeout(stage, timeout)
+
+
+async def generate_embedding_async(text):
+    """Versão assíncrona de app.generate_embedding."""
+    try:
+        return await coverage_app.UPSTREAM.embed_async(text, timeout=EMBED_TIMEOUT)
+    except asyncio.CancelledError:
+        raise
+    except (CircuitOpenError, UpstreamBusy) as e:
+        logging.warning(f"Embedding não solicitado para '{text[:50]}' (async): {e}")
+        return None
+    except Exception as e:
+        logging.error(f"Erro ao gerar embedding para o texto (primeiros 50 caracteres: '{text[:50]}'): {e}", exc_info=True)
+        return None
+
+
+async def get_query_embedding_async(query):
+    with metrics.stage("embedding"):
+        cache = coverage_app.QUERY_EMBEDDING_CACHE
+        # O cache é SQLite (E/S bloqueante): as leituras e escritas rodam em thread
+        vector = await asyncio.to_thread(cache.get, query, namespace=coverage_app.EMBEDDING_MODEL)
+        if vector is not None or not coverage_app.embedding_available():
+            return vector
+        # Um timeout aqui não interrompe a chamada compartilhada, que registra a falha no circuit breaker
+        vector = await run_stage("embedding", generate_embedding_async(query), EMBED_TIMEOUT)
+        if vector is not None:
+            await asyncio.to_thread(cache.set, query, vector, namespace=coverage_app.EMBEDDING_MODEL)
+        return vector
+
+
+async def generate_text_cached_async(prompt, temperature, cache_key, use_cache=True):
+    """Versão assíncrona de app.generate_text_cached. Retorna (texto, hit)."""
+    if use_cache:
+        cached_text = await asyncio.to_thread(coverage_app.ANALYSIS_CACHE.get, cache_key)
+        if cached_text is not None:
+            return cached_text, True
+    with metrics.stage("generation"):
+        response, shared = await run_stage("generation", coverage_app.UPSTREAM.generate_async(prompt, temperature, timeout=GENERATE_TIMEOUT),
+                                           GENERATE_TIMEOUT)
+    if not shared:
+        coverage_app.record_generation_tokens(prompt, response, response.text)
+    await asyncio.to_thread(coverage_app.ANALYSIS_CACHE.set, cache_key, response.text)
+    return response.text, False
+
+
+async def retrieve_documents_async(query, lexical_only=False):
+    """
+    Versão assíncrona de app.retrieve_documents: se o embedding falhar, demorar mais que
+    ASYNC_EMBED_TIMEOUT ou a API estiver indisponível, usa a busca lexical (se houver índice lexical).
+    Toda a recuperação usa o snapshot do índice ativo no início da chamada.
+    """
+    snapshot = coverage_app.SNAPSHOT
+    query_embedding = None
+    if not lexical_only:
+        try:
+            query_embedding = await get_query_embedding_async(query)
+        except StageTimeout:
+            if not coverage_app.lexical_fallback_available(snapshot):
+                raise
+
+    # A recuperação é CPU (numpy) e roda em thread para não bloquear o loop de eventos
+    if query_embedding is not None:
+        relevant_docs_with_similarity = await run_stage(
+            "retrieval", asyncio.to_thread(coverage_app.get_relevant_documents, query_embedding, 5, query, snapshot), RETRIEVAL_TIMEOUT)
+        return relevant_docs_with_similarity, coverage_app.retrieval_info(snapshot.retriever.mode if snapshot else None, False, snapshot)
+    if not coverage_app.lexical_fallback_available(snapshot):
+        return None, None
+    if not lexical_only:
+        logging.warning(f"Embedding da consulta indisponível; usando busca lexical para: '{query[:70]}' (async)")
+    relevant_docs_with_similarity = await run_stage(
+        "retrieval", asyncio.to_thread(coverage_app.get_lexical_documents, query, 5, snapshot), RETRIEVAL_TIMEOUT)
+    return relevant_docs_with_similarity, coverage_app.retrieval_info(RETRIEVAL_LEXICAL, not lexical_only, snapshot)
+
+
+async def analyze_coverage_async(query, use_cache=True, lexical_only=False, timings=False):
+    """
+    Pipeline assíncrono equivalente a /analyze_coverage. Retorna (status_http, payload).
+    """
+    try:
+        relevant_docs_with_similarity, retrieval = await retrieve_documents_async(query, lexical_only)
+        if relevant_docs_with_similarity is None:
+            return 500, {"error": "Não foi possível gerar o embedding para a consulta."}
+
+        if not coverage_app.documentation_loaded():
+            return 200, {"response_text": "A documentação não foi carregada. Por favor, verifique a inicialização da aplicação.", "relevant_docs_info": []}
+
+        coverage_request = coverage_app.build_coverage_request(query, relevant_docs_with_similarity)
+        logging.info(coverage_request["log_message"] + " (async)")
+        try:
+            response_text, cache_hit = await generate_text_cached_async(
+                coverage_request["prompt"], coverage_request["temperature"], coverage_request["cache_key"], use_cache)
+            coverage_result = {"response_text": coverage_request["response_prefix"] + response_text, "relevant_docs_info": coverage_request["relevant_docs_info"], "context": coverage_request["context"], "cache": {"hit": cache_hit, "bypassed": not use_cache}}
+        except StageTimeout:
+            raise
+        except Exception as e:
+            logging.error(f"Erro ao gerar análise de cobertura: {e}", exc_info=True)
+            coverage_result = {"response_text": coverage_request["error_text"], "relevant_docs_info": [], "context": coverage_request["context"], "cache": {"hit": False, "bypassed": not use_cache}}
+
+        coverage_result["retrieval"] = retrieval
+        coverage_app.with_timings(coverage_result, timings)
+        coverage_result["cache"]["stats"] = {
+            "analysis": coverage_app.ANALYSIS_CACHE.stats(),
+            "query_embedding": coverage_app.QUERY_EMBEDDING_CACHE.stats(),
+        }
+        return 200, coverage_result
+    except StageTimeout as e:
+        logging.error(f"Timeout na rota /analyze_coverage (async): {e}")
+        return 504, {"error": str(e), "response_text": "", "relevant_docs_info": []}
+    except Exception as e:
+        logging.error(f"Erro na rota /analyze_coverage (async): {e}", exc_info=True)
+        return 500, {"error": f"Erro interno ao analisar cobertura: {e}", "response_text": "", "relevant_docs_info": []}
+
+
+async def read_body(receive):
+    body = b""
+    while True:
+        message = await receive()
+        body += message.get("body", b"")
+        if not message.get("more_body"):
+            return body
+
+
+async def send_json(send, status, payload, request_id=None):
+    body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+    headers = [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+    if request_id:
+        headers.append((b"x-request-id", request_id.encode()))
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": headers,
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+async def handle_analyze_coverage(scope, receive, send):
+    request_id = dict(scope.get("headers") or []).get(b"x-request-id", b"").decode('latin-1') or None
+    timer = metrics.start_request(request_id)
+    status = 500
+    try:
+        try:
+            data = json.loads(await read_body(receive) or b"{}")
+        except ValueError:
+            status = 400
+            await send_json(send, status, {"error": "Corpo da requisição não é um JSON válido."}, timer.request_id)
+            return
+        query = data.get('query', '').strip()
+        if not query:
+            status = 400
+            await send_json(send, status, {"error": "Nenhuma informação/tópico fornecido para análise de cobertura."}, timer.request_id)
+            return
+
+        logging.info(f"Recebida solicitação de análise de cobertura (async) para: '{query[:70]}...'")
+        status, payload = await analyze_coverage_async(query, use_cache=not data.get('bypass_cache', False),
+                                                       lexical_only=data.get('retrieval') == RETRIEVAL_LEXICAL,
+                                                       timings=data.get('timings', False))
+        await send_json(send, status, payload, timer.request_id)
+    finally:
+        elapsed = timer.elapsed()
+        metrics.observe_request("/analyze_coverage", status, elapsed)
+        if elapsed >= coverage_app.SLOW_REQUEST_SECONDS:
+            logging.warning(f"Requisição lenta [{timer.request_id}] POST /analyze_coverage ({status}, async): {elapsed:.2f}s ({timer.summary()})")
+
+
+async def application(scope, receive, send):
+    if scope["type"] == "lifespan":
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                coverage_app.start_index_watcher()
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    if scope["type"] == "http" and scope["method"] == "POST" and scope["path"] == "/analyze_coverage":
+        await handle_analyze_coverage(scope, receive, send)
+        return
+
+    await flask_application(scope, receive, send)
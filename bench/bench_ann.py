@@ -0,0 +1,90 @@
+# bench/bench_ann.py
+"""
+Compara a busca aproximada (IVF e IVF-PQ, ann_index.py) com a busca exata (força bruta)
+sobre embeddings sintéticos agrupados: recall@k dos trechos e latência por consulta
+para diferentes valores de nprobe.
+
+Uso:
+    python bench/bench_ann.py --chunks 200000 --dim 768 --queries 200 --nprobe 4 8 16 32 64
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ann_index import ANN_IVF, ANN_IVFPQ, PQ_RERANK_FACTOR, build_ivf  # noqa: E402
+
+
+def synthetic_embeddings(centers, n, rng, noise):
+    """Vetores normalizados em torno dos centros (tópicos), como embeddings de documentação."""
+    labels = rng.integers(0, len(centers), size=n)
+    matrix = centers[labels] + rng.normal(scale=noise, size=(n, centers.shape[1])).astype(np.float32)
+    return matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
+
+
+def exact_top_k(matrix, query_vector, k):
+    scores = matrix @ query_vector
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top])]
+
+
+def percentile_ms(samples, q):
+    return round(float(np.percentile(samples, q)) * 1000, 3)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=100000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--clusters", type=int, default=500, help="Tópicos do corpus sintético")
+    parser.add_argument("--noise", type=float, default=2.0, help="Dispersão em torno dos tópicos (maior = tópicos mais sobrepostos)")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nlist", type=int, default=None)
+    parser.add_argument("--pq-m", type=int, default=None)
+    parser.add_argument("--rerank", type=int, default=PQ_RERANK_FACTOR, help="Fator de reavaliação exata dos candidatos do PQ")
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[4, 8, 16, 32, 64])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    centers = rng.normal(size=(args.clusters, args.dim)).astype(np.float32)
+    matrix = synthetic_embeddings(centers, args.chunks, rng, args.noise)
+    # Consultas são novos pontos da mesma distribuição (não cópias de trechos indexados)
+    queries = synthetic_embeddings(centers, args.queries, rng, args.noise)
+    print(f"Corpus: {args.chunks} trechos x {args.dim} dimensões ({matrix.nbytes / 1e6:.0f} MB), {args.queries} consultas, k={args.k}")
+
+    for kind in (ANN_IVF, ANN_IVFPQ):
+        started = time.perf_counter()
+        order, index = build_ivf(matrix, kind, nlist=args.nlist, pq_m=args.pq_m)
+        build_s = time.perf_counter() - started
+        ordered = np.ascontiguousarray(matrix[order])
+        extra = f", códigos PQ {index.pq_codes.nbytes / 1e6:.1f} MB (m={index.pq_codebooks.shape[0]})" if index.pq_codes is not None else ""
+        print(f"\n{kind}: {index.nlist} listas, construído em {build_s:.1f}s{extra}")
+
+        exact_times = []
+        truth = []
+        for query_vector in queries:
+            started = time.perf_counter()
+            truth.append(set(exact_top_k(ordered, query_vector, args.k).tolist()))
+            exact_times.append(time.perf_counter() - started)
+        print(f"  exata:      recall@{args.k} 1.000  p50 {percentile_ms(exact_times, 50):8.3f} ms  p95 {percentile_ms(exact_times, 95):8.3f} ms")
+
+        for nprobe in args.nprobe:
+            times = []
+            hits = 0
+            for query_vector, expected in zip(queries, truth):
+                started = time.perf_counter()
+                ids, _ = index.search(ordered, query_vector, args.k, nprobe, rerank_factor=args.rerank)
+                times.append(time.perf_counter() - started)
+                hits += len(expected.intersection(ids.tolist()))
+            recall = hits / (args.k * len(queries))
+            print(f"  nprobe {nprobe:3d}: recall@{args.k} {recall:.3f}  p50 {percentile_ms(times, 50):8.3f} ms  p95 {percentile_ms(times, 95):8.3f} ms  "
+                  f"speedup {np.median(exact_times) / np.median(times):5.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,330 @@
+# bench/bench_suite.py
+"""
+Benchmark offline do pipeline completo, sem acesso à rede, com o modelo stub determinístico
+(stub_genai.py) no lugar do Gemini. Para cada tamanho de corpus:
+
+  1. gera o markdown consolidado sintético (formato "## Arquivo:" do merge-markdown.py);
+  2. extração (extract_data_from_markdown.py, com o índice BM25);
+  3. embeddings dos trechos (generate-embedings.py com o embed_content do stub);
+  4. recuperação direta no índice (híbrida e apenas lexical), consulta a consulta;
+  5. replay de POST /analyze_coverage pelo test client do Flask, com requisições concorrentes.
+
+Para cada etapa são medidos o tempo, o throughput, as latências p50/p95/p99 (quando a etapa
+tem operações individuais) e o pico de memória residente (RSS). O resultado pode ser gravado
+em JSON (--output) e comparado com uma execução anterior (--compare), por exemplo entre commits.
+
+Uso:
+    python bench/bench_suite.py --docs 500 2000 --queries 200 --concurrency 8 --output bench.json
+    python bench/bench_suite.py --docs 500 2000 --compare bench.json
+"""
+import argparse
+import contextlib
+import importlib.util
+import io
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT)
+sys.path.insert(0, BENCH_DIR)
+
+from stub_genai import StubGenai, fake_embedding  # noqa: E402
+from synthetic import WORDS, write_synthetic_markdown  # noqa: E402
+
+# Consultas executadas antes das medições de recuperação (páginas do memmap, caches do numpy)
+WARMUP_QUERIES = 10
+# Métricas comparadas por --compare: (caminho no resultado da etapa, maior é melhor)
+COMPARED_METRICS = (("throughput", True), ("p50_ms", False), ("p95_ms", False), ("p99_ms", False), ("peak_rss_mb", False))
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def reset_peak_rss():
+    """Zera o pico de RSS do processo (Linux: /proc/self/clear_refs). Retorna False se não for possível."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss_mb():
+    """Pico de RSS do processo desde o último reset_peak_rss (ou desde o início)."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    if resource is None:
+        return None
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss é em KB no Linux e em bytes no macOS
+    return round(maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def latency_stats(latencies):
+    values = np.asarray(latencies, dtype=np.float64) * 1000
+    return {
+        "p50_ms": round(float(np.percentile(values, 50)), 3),
+        "p95_ms": round(float(np.percentile(values, 95)), 3),
+        "p99_ms": round(float(np.percentile(values, 99)), 3),
+        "mean_ms": round(float(values.mean()), 3),
+    }
+
+
+@contextlib.contextmanager
+def measure(result):
+    """Preenche `result` com o tempo total (s) e o pico de RSS (MB) do bloco."""
+    per_stage = reset_peak_rss()
+    started = time.perf_counter()
+    yield result
+    result["elapsed_s"] = round(time.perf_counter() - started, 3)
+    result["peak_rss_mb"] = peak_rss_mb()
+    result["peak_rss_scope"] = "stage" if per_stage else "process"
+
+
+def load_script(name, filename):
+    """Importa um script do projeto cujo nome de arquivo não é um identificador válido (ex.: generate-embedings.py)."""
+    spec = importlib.util.spec_from_file_location(name, os.path.join(ROOT, filename))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def make_queries(count, seed):
+    """Consultas sintéticas com o vocabulário do corpus (mesmas para todos os tamanhos)."""
+    rng = np.random.default_rng(seed)
+    return [" ".join(rng.choice(WORDS, size=int(rng.integers(2, 6)))) for _ in range(count)]
+
+
+def bench_extraction(markdown_path, work_dir, workers):
+    from extract_data_from_markdown import extract_data_from_markdown
+    raw_docs_path = os.path.join(work_dir, "raw_docs.jsonl")
+    lexical_dir = os.path.join(work_dir, "lexical_index")
+    result = {}
+    with measure(result), contextlib.redirect_stdout(io.StringIO()):
+        extract_data_from_markdown(markdown_path, raw_docs_path, workers=workers, lexical_index_dir=lexical_dir)
+    with open(raw_docs_path, 'r', encoding='utf-8') as f:
+        docs = sum(1 for line in f if line.strip())
+    size_mb = os.path.getsize(markdown_path) / 1e6
+    result.update(docs=docs, throughput=round(docs / result["elapsed_s"], 2), unit="docs/s", mb_per_s=round(size_mb / result["elapsed_s"], 2))
+    return raw_docs_path, lexical_dir, result
+
+
+def bench_embedding(raw_docs_path, work_dir, stub, args):
+    from doc_index import load_index
+    generate_embeddings = load_script("generate_embeddings", "generate-embedings.py")
+    index_dir = os.path.join(work_dir, "processed_index")
+
+    def embed_fn(texts):
+        return stub.embed_content(model="stub", content=list(texts))["embedding"]
+
+    result = {}
+    calls_before = stub.calls["embed"]
+    with measure(result), contextlib.redirect_stdout(io.StringIO()):
+        ok = generate_embeddings.generate_embeddings_for_docs(raw_docs_path, index_dir, embed_fn=embed_fn, incremental=False,
+                                                              concurrency=args.embed_concurrency, ann=args.ann)
+    if not ok:
+        raise RuntimeError("Falha ao gerar o índice de embeddings.")
+    doc_index = load_index(index_dir)
+    manifest = doc_index.manifest
+    doc_index.close()
+    result.update(chunks=manifest["chunk_count"], requests=stub.calls["embed"] - calls_before, ann=(manifest.get("ann") or {}).get("type"),
+                  throughput=round(manifest["chunk_count"] / result["elapsed_s"], 2), unit="chunks/s")
+    return index_dir, result
+
+
+def bench_retrieval(index_dir, lexical_dir, queries):
+    from doc_index import load_index
+    from hybrid_search import HybridRetriever
+    from lexical_index import load_lexical_index
+
+    retriever = HybridRetriever(load_index(index_dir), load_lexical_index(lexical_dir))
+    embeddings = [fake_embedding(query) for query in queries]
+    results = {}
+    for name, search in (("retrieval", lambda query, embedding: retriever.search(query, embedding, top_k=5)),
+                         ("retrieval_lexical", lambda query, embedding: retriever.search_lexical(query, top_k=5))):
+        for query, embedding in zip(queries[:WARMUP_QUERIES], embeddings):
+            search(query, embedding)
+        result = {}
+        latencies = []
+        with measure(result):
+            for query, embedding in zip(queries, embeddings):
+                started = time.perf_counter()
+                search(query, embedding)
+                latencies.append(time.perf_counter() - started)
+        result.update(queries=len(queries), throughput=round(len(queries) / result["elapsed_s"], 2), unit="queries/s", **latency_stats(latencies))
+        results[name] = result
+    return results
+
+
+def load_app(index_dir, lexical_dir):
+    """Importa app.py (uma vez) apontando para o índice informado, ou recarrega o índice se já importado."""
+    if "app" in sys.modules:
+        coverage_app = sys.modules["app"]
+        coverage_app.INDEX_DIR, coverage_app.LEXICAL_INDEX_DIR = index_dir, lexical_dir
+        coverage_app.reload_documentation(force=True)
+        return coverage_app
+    os.environ["DOCS_INDEX_DIR"] = index_dir
+    os.environ["LEXICAL_INDEX_DIR"] = lexical_dir
+    os.environ["INDEX_RELOAD_INTERVAL"] = "0"
+    os.environ["SLOW_REQUEST_SECONDS"] = "1000000"
+    # Os logs INFO do app (carga do índice, cada requisição) poluiriam a saída e custariam tempo no replay
+    logging.disable(logging.INFO)
+    import app as coverage_app
+    return coverage_app
+
+
+def bench_replay(coverage_app, queries, concurrency):
+    client = coverage_app.app.test_client()
+    coverage_app.QUERY_EMBEDDING_CACHE._memory.clear()
+
+    def one(query):
+        started = time.perf_counter()
+        response = client.post('/analyze_coverage', json={"query": query, "bypass_cache": True, "timings": True})
+        payload = response.get_json(silent=True) or {}
+        return time.perf_counter() - started, response.status_code, (payload.get("timings") or {}).get("stages", {})
+
+    result = {}
+    with measure(result):
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            responses = list(executor.map(one, queries))
+    latencies = [latency for latency, _, _ in responses]
+    statuses = {}
+    for _, status, _ in responses:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    stage_names = sorted({name for _, _, stages in responses for name in stages})
+    # Mediana do tempo de cada etapa, a partir do detalhamento ("timings") das respostas
+    stage_p50 = {name: round(float(np.median([stages.get(name, 0.0) for _, _, stages in responses])), 3) for name in stage_names}
+    result.update(requests=len(queries), concurrency=concurrency, statuses=statuses, stage_p50_ms=stage_p50,
+                  throughput=round(len(queries) / result["elapsed_s"], 2), unit="req/s", **latency_stats(latencies))
+    return result
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def run_size(num_docs, args, stub, queries):
+    with tempfile.TemporaryDirectory() as work_dir:
+        markdown_path = write_synthetic_markdown(os.path.join(work_dir, "consolidated.md"), num_docs, seed=args.seed, paragraphs=args.paragraphs)
+        run = {"docs": num_docs, "corpus_mb": round(os.path.getsize(markdown_path) / 1e6, 2), "stages": {}}
+        print(f"\n== {num_docs} documentos ({run['corpus_mb']} MB) ==")
+
+        raw_docs_path, lexical_dir, run["stages"]["extraction"] = bench_extraction(markdown_path, work_dir, args.workers)
+        print_stage("extraction", run["stages"]["extraction"])
+        index_dir, run["stages"]["embedding"] = bench_embedding(raw_docs_path, work_dir, stub, args)
+        print_stage("embedding", run["stages"]["embedding"])
+        for name, result in bench_retrieval(index_dir, lexical_dir, queries[:args.queries]).items():
+            run["stages"][name] = result
+            print_stage(name, result)
+
+        coverage_app = load_app(index_dir, lexical_dir)
+        stub.install(coverage_app.genai)
+        run["stages"]["replay"] = bench_replay(coverage_app, queries[:args.requests], args.concurrency)
+        print_stage("replay", run["stages"]["replay"])
+        # Libera os arquivos do índice temporário antes de removê-lo
+        coverage_app.SNAPSHOT = None
+    return run
+
+
+def print_stage(name, result):
+    latency = f" | p50 {result['p50_ms']:.2f} ms, p95 {result['p95_ms']:.2f} ms, p99 {result['p99_ms']:.2f} ms" if "p50_ms" in result else ""
+    rss = f" | pico RSS {result['peak_rss_mb']} MB" if result.get("peak_rss_mb") is not None else ""
+    print(f"  {name:<18} {result['elapsed_s']:8.2f}s | {result['throughput']:10,.1f} {result['unit']}{latency}{rss}")
+    if result.get("stage_p50_ms"):
+        print("  " + " " * 18 + " etapas (p50): " + ", ".join(f"{stage} {ms:.1f} ms" for stage, ms in result["stage_p50_ms"].items()))
+
+
+def compare(report, baseline):
+    """Imprime a variação das métricas principais em relação a um relatório anterior (mesmos tamanhos de corpus)."""
+    baseline_runs = {run["docs"]: run for run in baseline.get("runs", [])}
+    print(f"\nComparação com {baseline.get('meta', {}).get('git_revision') or 'o relatório anterior'}:")
+    for run in report["runs"]:
+        previous = baseline_runs.get(run["docs"])
+        if previous is None:
+            print(f"  {run['docs']} documentos: sem correspondente no relatório anterior")
+            continue
+        for name, result in run["stages"].items():
+            before = previous["stages"].get(name)
+            if not before:
+                continue
+            changes = []
+            for metric, higher_is_better in COMPARED_METRICS:
+                if result.get(metric) is None or not before.get(metric):
+                    continue
+                delta = (result[metric] - before[metric]) / before[metric] * 100
+                better = delta > 0 if higher_is_better else delta < 0
+                changes.append(f"{metric} {delta:+.1f}%{'' if abs(delta) < 5 else (' (melhor)' if better else ' (pior)')}")
+            print(f"  {run['docs']:>7} docs {name:<18} " + ", ".join(changes))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, nargs="+", default=[500, 2000], help="Tamanhos do corpus (documentos)")
+    parser.add_argument("--paragraphs", type=int, default=6, help="Seções por documento sintético")
+    parser.add_argument("--queries", type=int, default=200, help="Consultas da etapa de recuperação")
+    parser.add_argument("--requests", type=int, default=100, help="Requisições do replay de /analyze_coverage")
+    parser.add_argument("--concurrency", type=int, default=8, help="Requisições simultâneas no replay")
+    parser.add_argument("--workers", type=int, default=1, help="Processos da extração (1 mede o pico de RSS no próprio processo)")
+    parser.add_argument("--embed-concurrency", type=int, default=4, help="Requisições de embedding simultâneas")
+    parser.add_argument("--embed-latency", type=float, default=0.01, help="Latência (s) simulada por chamada de embedding")
+    parser.add_argument("--generate-latency", type=float, default=0.05, help="Latência (s) simulada por chamada ao modelo generativo")
+    parser.add_argument("--ann", default="auto", choices=("auto", "none", "ivf", "ivfpq"), help="Índice aproximado gravado pela etapa de embeddings")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default=None, help="Grava o relatório em JSON")
+    parser.add_argument("--compare", default=None, help="Relatório JSON anterior para comparação")
+    args = parser.parse_args()
+
+    # Os módulos do projeto exigem a chave na importação; o stub nunca a usa
+    os.environ.setdefault("GOOGLE_API_KEY", "stub")
+    stub = StubGenai(embed_latency=args.embed_latency, generate_latency=args.generate_latency)
+    queries = make_queries(max(args.queries, args.requests), args.seed)
+    output_path = os.path.abspath(args.output) if args.output else None
+    compare_path = os.path.abspath(args.compare) if args.compare else None
+    # app.py grava app_errors.log no diretório atual
+    os.chdir(tempfile.mkdtemp())
+
+    report = {
+        "meta": {
+            "git_revision": git_revision(),
+            "created_at": time.strftime('%Y-%m-%dT%H:%M:%S'),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "args": vars(args),
+        },
+        "runs": [run_size(num_docs, args, stub, queries) for num_docs in args.docs],
+    }
+
+    if output_path:
+        with open(output_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\nRelatório gravado em '{output_path}'.")
+    if compare_path:
+        with open(compare_path, 'r', encoding='utf-8') as f:
+            compare(report, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
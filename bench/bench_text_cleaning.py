@@ -0,0 +1,109 @@
+# bench/bench_text_cleaning.py
+"""
+Verifica a limpeza de texto para embedding (text_cleaning.clean_text_for_embedding) contra o
+corpus de saídas esperadas (bench/text_cleaning_golden.json) e mede o throughput (MB/s) em
+relação à implementação anterior, sobre markdown sintético.
+
+Sai com código 1 se alguma saída divergir do corpus.
+
+Uso:
+    python bench/bench_text_cleaning.py --mb 20 --repeat 3
+    python bench/bench_text_cleaning.py --update-golden   # regrava as saídas esperadas
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from synthetic import synthetic_document  # noqa: E402
+from text_cleaning import clean_text_for_embedding  # noqa: E402
+
+GOLDEN_PATH = os.path.join(BENCH_DIR, "text_cleaning_golden.json")
+
+
+def legacy_clean_text_for_embedding(text):
+    """Implementação anterior (referência para o benchmark): alternação com termos preguiçosos e três passadas."""
+    import re
+    text = re.sub(r'\[.*?\]\(.*?\)|\*\*|__|\*|_|#+|`+|^\s*[-+*]\s*|^>\s*|\|.*?-+\s*\|', '', text, flags=re.MULTILINE)
+    text = re.sub(r'\s+', ' ', text).strip()
+    text = re.sub(r'\n+', ' ', text).strip()
+    return text
+
+
+def load_golden():
+    with open(GOLDEN_PATH, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def check_golden(cases):
+    failures = 0
+    for case in cases:
+        output = clean_text_for_embedding(case["input"])
+        if output != case["expected"]:
+            failures += 1
+            print(f"DIVERGE [{case['name']}]\n  esperado: {case['expected']!r}\n  obtido:   {output!r}")
+    print(f"Corpus de referência: {len(cases) - failures}/{len(cases)} casos ok")
+    return failures == 0
+
+
+def update_golden(cases):
+    for case in cases:
+        case["expected"] = clean_text_for_embedding(case["input"])
+    with open(GOLDEN_PATH, 'w', encoding='utf-8') as f:
+        json.dump(cases, f, ensure_ascii=False, indent=2)
+        f.write("\n")
+    print(f"{len(cases)} saídas esperadas regravadas em '{GOLDEN_PATH}'.")
+
+
+def synthetic_texts(target_mb, seed=42):
+    """Documentos sintéticos (com links, listas, tabelas e código) até somar ~target_mb MB."""
+    rng = random.Random(seed)
+    texts, size = [], 0
+    while size < target_mb * 1e6:
+        text = synthetic_document(rng, len(texts), paragraphs=12)
+        texts.append(text)
+        size += len(text.encode('utf-8'))
+    return texts, size / 1e6
+
+
+def measure(clean_fn, texts, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for text in texts:
+            clean_fn(text)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mb", type=float, default=20, help="Tamanho do corpus sintético (MB)")
+    parser.add_argument("--repeat", type=int, default=3, help="Repetições (vale o melhor tempo)")
+    parser.add_argument("--update-golden", action="store_true", help="Regrava as saídas esperadas com a implementação atual")
+    args = parser.parse_args()
+
+    cases = load_golden()
+    if args.update_golden:
+        update_golden(cases)
+        return
+    golden_ok = check_golden(cases)
+
+    texts, size_mb = synthetic_texts(args.mb)
+    legacy_s = measure(legacy_clean_text_for_embedding, texts, args.repeat)
+    current_s = measure(clean_text_for_embedding, texts, args.repeat)
+    print(f"Corpus: {len(texts)} documentos, {size_mb:.1f} MB")
+    print(f"Anterior: {legacy_s:.2f}s ({size_mb / legacy_s:.1f} MB/s)")
+    print(f"Atual:    {current_s:.2f}s ({size_mb / current_s:.1f} MB/s)")
+    print(f"Speedup: {legacy_s / current_s:.2f}x")
+    if not golden_ok:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
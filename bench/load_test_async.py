@@ -0,0 +1,127 @@
+# bench/load_test_async.py
+"""
+Teste de carga do /analyze_coverage contra o modelo stub local (sem rede).
+
+Compara, em um único processo:
+  - WSGI (Flask síncrono) com um número fixo de threads de worker;
+  - ASGI (asgi.application), com o pipeline assíncrono limitado por ASYNC_MAX_INFLIGHT.
+
+Com --distinct-topics, as requisições repetem poucos tópicos (rajada de usuários analisando o
+mesmo assunto): as chamadas ao stub mostram quantas foram coalescidas pela camada upstream.py.
+
+Uso:
+    python bench/load_test_async.py --requests 200 --wsgi-threads 8 --max-inflight 64
+    python bench/load_test_async.py --requests 200 --distinct-topics 10
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def percentile(values, p):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+
+def summarize(name, latencies, elapsed, statuses):
+    print(f"{name}: {len(latencies)} requisições em {elapsed:.2f}s -> {len(latencies) / elapsed:.1f} req/s | "
+          f"p50 {percentile(latencies, 50) * 1000:.0f} ms, p95 {percentile(latencies, 95) * 1000:.0f} ms | "
+          f"status {sorted(set(statuses))}")
+
+
+def run_wsgi(flask_app, queries, threads):
+    client = flask_app.test_client()
+
+    def one(query):
+        started = time.perf_counter()
+        response = client.post('/analyze_coverage', json={"query": query, "bypass_cache": True})
+        return time.perf_counter() - started, response.status_code
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        results = list(executor.map(one, queries))
+    summarize(f"WSGI ({threads} threads)", [r[0] for r in results], time.perf_counter() - started, [r[1] for r in results])
+
+
+async def call_asgi(application, query):
+    body = json.dumps({"query": query, "bypass_cache": True}).encode()
+    scope = {"type": "http", "method": "POST", "path": "/analyze_coverage", "headers": [(b"content-type", b"application/json")]}
+    sent = {}
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            sent["status"] = message["status"]
+
+    started = time.perf_counter()
+    await application(scope, receive, send)
+    return time.perf_counter() - started, sent.get("status")
+
+
+async def run_asgi(application, queries, max_inflight):
+    started = time.perf_counter()
+    results = await asyncio.gather(*(call_asgi(application, query) for query in queries))
+    summarize(f"ASGI (max_inflight {max_inflight})", [r[0] for r in results], time.perf_counter() - started, [r[1] for r in results])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--wsgi-threads", type=int, default=8)
+    parser.add_argument("--max-inflight", type=int, default=64)
+    parser.add_argument("--docs", type=int, default=2000)
+    parser.add_argument("--embed-latency", type=float, default=0.05)
+    parser.add_argument("--generate-latency", type=float, default=0.5)
+    parser.add_argument("--distinct-topics", type=int, default=0, help="Tópicos distintos (0 = um por requisição)")
+    args = parser.parse_args()
+
+    os.environ.setdefault("GOOGLE_API_KEY", "stub")
+    os.environ["ASYNC_MAX_INFLIGHT"] = str(args.max_inflight)
+    os.environ["DOCS_INDEX_DIR"] = os.path.join(tempfile.mkdtemp(), "missing_index")
+    os.environ["INDEX_RELOAD_INTERVAL"] = "0"  # o índice do teste é montado em memória
+    os.chdir(tempfile.mkdtemp())  # app.py grava app_errors.log no diretório atual
+
+    from stub_genai import StubGenai, fake_embedding
+    import app as coverage_app
+    import asgi
+    from doc_index import DocumentIndex
+    from hybrid_search import HybridRetriever
+    from index_reload import IndexSnapshot
+
+    logging.getLogger().setLevel(logging.WARNING)
+    stub = StubGenai(args.embed_latency, args.generate_latency).install(coverage_app.genai)
+    doc_index = DocumentIndex.from_docs([
+        {"title": f"Documento {i}", "slug": f"doc-{i}", "content": f"Conteúdo do documento {i}. " * 40,
+         "filepath": f"docs/doc-{i}.md", "embedding": fake_embedding(f"Documento {i}")}
+        for i in range(args.docs)
+    ])
+    coverage_app.SNAPSHOT = IndexSnapshot(doc_index, HybridRetriever(doc_index), "bench")
+
+    queries = [f"tópico de teste {i % args.distinct_topics if args.distinct_topics else i}" for i in range(args.requests)]
+
+    def report_calls(before):
+        print(f"  chamadas ao modelo: {stub.calls['embed'] - before['embed']} embeddings, "
+              f"{stub.calls['generate'] - before['generate']} gerações para {len(queries)} requisições")
+        return dict(stub.calls)
+
+    calls = dict(stub.calls)
+    run_wsgi(coverage_app.app, queries, args.wsgi_threads)
+    calls = report_calls(calls)
+    coverage_app.QUERY_EMBEDDING_CACHE._memory.clear()
+    asyncio.run(run_asgi(asgi.application, queries, args.max_inflight))
+    report_calls(calls)
+
+
+if __name__ == "__main__":
+    main()
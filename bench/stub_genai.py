@@ -0,0 +1,91 @@
+# bench/stub_genai.py
+"""
+Substituto local e determinístico para as chamadas do google.generativeai usadas pelo projeto
+(embed_content, embed_content_async e GenerativeModel.generate_content[_async], inclusive stream=True).
+Não acessa a rede: os embeddings são derivados do hash do texto e as respostas são fixas,
+com latência artificial configurável para simular o serviço remoto.
+"""
+import asyncio
+import hashlib
+import time
+
+import numpy as np
+
+EMBEDDING_DIM = 768
+
+
+def fake_embedding(text, dim=EMBEDDING_DIM):
+    """Vetor determinístico (mesmo texto -> mesmo vetor) derivado do sha256 do texto."""
+    seed = int.from_bytes(hashlib.sha256(text.encode('utf-8')).digest()[:8], 'little')
+    return np.random.default_rng(seed).standard_normal(dim).astype(np.float32).tolist()
+
+
+class StubResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class StubGenai:
+    """
+    Instala stubs no módulo genai informado. `embed_latency` e `generate_latency` são os
+    tempos (s) simulados de cada chamada; `calls` conta as chamadas por tipo.
+    """
+
+    def __init__(self, embed_latency=0.05, generate_latency=0.5, dim=EMBEDDING_DIM, stream_chunks=8):
+        self.embed_latency = embed_latency
+        self.generate_latency = generate_latency
+        self.dim = dim
+        self.stream_chunks = stream_chunks
+        self.calls = {"embed": 0, "generate": 0}
+
+    def _embed_response(self, content):
+        self.calls["embed"] += 1
+        if isinstance(content, (list, tuple)):
+            return {"embedding": [fake_embedding(text, self.dim) for text in content]}
+        return {"embedding": fake_embedding(content, self.dim)}
+
+    def embed_content(self, model, content, **kwargs):
+        time.sleep(self.embed_latency)
+        return self._embed_response(content)
+
+    async def embed_content_async(self, model, content, **kwargs):
+        await asyncio.sleep(self.embed_latency)
+        return self._embed_response(content)
+
+    def answer_for(self, prompt):
+        digest = hashlib.sha256(str(prompt).encode('utf-8')).hexdigest()[:12]
+        return "\n".join(f"{i}. **Sugestão {i} ({digest})**\n   * Conteúdo sugerido de teste." for i in range(1, 4))
+
+    def model_class(self):
+        stub = self
+
+        class StubGenerativeModel:
+            def __init__(self, model_name=None, **kwargs):
+                self.model_name = model_name
+
+            def generate_content(self, prompt, generation_config=None, stream=False, **kwargs):
+                stub.calls["generate"] += 1
+                text = stub.answer_for(prompt)
+                if not stream:
+                    time.sleep(stub.generate_latency)
+                    return StubResponse(text)
+
+                def chunks():
+                    size = max(1, len(text) // stub.stream_chunks)
+                    for start in range(0, len(text), size):
+                        time.sleep(stub.generate_latency / stub.stream_chunks)
+                        yield StubResponse(text[start:start + size])
+                return chunks()
+
+            async def generate_content_async(self, prompt, generation_config=None, **kwargs):
+                stub.calls["generate"] += 1
+                await asyncio.sleep(stub.generate_latency)
+                return StubResponse(stub.answer_for(prompt))
+
+        return StubGenerativeModel
+
+    def install(self, genai_module):
+        genai_module.embed_content = self.embed_content
+        genai_module.embed_content_async = self.embed_content_async
+        genai_module.GenerativeModel = self.model_class()
+        return self
@@ -0,0 +1,63 @@
+# bench/synthetic.py
+"""
+Gerador de markdown consolidado sintético no formato produzido por merge-markdown.py
+("## Arquivo: <caminho>.md" + "---" + bloco Metadata_Start/Metadata_End + conteúdo).
+O resultado é determinístico para uma mesma semente.
+"""
+import random
+
+WORDS = (
+    "senha cofre acesso privilegiado sessão usuário política credencial rotação auditoria "
+    "dispositivo integração certificado chave token relatório alerta servidor conexão proxy "
+    "password vault session policy credential rotation audit device integration certificate "
+    "key report alert server connection scan discovery ssh rdp jit workflow approval"
+).split()
+
+
+def _sentence(rng, min_words=6, max_words=18):
+    words = [rng.choice(WORDS) for _ in range(rng.randint(min_words, max_words))]
+    return " ".join(words).capitalize() + "."
+
+
+def synthetic_document(rng, doc_id, paragraphs=6):
+    """Corpo de um documento com metadados e markdown variado (títulos, listas, links, tabela, código)."""
+    title = " ".join(rng.choice(WORDS) for _ in range(3)).title()
+    lines = [
+        "## Metadata_Start",
+        "## code: en",
+        f"## title: {title} {doc_id}",
+        f"## slug: {title.lower().replace(' ', '-')}-{doc_id}",
+        "## contentType: Markdown",
+        "## Metadata_End",
+    ]
+    if rng.random() < 0.1:
+        lines.append(":::(Internal) (Private notes)")
+    for p in range(paragraphs):
+        lines.append(f"## {_sentence(rng, 2, 5)}")
+        lines.append(" ".join(_sentence(rng) for _ in range(rng.randint(2, 6))))
+        kind = rng.random()
+        if kind < 0.3:
+            lines.extend(f"* **{rng.choice(WORDS)}**: {_sentence(rng)}" for _ in range(3))
+        elif kind < 0.5:
+            lines.append(f"Veja [{rng.choice(WORDS)}](https://docs.example.com/{rng.choice(WORDS)}/{doc_id}) para detalhes.")
+        elif kind < 0.65:
+            lines.extend(["| Campo | Descrição |", "| --- | --- |", f"| `{rng.choice(WORDS)}` | {_sentence(rng)} |"])
+        elif kind < 0.75:
+            lines.extend(["```bash", f"senhasegura --{rng.choice(WORDS)} {rng.randint(1, 999)}", "```"])
+    return "\n".join(lines)
+
+
+def iter_synthetic_markdown(num_docs, seed=42, paragraphs=6):
+    """Produz o markdown consolidado em pedaços (um por documento), sem montar tudo em memória."""
+    rng = random.Random(seed)
+    yield "# Documentação Consolidada - Segura\n\n---\n\n"
+    for doc_id in range(num_docs):
+        path = f"{rng.choice(WORDS)}/{rng.choice(WORDS)}/doc-{doc_id}.md"
+        yield f"\n\n## Arquivo: {path}\n\n---\n\n{synthetic_document(rng, doc_id, paragraphs)}\n\n"
+
+
+def write_synthetic_markdown(output_path, num_docs, seed=42, paragraphs=6):
+    with open(output_path, 'w', encoding='utf-8') as f:
+        for chunk in iter_synthetic_markdown(num_docs, seed=seed, paragraphs=paragraphs):
+            f.write(chunk)
+    return output_path
@@ -0,0 +1,112 @@
+# chunking.py
+"""
+Divisão dos documentos em trechos (chunks) para indexação por passagem.
+
+Os trechos respeitam os títulos markdown (um trecho nunca mistura duas seções), são
+montados por parágrafos até `max_chars` caracteres e se sobrepõem em `overlap_chars`
+caracteres dentro da mesma seção, para que uma ideia dividida entre dois trechos
+continue recuperável.
+"""
+import re
+
+DEFAULT_CHUNK_CHARS = 1500
+DEFAULT_CHUNK_OVERLAP = 200
+
+HEADING_PATTERN = re.compile(r'^(#{1,6})\s+(.*?)\s*#*\s*$')
+FENCE_PATTERN = re.compile(r'^\s*(```|~~~)')
+PARAGRAPH_SPLIT_PATTERN = re.compile(r'\n\s*\n')
+SENTENCE_SPLIT_PATTERN = re.compile(r'(?<=[.!?])\s+')
+
+
+def split_sections(content):
+    """
+    Divide o conteúdo em seções pelos títulos markdown (ignorando blocos de código).
+    Produz tuplas (caminho_de_titulos, texto), onde o caminho é uma lista como ["Instalação", "Requisitos"].
+    """
+    heading_stack = []
+    section_lines = []
+    in_fence = False
+
+    for line in content.splitlines():
+        if FENCE_PATTERN.match(line):
+            in_fence = not in_fence
+        heading_match = None if in_fence else HEADING_PATTERN.match(line)
+        if heading_match:
+            text = "\n".join(section_lines).strip()
+            if text:
+                yield [title for _, title in heading_stack], text
+            section_lines = []
+            level = len(heading_match.group(1))
+            heading_stack = [(lvl, title) for lvl, title in heading_stack if lvl < level]
+            heading_stack.append((level, heading_match.group(2)))
+            continue
+        section_lines.append(line)
+
+    text = "\n".join(section_lines).strip()
+    if text:
+        yield [title for _, title in heading_stack], text
+
+
+def _split_long_block(block, max_chars):
+    """Quebra um parágrafo maior que max_chars por frases e, em último caso, por caracteres."""
+    pieces = []
+    current = ""
+    for sentence in SENTENCE_SPLIT_PATTERN.split(block):
+        while len(sentence) > max_chars:
+            if current:
+                pieces.append(current)
+                current = ""
+            pieces.append(sentence[:max_chars])
+            sentence = sentence[max_chars:]
+        if current and len(current) + 1 + len(sentence) > max_chars:
+            pieces.append(current)
+            current = sentence
+        else:
+            current = f"{current} {sentence}" if current else sentence
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def _overlap_tail(text, overlap_chars):
+    """Últimos ~overlap_chars caracteres do trecho, começando em um limite de palavra."""
+    if overlap_chars <= 0 or len(text) <= overlap_chars:
+        return ""
+    tail = text[-overlap_chars:]
+    space = tail.find(" ")
+    return tail[space + 1:] if space != -1 else tail
+
+
+def chunk_text(text, max_chars=DEFAULT_CHUNK_CHARS, overlap_chars=DEFAULT_CHUNK_OVERLAP):
+    """Divide o texto de uma seção em trechos de até max_chars (mais a sobreposição) por parágrafos."""
+    blocks = []
+    for paragraph in PARAGRAPH_SPLIT_PATTERN.split(text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        blocks.extend(_split_long_block(paragraph, max_chars) if len(paragraph) > max_chars else [paragraph])
+
+    chunks = []
+    current = ""
+    for block in blocks:
+        if current and len(current) + 2 + len(block) > max_chars:
+            chunks.append(current)
+            tail = _overlap_tail(current, overlap_chars)
+            current = f"{tail}\n\n{block}" if tail else block
+        else:
+            current = f"{current}\n\n{block}" if current else block
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def chunk_document(content, max_chars=DEFAULT_CHUNK_CHARS, overlap_chars=DEFAULT_CHUNK_OVERLAP):
+    """
+    Divide o conteúdo de um documento em trechos. Retorna uma lista de dicionários
+    {"heading": "Seção > Subseção", "text": ..., "position": n}, na ordem do documento.
+    """
+    chunks = []
+    for heading_path, section_text in split_sections(content):
+        for text in chunk_text(section_text, max_chars, overlap_chars):
+            chunks.append({"heading": " > ".join(heading_path), "text": text, "position": len(chunks)})
+    return chunks
@@ -0,0 +1,203 @@
+# coverage_audit.py
+"""
+Auditoria de cobertura em lote: analisa uma lista de tópicos (CSV ou JSONL) e grava um
+resultado JSON por linha no arquivo de saída, à medida que as análises terminam.
+
+Os embeddings das consultas são gerados em lotes, a recuperação de todos os tópicos é feita
+com produtos matriz-matriz sobre o índice e as chamadas ao modelo generativo rodam com
+concorrência limitada (e, opcionalmente, limites de QPS e tokens por minuto).
+
+Retomada: ao reiniciar com o mesmo arquivo de saída, os tópicos que já têm resultado com
+status "ok" são pulados; os que falharam são refeitos.
+
+Formato dos tópicos:
+  - CSV: coluna "query" (ou "topic"; senão a primeira coluna) e coluna "id" opcional.
+  - JSONL: uma string por linha ou um objeto com "query" (ou "topic") e "id" opcional.
+Sem "id", o tópico é identificado pelo hash da consulta normalizada.
+
+Uso:
+    python coverage_audit.py topicos.csv --output auditoria.jsonl --concurrency 4 --qps 2
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import time
+from contextlib import closing
+
+from query_cache import normalize_query
+from text_cleaning import content_hash
+
+DEFAULT_CONCURRENCY = 4
+QUERY_COLUMNS = ("query", "topic")
+STATUS_OK = "ok"
+STATUS_ERROR = "error"
+
+
+def topic_id(query):
+    return content_hash(normalize_query(query))[:16]
+
+
+def make_topic(query, topic_id_value=None):
+    """Tópico normalizado {"id", "query"}, ou None se a consulta estiver vazia."""
+    query = (query or "").strip()
+    if not query:
+        return None
+    topic_id_value = str(topic_id_value).strip() if topic_id_value not in (None, "") else ""
+    return {"id": topic_id_value or topic_id(query), "query": query}
+
+
+def topic_from_item(item):
+    """Tópico a partir de uma string ou de um dicionário com "query"/"topic" e "id" opcional."""
+    if isinstance(item, str):
+        return make_topic(item)
+    if isinstance(item, dict):
+        query = next((item[column] for column in QUERY_COLUMNS if isinstance(item.get(column), str)), None)
+        return make_topic(query, item.get("id"))
+    return None
+
+
+def parse_csv_topics(text):
+    rows = list(csv.reader(io.StringIO(text)))
+    if not rows:
+        return []
+    header = [column.strip().casefold() for column in rows[0]]
+    query_column = next((header.index(column) for column in QUERY_COLUMNS if column in header), None)
+    if query_column is None:
+        # Sem cabeçalho reconhecido: a primeira coluna é a consulta e todas as linhas são tópicos
+        return [topic for topic in (make_topic(row[0]) for row in rows if row) if topic]
+    id_column = header.index("id") if "id" in header else None
+    topics = []
+    for row in rows[1:]:
+        if len(row) <= query_column:
+            continue
+        topic = make_topic(row[query_column], row[id_column] if id_column is not None and id_column < len(row) else None)
+        if topic:
+            topics.append(topic)
+    return topics
+
+
+def parse_jsonl_topics(text):
+    topics = []
+    for line_number, line in enumerate(text.splitlines(), start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            topic = topic_from_item(json.loads(line))
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Linha {line_number} do arquivo de tópicos não é um JSON válido: {e}") from e
+        if topic:
+            topics.append(topic)
+    return topics
+
+
+def parse_topics(text, filename=""):
+    """
+    Lê os tópicos de um texto CSV ou JSONL (pela extensão de `filename`; sem extensão
+    conhecida, JSONL se a primeira linha não vazia começar com '{' ou '"').
+    Tópicos repetidos (mesmo id) são mantidos uma única vez.
+    """
+    extension = os.path.splitext(filename)[1].lower()
+    if extension in (".jsonl", ".ndjson", ".json"):
+        topics = parse_jsonl_topics(text)
+    elif extension == ".csv":
+        topics = parse_csv_topics(text)
+    else:
+        first_line = next((line.strip() for line in text.splitlines() if line.strip()), "")
+        topics = parse_jsonl_topics(text) if first_line[:1] in ('{', '"') else parse_csv_topics(text)
+    return unique_topics(topics)
+
+
+def unique_topics(topics):
+    """Tópicos na ordem recebida, mantendo a primeira ocorrência de cada id."""
+    unique = {}
+    for topic in topics:
+        unique.setdefault(topic["id"], topic)
+    return list(unique.values())
+
+
+def load_topics(path):
+    # utf-8-sig: planilhas exportadas como CSV costumam ter BOM
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        return parse_topics(f.read(), path)
+
+
+def read_completed_ids(output_path):
+    """Ids dos tópicos já concluídos com sucesso no arquivo de saída (linhas inválidas, como uma última linha truncada, são ignoradas)."""
+    completed = set()
+    if not os.path.exists(output_path):
+        return completed
+    with open(output_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if isinstance(result, dict) and result.get("status") == STATUS_OK and result.get("id") is not None:
+                completed.add(str(result["id"]))
+    return completed
+
+
+def ensure_newline_terminated(output_path):
+    """Se a execução anterior foi interrompida no meio de uma linha, começa os novos resultados numa linha nova."""
+    if not os.path.exists(output_path) or os.path.getsize(output_path) == 0:
+        return
+    with open(output_path, 'rb+') as f:
+        f.seek(-1, os.SEEK_END)
+        if f.read(1) != b'\n':
+            f.write(b'\n')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("topics", help="Arquivo de tópicos (.csv ou .jsonl)")
+    parser.add_argument("--output", default="coverage_audit.jsonl", help="Arquivo JSONL de resultados (também usado para retomar)")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY, help="Chamadas simultâneas ao modelo generativo")
+    parser.add_argument("--qps", type=float, default=None, help="Limite de chamadas por segundo ao modelo generativo")
+    parser.add_argument("--tpm", type=float, default=None, help="Limite de tokens (estimados) por minuto enviados ao modelo generativo")
+    parser.add_argument("--embed-batch-size", type=int, default=None, help="Consultas por chamada de embedding")
+    parser.add_argument("--top-k", type=int, default=5, help="Documentos recuperados por tópico")
+    parser.add_argument("--lexical", action="store_true", help="Recuperação apenas lexical (BM25), sem embeddings")
+    parser.add_argument("--bypass-cache", action="store_true", help="Ignora o cache de análises")
+    args = parser.parse_args()
+
+    topics = load_topics(args.topics)
+    completed = read_completed_ids(args.output)
+    pending = [topic for topic in topics if topic["id"] not in completed]
+    print(f"{len(topics)} tópicos em '{args.topics}': {len(topics) - len(pending)} já concluídos em '{args.output}', {len(pending)} pendentes.")
+    if not pending:
+        return
+
+    # Importado só aqui: carrega a configuração, a API e o índice da documentação
+    import app as coverage_app
+    if not coverage_app.documentation_loaded():
+        print("Erro: a documentação não foi carregada. Execute 'extract_data_from_markdown.py' seguido por 'generate-embedings.py'.")
+        raise SystemExit(1)
+
+    ensure_newline_terminated(args.output)
+    counts = {STATUS_OK: 0, STATUS_ERROR: 0, "cache_hits": 0}
+    started = time.monotonic()
+    # closing: com Ctrl-C, as análises ainda na fila são canceladas em vez de concluídas
+    with open(args.output, 'a', encoding='utf-8') as out, closing(coverage_app.iter_coverage_audit(
+            pending, concurrency=args.concurrency, qps=args.qps, tpm=args.tpm, use_cache=not args.bypass_cache,
+            top_k=args.top_k, lexical_only=args.lexical, embed_batch_size=args.embed_batch_size,
+    )) as results:
+        for done, result in enumerate(results, start=1):
+            out.write(json.dumps(result, ensure_ascii=False) + '\n')
+            out.flush()
+            counts[result["status"]] += 1
+            counts["cache_hits"] += bool(result.get("cache_hit"))
+            if done % 10 == 0 or done == len(pending):
+                print(f"  {done}/{len(pending)} tópicos ({counts[STATUS_ERROR]} com erro, {time.monotonic() - started:.1f}s)")
+
+    elapsed = time.monotonic() - started
+    print(f"Concluído: {counts[STATUS_OK]} ok, {counts[STATUS_ERROR]} com erro, {counts['cache_hits']} do cache, "
+          f"{elapsed:.1f}s ({len(pending) / max(elapsed, 1e-9):.2f} tópicos/s). Resultados em '{args.output}'.")
+    if counts[STATUS_ERROR]:
+        print("Execute novamente com o mesmo --output para refazer apenas os tópicos com erro.")
+
+
+if __name__ == "__main__":
+    main()
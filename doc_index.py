@@ -0,0 +1,447 @@
+# doc_index.py
+"""
+Índice binário da documentação processada, com um embedding por trecho (chunk).
+
+Formato em disco (uma geração por subdiretório, <diretório do índice>/<versão>/, com a geração
+ativa indicada pelo arquivo CURRENT; ver index_reload.py):
+  - embeddings.npy: matriz float32 (n_chunks x dim) com embeddings normalizados (L2),
+    aberta com np.memmap para que todos os workers compartilhem as páginas via cache do SO.
+  - chunks.jsonl + chunks.offsets.npy: um trecho (seção, texto, hash) por linha e os offsets
+    (int64, n_chunks + 1) de cada linha, para ler apenas os trechos recuperados.
+  - chunk_doc_ids.npy: documento (int32) de cada linha de embeddings.npy.
+  - docs.jsonl + docs.offsets.npy: metadados dos documentos (título, slug, caminho, hash).
+  - manifest.json: versão do formato, versão (geração) do índice, quantidades, dimensão, modelo e
+    parâmetros do índice aproximado.
+  - ivf_*.npy / pq_*.npy (opcionais): índice aproximado IVF/IVF-PQ (ver ann_index.py); com ele,
+    os trechos são gravados agrupados por lista do IVF.
+
+A linha i de embeddings.npy corresponde ao registro i de chunks.jsonl.
+
+Uso como script (conversão do JSON legado):
+    python doc_index.py processed_docs.json processed_index
+"""
+import json
+import logging
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+from ann_index import ANN_AUTO, ANN_NONE, build_ivf, load_ivf, resolve_ann_kind
+from index_reload import discard_generation, new_generation, publish_generation, resolve_index_dir
+
+INDEX_FORMAT_VERSION = 2
+EMBEDDINGS_FILE = "embeddings.npy"
+CHUNKS_FILE = "chunks.jsonl"
+CHUNK_OFFSETS_FILE = "chunks.offsets.npy"
+CHUNK_DOC_IDS_FILE = "chunk_doc_ids.npy"
+DOCS_FILE = "docs.jsonl"
+OFFSETS_FILE = "docs.offsets.npy"
+MANIFEST_FILE = "manifest.json"
+
+# Trechos recuperados por documento que entram no prompt
+DEFAULT_PASSAGES_PER_DOC = 3
+# Memória máxima da matriz de scores (consultas x trechos) de cada bloco da busca em lote
+BATCH_SCORES_MAX_BYTES = 256 * 1024 * 1024
+
+
+def build_embedding_matrix(docs):
+    """
+    Monta a matriz de embeddings normalizados e a lista de itens (documentos ou trechos) válidos.
+    Embeddings ausentes, vazios, não finitos, nulos ou com dimensão diferente da
+    predominante são descartados aqui, uma única vez, e não a cada requisição.
+    Retorna uma tupla (matriz, documentos_validos).
+    """
+    dims = {}
+    for doc_info in docs:
+        embedding = doc_info.get("embedding")
+        if embedding:
+            dims[len(embedding)] = dims.get(len(embedding), 0) + 1
+    if not dims:
+        return np.empty((0, 0), dtype=np.float32), []
+    dim = max(dims, key=dims.get)
+
+    valid_docs = [doc_info for doc_info in docs if doc_info.get("embedding") and len(doc_info["embedding"]) == dim]
+    matrix = np.array([doc_info["embedding"] for doc_info in valid_docs], dtype=np.float32).reshape(len(valid_docs), dim)
+    return normalize_embedding_matrix(matrix, valid_docs, skipped=len(docs) - len(valid_docs))
+
+
+def normalize_embedding_matrix(matrix, items, skipped=0):
+    """
+    Normaliza as linhas de `matrix` (alinhada a `items`), descartando as não finitas ou nulas
+    (por exemplo, linhas NaN de itens sem embedding). Retorna uma tupla (matriz, itens_validos).
+    """
+    norms = np.linalg.norm(matrix, axis=1)
+    keep = np.isfinite(norms) & (norms > 0)
+    matrix = np.ascontiguousarray(matrix[keep] / norms[keep, None])
+    table = [item for item, ok in zip(items, keep) if ok]
+
+    skipped += len(items) - len(table)
+    if skipped:
+        logging.warning(f"{skipped} item(ns) com embedding inválido ou incompatível (dimensão esperada: {matrix.shape[1]}) foram ignorados na indexação.")
+    return matrix, table
+
+
+class DocStore:
+    """
+    Leitor de um armazenamento JSON Lines indexado por offsets (ex.: docs.jsonl + docs.offsets.npy).
+    Cada acesso lê e decodifica apenas o registro solicitado.
+    """
+
+    def __init__(self, docs_path, offsets_path):
+        self.offsets = np.load(offsets_path, mmap_mode='r')
+        self._file = open(docs_path, 'rb')
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, doc_id):
+        if doc_id < 0 or doc_id >= len(self):
+            raise IndexError(doc_id)
+        start, end = int(self.offsets[doc_id]), int(self.offsets[doc_id + 1])
+        with self._lock:
+            self._file.seek(start)
+            raw = self._file.read(end - start)
+        return json.loads(raw.decode('utf-8'))
+
+    def __iter__(self):
+        for doc_id in range(len(self)):
+            yield self[doc_id]
+
+    def close(self):
+        self._file.close()
+
+
+class DocumentIndex:
+    """
+    Índice de busca por similaridade de cosseno em nível de trecho.
+    `embeddings` é uma matriz float32 normalizada (em memória ou memmap) alinhada a `chunks`;
+    `chunk_doc_ids[i]` é o documento do trecho i e `docs` é qualquer sequência indexável
+    (lista ou DocStore) com os metadados dos documentos.
+    `ann` é o índice aproximado (IVFIndex) opcional; sem ele, a busca é exata.
+    """
+
+    def __init__(self, embeddings, chunks, chunk_doc_ids, docs, manifest=None, ann=None):
+        self.embeddings = embeddings
+        self.chunks = chunks
+        self.chunk_doc_ids = chunk_doc_ids
+        self.docs = docs
+        self.manifest = manifest or {}
+        self.ann = ann
+        self._doc_chunk_order = None
+        self._doc_chunk_offsets = None
+
+    def __len__(self):
+        return len(self.docs)
+
+    @property
+    def chunk_count(self):
+        return len(self.chunks)
+
+    @property
+    def dim(self):
+        return self.embeddings.shape[1] if self.embeddings.ndim == 2 else 0
+
+    def get_doc(self, doc_id):
+        return self.docs[doc_id]
+
+    def close(self):
+        for store in (self.chunks, self.docs):
+            if isinstance(store, DocStore):
+                store.close()
+
+    def normalize_query(self, query_embedding):
+        """Vetor da consulta normalizado, ou None se for inválido/incompatível."""
+        query_vector = np.asarray(query_embedding, dtype=np.float32).ravel()
+        if query_vector.shape[0] != self.dim:
+            logging.warning(f"Embedding da consulta com dimensão {query_vector.shape[0]}, esperado {self.dim}.")
+            return None
+        query_norm = np.linalg.norm(query_vector)
+        if not np.isfinite(query_norm) or query_norm == 0:
+            logging.warning("Embedding da consulta nulo ou inválido.")
+            return None
+        return query_vector / query_norm
+
+    def group_by_document(self, chunk_ids, chunk_scores, top_k, passages_per_doc=DEFAULT_PASSAGES_PER_DOC):
+        """
+        Agrupa trechos (já ordenados por similaridade decrescente) por documento, sem ler os trechos.
+        Retorna até top_k tuplas (doc_id, similaridade, [(chunk_id, similaridade), ...]), onde a
+        similaridade do documento é a do melhor trecho e cada documento traz até `passages_per_doc` trechos.
+        """
+        grouped = {}
+        for chunk_id, score in zip(chunk_ids, chunk_scores):
+            doc_id = int(self.chunk_doc_ids[chunk_id])
+            if doc_id not in grouped:
+                if len(grouped) == top_k:
+                    continue
+                grouped[doc_id] = (float(score), [])
+            hits = grouped[doc_id][1]
+            if len(hits) < passages_per_doc:
+                hits.append((int(chunk_id), float(score)))
+        return [(doc_id, score, hits) for doc_id, (score, hits) in grouped.items()]
+
+    def document_with_passages(self, doc_id, hits):
+        """Metadados do documento com os trechos `hits` em doc_info["passages"], na ordem do documento."""
+        doc_info = dict(self.get_doc(doc_id))
+        passages = []
+        for chunk_id, chunk_score in hits:
+            chunk = self.chunks[chunk_id]
+            passages.append({"heading": chunk.get("heading", ""), "text": chunk["text"], "position": chunk.get("position", 0), "score": chunk_score})
+        doc_info["passages"] = sorted(passages, key=lambda passage: passage["position"])
+        return doc_info
+
+    def doc_chunk_ids(self, doc_id):
+        """Trechos de um documento (a ordem dos trechos no índice não agrupa os documentos quando há IVF)."""
+        if self._doc_chunk_order is None:
+            self._doc_chunk_order = np.argsort(self.chunk_doc_ids, kind='stable')
+            self._doc_chunk_offsets = np.searchsorted(self.chunk_doc_ids[self._doc_chunk_order], np.arange(len(self.docs) + 1))
+        return self._doc_chunk_order[self._doc_chunk_offsets[doc_id]:self._doc_chunk_offsets[doc_id + 1]]
+
+    def best_chunks(self, doc_id, query_vector=None, chunk_scorer=None, passages_per_doc=DEFAULT_PASSAGES_PER_DOC):
+        """
+        Melhores trechos de um documento, pela similaridade com `query_vector` ou, sem ela, por
+        `chunk_scorer(trecho)`. Retorna (similaridade, [(chunk_id, similaridade), ...]).
+        """
+        chunk_ids = self.doc_chunk_ids(doc_id)
+        if len(chunk_ids) == 0:
+            return 0.0, []
+        if query_vector is not None:
+            chunk_ids = np.sort(chunk_ids)
+            scores = np.asarray(self.embeddings[chunk_ids]) @ query_vector
+        else:
+            scores = np.array([chunk_scorer(self.chunks[int(chunk_id)]) for chunk_id in chunk_ids], dtype=np.float32)
+        order = np.argsort(-scores, kind='stable')[:passages_per_doc]
+        hits = [(int(chunk_ids[i]), float(scores[i])) for i in order]
+        return hits[0][1], hits
+
+    def rank_documents(self, query_vector, top_k=5, passages_per_doc=DEFAULT_PASSAGES_PER_DOC, nprobe=None, exact=False):
+        """
+        Documentos mais similares ao vetor (já normalizado) da consulta, sem ler os trechos.
+        Retorna uma lista de tuplas (doc_id, similaridade, hits), como group_by_document.
+        """
+        if self.chunk_count == 0 or top_k <= 0:
+            return []
+        if self.ann is not None and not exact:
+            top_ids, top_scores = self.search_ann(query_vector, top_k, passages_per_doc, nprobe)
+            return self.group_by_document(top_ids, top_scores, top_k, passages_per_doc)
+
+        # Os embeddings já estão normalizados: a similaridade de cosseno é um único produto matriz-vetor
+        return self.rank_scores(self.embeddings @ query_vector, top_k, passages_per_doc)
+
+    def rank_documents_batch(self, query_vectors, top_k=5, passages_per_doc=DEFAULT_PASSAGES_PER_DOC, max_block_bytes=BATCH_SCORES_MAX_BYTES):
+        """
+        Versão em lote de rank_documents (sempre exata) para uma matriz de consultas normalizadas:
+        os scores de cada bloco de consultas saem de um único produto matriz-matriz.
+        Retorna uma lista (uma por consulta) de listas de tuplas (doc_id, similaridade, hits).
+        """
+        if self.chunk_count == 0 or top_k <= 0:
+            return [[] for _ in range(len(query_vectors))]
+        block_size = max(1, int(max_block_bytes // (4 * self.chunk_count)))
+        results = []
+        for start in range(0, len(query_vectors), block_size):
+            block_scores = np.asarray(query_vectors[start:start + block_size], dtype=np.float32) @ self.embeddings.T
+            results.extend(self.rank_scores(scores, top_k, passages_per_doc) for scores in block_scores)
+        return results
+
+    def rank_scores(self, scores, top_k, passages_per_doc=DEFAULT_PASSAGES_PER_DOC):
+        """Documentos a partir dos scores de todos os trechos (busca exata)."""
+        # Candidatos suficientes para preencher top_k documentos distintos; amplia se muitos trechos forem do mesmo documento
+        n = len(scores)
+        candidates = min(n, top_k * passages_per_doc * 4)
+        while True:
+            top_ids = np.argpartition(-scores, candidates - 1)[:candidates]
+            top_ids = top_ids[np.argsort(-scores[top_ids], kind='stable')]
+            if candidates == n or len(np.unique(self.chunk_doc_ids[top_ids])) >= top_k:
+                break
+            candidates = min(n, candidates * 4)
+
+        return self.group_by_document(top_ids, scores[top_ids], top_k, passages_per_doc)
+
+    def search(self, query_embedding, top_k=5, passages_per_doc=DEFAULT_PASSAGES_PER_DOC, nprobe=None, exact=False):
+        """
+        Retorna os top_k documentos mais similares como lista de tuplas (similaridade, doc_info),
+        com os trechos correspondentes em doc_info["passages"].
+        Com índice aproximado, visita `nprobe` listas (padrão do índice); `exact=True` força a busca exata.
+        """
+        if self.chunk_count == 0 or top_k <= 0:
+            return []
+        query_vector = self.normalize_query(query_embedding)
+        if query_vector is None:
+            return []
+        ranked = self.rank_documents(query_vector, top_k, passages_per_doc, nprobe, exact)
+        return [(score, self.document_with_passages(doc_id, hits)) for doc_id, score, hits in ranked]
+
+    def search_ann(self, query_vector, top_k, passages_per_doc, nprobe=None):
+        """
+        Candidatos do índice aproximado; dobra nprobe enquanto as listas visitadas não
+        contiverem top_k documentos distintos. Retorna (ids, scores) em ordem decrescente.
+        """
+        candidates = top_k * passages_per_doc * 4
+        nprobe = nprobe or self.ann.nprobe
+        while True:
+            top_ids, top_scores = self.ann.search(self.embeddings, query_vector, candidates, nprobe)
+            if nprobe >= self.ann.nlist or len(np.unique(self.chunk_doc_ids[top_ids])) >= top_k:
+                return top_ids, top_scores
+            nprobe = min(self.ann.nlist, nprobe * 2)
+
+    @classmethod
+    def from_docs(cls, docs):
+        """
+        Constrói um índice em memória a partir da lista de documentos no formato JSON legado
+        (um embedding por documento): cada documento vira um único trecho com o conteúdo completo.
+        """
+        chunks = [whole_document_chunk(doc_id, doc_info) for doc_id, doc_info in enumerate(docs)]
+        matrix, valid_chunks = build_embedding_matrix(chunks)
+        chunk_doc_ids = np.array([chunk["doc"] for chunk in valid_chunks], dtype=np.int32)
+        manifest = {"format_version": INDEX_FORMAT_VERSION, "doc_count": len(docs), "chunk_count": len(valid_chunks), "dim": matrix.shape[1] if matrix.size else 0}
+        return cls(matrix, valid_chunks, chunk_doc_ids, docs, manifest)
+
+
+def whole_document_chunk(doc_id, doc_info):
+    """Trecho único com o conteúdo completo do documento (índices legados, sem chunking)."""
+    return {"doc": doc_id, "heading": "", "text": doc_info.get("content", ""), "position": 0,
+            "content_hash": doc_info.get("content_hash"), "embedding": doc_info.get("embedding")}
+
+
+def _write_jsonl_store(records, path, exclude=()):
+    """Grava registros em JSON Lines e retorna os offsets de cada linha."""
+    offsets = np.zeros(len(records) + 1, dtype=np.int64)
+    with open(path, 'wb') as f:
+        for i, record in enumerate(records):
+            record = {key: value for key, value in record.items() if key not in exclude}
+            line = json.dumps(record, ensure_ascii=False).encode('utf-8') + b'\n'
+            f.write(line)
+            offsets[i + 1] = offsets[i] + len(line)
+    return offsets
+
+
+def _save_npy(array, path):
+    with open(path, 'wb') as f:
+        np.save(f, array)
+
+
+def write_index(docs, chunks, index_dir, embedding_model=None, ann=ANN_AUTO, nlist=None, pq_m=None, embeddings=None):
+    """
+    Grava uma nova geração do índice binário em `index_dir` e a publica (ver index_reload.py).
+    `docs` são os metadados dos documentos e `chunks` os trechos, cada um com "doc" (posição
+    do documento em `docs`), "heading", "text", "position", "content_hash" e "embedding".
+    `embeddings`, se informado, é uma matriz (trechos x dimensão) alinhada a `chunks` usada no
+    lugar do campo "embedding" (linhas NaN para trechos sem embedding).
+    Trechos sem embedding válido e documentos sem nenhum trecho válido não são incluídos.
+    `ann` escolhe o índice aproximado ("auto", "none", "ivf" ou "ivfpq"; ver ann_index.py).
+    Retorna uma tupla (documentos_gravados, trechos_gravados).
+    """
+    if embeddings is not None:
+        matrix, valid_chunks = normalize_embedding_matrix(np.asarray(embeddings, dtype=np.float32), chunks)
+    else:
+        matrix, valid_chunks = build_embedding_matrix(chunks)
+    os.makedirs(index_dir, exist_ok=True)
+
+    # Renumera os documentos que têm pelo menos um trecho válido
+    doc_ids = {}
+    for chunk in valid_chunks:
+        doc_ids.setdefault(chunk["doc"], len(doc_ids))
+    kept_docs = [docs[old_id] for old_id in doc_ids]
+    chunk_doc_ids = np.array([doc_ids[chunk["doc"]] for chunk in valid_chunks], dtype=np.int32)
+
+    ann_kind = resolve_ann_kind(ann, len(valid_chunks)) if valid_chunks else ANN_NONE
+    ann_index = None
+    if ann_kind != ANN_NONE:
+        # Os trechos passam a ser gravados agrupados por lista do IVF
+        order, ann_index = build_ivf(matrix, ann_kind, nlist=nlist, pq_m=pq_m)
+        matrix = matrix[order]
+        valid_chunks = [valid_chunks[i] for i in order]
+        chunk_doc_ids = chunk_doc_ids[order]
+
+    # A geração só fica visível para os leitores quando CURRENT passa a apontar para ela
+    version, generation_dir = new_generation(index_dir)
+    try:
+        paths = {name: os.path.join(generation_dir, name) for name in
+                 (EMBEDDINGS_FILE, CHUNKS_FILE, CHUNK_OFFSETS_FILE, CHUNK_DOC_IDS_FILE, DOCS_FILE, OFFSETS_FILE, MANIFEST_FILE)}
+
+        chunk_offsets = _write_jsonl_store(valid_chunks, paths[CHUNKS_FILE], exclude=("embedding", "doc"))
+        doc_offsets = _write_jsonl_store(kept_docs, paths[DOCS_FILE], exclude=("embedding", "content"))
+        _save_npy(matrix.astype(np.float32, copy=False), paths[EMBEDDINGS_FILE])
+        _save_npy(chunk_offsets, paths[CHUNK_OFFSETS_FILE])
+        _save_npy(chunk_doc_ids, paths[CHUNK_DOC_IDS_FILE])
+        _save_npy(doc_offsets, paths[OFFSETS_FILE])
+        if ann_index is not None:
+            ann_index.save(generation_dir)
+
+        manifest = {
+            "format_version": INDEX_FORMAT_VERSION,
+            "doc_count": len(kept_docs),
+            "chunk_count": len(valid_chunks),
+            "dim": int(matrix.shape[1]) if matrix.size else 0,
+            "embedding_model": embedding_model,
+            "ann": ann_index.manifest() if ann_index is not None else None,
+            "index_version": version,
+            "created_at": time.strftime('%Y-%m-%dT%H:%M:%S'),
+        }
+        with open(paths[MANIFEST_FILE], 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=4)
+    except BaseException:
+        discard_generation(generation_dir)
+        raise
+    publish_generation(index_dir, version, MANIFEST_FILE)
+    return len(kept_docs), len(valid_chunks)
+
+
+def index_exists(index_dir):
+    return os.path.exists(os.path.join(resolve_index_dir(index_dir), MANIFEST_FILE))
+
+
+def load_index(index_dir):
+    """
+    Abre a geração ativa do índice binário de `index_dir` (ou o diretório de uma geração).
+    Os embeddings e os offsets são mapeados em memória (np.memmap); os trechos e os metadados
+    dos documentos só são lidos sob demanda. O índice aproximado é carregado se o manifest o declarar.
+    """
+    index_dir = resolve_index_dir(index_dir)
+    with open(os.path.join(index_dir, MANIFEST_FILE), 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    if manifest.get("format_version") != INDEX_FORMAT_VERSION:
+        raise ValueError(f"Versão de formato do índice não suportada: {manifest.get('format_version')}. "
+                         f"Gere o índice novamente com 'generate-embedings.py --full' ou reconverta o JSON legado com doc_index.py.")
+
+    embeddings = np.load(os.path.join(index_dir, EMBEDDINGS_FILE), mmap_mode='r')
+    chunk_doc_ids = np.load(os.path.join(index_dir, CHUNK_DOC_IDS_FILE), mmap_mode='r')
+    chunks = DocStore(os.path.join(index_dir, CHUNKS_FILE), os.path.join(index_dir, CHUNK_OFFSETS_FILE))
+    docs = DocStore(os.path.join(index_dir, DOCS_FILE), os.path.join(index_dir, OFFSETS_FILE))
+    if embeddings.shape[0] != len(chunks) or len(chunk_doc_ids) != len(chunks):
+        raise ValueError(f"Índice inconsistente: {embeddings.shape[0]} embeddings para {len(chunks)} trechos.")
+    ann = load_ivf(index_dir, manifest["ann"]) if manifest.get("ann") else None
+    return DocumentIndex(embeddings, chunks, chunk_doc_ids, docs, manifest, ann)
+
+
+def convert_json_to_index(input_json_path="processed_docs.json", index_dir="processed_index"):
+    """
+    Converte o processed_docs.json legado (um embedding por documento) para o formato binário;
+    cada documento vira um único trecho com o conteúdo completo.
+    Retorna True em caso de sucesso, False caso contrário.
+    """
+    if not os.path.exists(input_json_path):
+        print(f"Erro: O arquivo '{input_json_path}' não foi encontrado.")
+        return False
+    try:
+        with open(input_json_path, 'r', encoding='utf-8') as f:
+            docs = json.load(f)
+    except json.JSONDecodeError as e:
+        print(f"Erro ao decodificar JSON de '{input_json_path}': {e}")
+        return False
+
+    chunks = [whole_document_chunk(doc_id, doc_info) for doc_id, doc_info in enumerate(docs)]
+    written_docs, _ = write_index(docs, chunks, index_dir)
+    print(f"Conversão concluída. {written_docs} de {len(docs)} documentos gravados no índice '{index_dir}'.")
+    return written_docs > 0
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    success = convert_json_to_index(*args[:2])
+    if not success:
+        print("A conversão do índice falhou.")
+        sys.exit(1)
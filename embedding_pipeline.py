@@ -0,0 +1,150 @@
+# embedding_pipeline.py
+"""
+Pipeline de geração de embeddings em lotes, com requisições concorrentes,
+limitador token-bucket (QPS e tokens por minuto) e retry com jitter apenas
+dos itens que falharam.
+
+A função de embedding é injetável: recebe uma lista de textos e retorna uma
+lista de vetores (ou None para itens que falharam), o que permite testar o
+pipeline com uma função falsa local, sem acesso à rede.
+"""
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from text_cleaning import estimate_tokens
+
+DEFAULT_BATCH_SIZE = 50
+DEFAULT_CONCURRENCY = 4
+DEFAULT_MAX_RETRIES = 5
+
+
+class TokenBucket:
+    """
+    Token bucket thread-safe. `rate` fichas são repostas por segundo, até `capacity`.
+    acquire() bloqueia até que haja fichas suficientes.
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else rate)
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, amount=1):
+        # Pedidos maiores que a capacidade seriam bloqueados para sempre
+        amount = min(float(amount), self.capacity)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= amount:
+                    self._tokens -= amount
+                    return
+                wait = (amount - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class RateLimiter:
+    """Combina um limite de requisições por segundo (qps) e de tokens por minuto (tpm)."""
+
+    def __init__(self, qps=None, tpm=None):
+        self.requests = TokenBucket(qps, capacity=max(1.0, qps)) if qps else None
+        self.tokens = TokenBucket(tpm / 60.0, capacity=tpm) if tpm else None
+
+    def acquire(self, token_count):
+        if self.requests:
+            self.requests.acquire(1)
+        if self.tokens:
+            self.tokens.acquire(token_count)
+
+
+def make_gemini_embed_fn(model):
+    """Função de embedding em lote usando genai.embed_content (a API aceita listas de textos)."""
+    import google.generativeai as genai
+
+    def embed_batch(texts):
+        response = genai.embed_content(model=model, content=list(texts))
+        return response['embedding']
+    return embed_batch
+
+
+def _embed_batch(embed_fn, limiter, batch_ids, texts):
+    """
+    Envia um lote e retorna (resultados, ids_com_falha, erro).
+    Uma exceção faz o lote inteiro falhar; respostas parciais falham só nos itens ausentes.
+    """
+    batch_texts = [texts[i] for i in batch_ids]
+    limiter.acquire(sum(estimate_tokens(t) for t in batch_texts))
+    try:
+        vectors = embed_fn(batch_texts)
+    except Exception as e:
+        return {}, list(batch_ids), e
+    if vectors is None or len(vectors) != len(batch_ids):
+        return {}, list(batch_ids), ValueError(f"resposta com {0 if vectors is None else len(vectors)} embeddings para {len(batch_ids)} textos")
+    results, failed = {}, []
+    for doc_id, vector in zip(batch_ids, vectors):
+        if vector is not None and len(vector) > 0:
+            results[doc_id] = vector
+        else:
+            failed.append(doc_id)
+    return results, failed, None
+
+
+def embed_texts(texts, embed_fn, batch_size=DEFAULT_BATCH_SIZE, concurrency=DEFAULT_CONCURRENCY,
+                qps=None, tpm=None, max_retries=DEFAULT_MAX_RETRIES, base_delay=1.0, max_delay=30.0,
+                progress=None):
+    """
+    Gera embeddings para `texts` em lotes de `batch_size`, com até `concurrency` requisições
+    simultâneas. Itens que falharem são reenviados (somente eles) em novas rodadas, com backoff
+    exponencial e jitter, até `max_retries` tentativas adicionais.
+    Retorna (embeddings, stats): embeddings é uma lista alinhada a `texts` (None para falhas).
+    """
+    if batch_size < 1:
+        raise ValueError(f"batch_size deve ser no mínimo 1 (recebido: {batch_size}).")
+    if concurrency < 1:
+        raise ValueError(f"concurrency deve ser no mínimo 1 (recebido: {concurrency}).")
+    embeddings = [None] * len(texts)
+    stats = {"texts": len(texts), "embedded": 0, "failed": 0, "requests": 0, "retried_items": 0,
+             "tokens": sum(estimate_tokens(t) for t in texts), "elapsed_s": 0.0}
+    limiter = RateLimiter(qps=qps, tpm=tpm)
+    started = time.monotonic()
+
+    pending = list(range(len(texts)))
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for attempt in range(max_retries + 1):
+            if not pending:
+                break
+            if attempt > 0:
+                stats["retried_items"] += len(pending)
+                delay = min(max_delay, base_delay * (2 ** (attempt - 1)))
+                time.sleep(random.uniform(0, delay))  # "full jitter"
+
+            batches = [pending[i:i + batch_size] for i in range(0, len(pending), batch_size)]
+            futures = [executor.submit(_embed_batch, embed_fn, limiter, batch_ids, texts) for batch_ids in batches]
+            failed = []
+            for future in as_completed(futures):
+                results, batch_failed, error = future.result()
+                stats["requests"] += 1
+                for doc_id, vector in results.items():
+                    embeddings[doc_id] = vector
+                stats["embedded"] += len(results)
+                failed.extend(batch_failed)
+                if error is not None:
+                    # Falha na última tentativa é definitiva; nas demais, os itens voltam para o retry
+                    log = logging.error if attempt == max_retries else logging.warning
+                    log(f"Erro ao gerar embeddings de um lote (tentativa {attempt + 1}/{max_retries + 1}, {len(batch_failed)} itens): {error}")
+                if progress:
+                    progress(stats["embedded"], len(texts))
+            pending = sorted(failed)
+
+    stats["failed"] = len(texts) - stats["embedded"]
+    stats["elapsed_s"] = round(time.monotonic() - started, 3)
+    elapsed = max(stats["elapsed_s"], 1e-9)
+    stats["texts_per_s"] = round(stats["embedded"] / elapsed, 2)
+    stats["tokens_per_s"] = round(stats["tokens"] / elapsed, 2)
+    return embeddings, stats
@@ -2,6 +2,19 @@
 import re
 import json
 import os
+import argparse
+from functools import partial
+from itertools import islice
+from multiprocessing import Pool
+from text_cleaning import clean_text_for_embedding, document_hash
+from lexical_index import LexicalIndexBuilder, field_term_counts
+
+# Padrões pré-compilados no nível do módulo: cada processo worker os compila uma única vez ao importar o módulo
+METADATA_BLOCK_PATTERN = re.compile(r'(##\s*Metadata_Start.*?##\s*Metadata_End)', re.DOTALL)
+TITLE_PATTERN = re.compile(r'##\s*title:\s*(.*)')
+SLUG_PATTERN = re.compile(r'##\s*slug:\s*(.*)')
+MARKDOWN_START_PATTERN = re.compile(r'^[#*`\-]', re.MULTILINE)
+SLUG_INVALID_CHARS_PATTERN = re.compile(r'[^a-z0-9]+')
 
 def extract_metadata_and_clean_content(full_doc_content):
     """
@@ -9,18 +22,18 @@ def extract_metadata_and_clean_content(full_doc_content):
     """
     metadata = {"title": None, "slug": None}
     
-    metadata_block_match = re.search(r'(##\s*Metadata_Start.*?##\s*Metadata_End)', full_doc_content, re.DOTALL)
+    metadata_block_match = METADATA_BLOCK_PATTERN.search(full_doc_content)
     
     content_without_metadata = full_doc_content
 
     if metadata_block_match:
         metadata_block = metadata_block_match.group(1)
         
-        title_match = re.search(r'##\s*title:\s*(.*)', metadata_block)
+        title_match = TITLE_PATTERN.search(metadata_block)
         if title_match:
             metadata["title"] = title_match.group(1).strip()
         
-        slug_match = re.search(r'##\s*slug:\s*(.*)', metadata_block)
+        slug_match = SLUG_PATTERN.search(metadata_block)
         if slug_match:
             metadata["slug"] = slug_match.group(1).strip()
             
@@ -36,7 +49,7 @@ def extract_metadata_and_clean_content(full_doc_content):
                 # Uma heurística simples: se o conteúdo potencial tem mais de X caracteres ou contém alguma formatação de Markdown
                 # pode ser o início do corpo do documento. Caso contrário, assume que o ":::" era uma anotação final.
                 # Ajuste o 100 conforme a média de comprimento de anotações versus início de conteúdo.
-                if len(potential_content) > 100 or re.search(r'^[#*`\-]', potential_content, re.MULTILINE):
+                if len(potential_content) > 100 or MARKDOWN_START_PATTERN.search(potential_content):
                     content_without_metadata = potential_content
                 else: # Se for uma string curta ou sem formatação, pode ser apenas uma anotação no final do meta
                     content_without_metadata = parts[0].strip() # Mantém a parte antes do :::
@@ -45,83 +58,212 @@ def extract_metadata_and_clean_content(full_doc_content):
         
     return metadata, content_without_metadata
 
-def extract_data_from_markdown(markdown_file_path="senhasegura_docs_consolidated.md", output_json_path="raw_docs.json"):
+ARQUIVO_MARKER = "## Arquivo:"
+SEPARATOR_PATTERN = re.compile(r'^-{3,}')
+
+def iter_markdown_documents(markdown_file_path):
     """
-    Processa o arquivo markdown consolidado, extrai documentos individuais,
-    seus metadados e conteúdo limpo, salvando-os em um JSON intermediário.
+    Lê o markdown consolidado linha a linha e produz tuplas (caminho_relativo, conteudo_bruto)
+    para cada seção "## Arquivo: <caminho>.md" seguida de uma linha com 3 ou mais hífens.
+    A memória usada é proporcional ao maior documento, não ao arquivo inteiro.
     """
-    if not os.path.exists(markdown_file_path):
-        print(f"Erro: O arquivo '{markdown_file_path}' não foi encontrado.")
-        return False
+    file_path_relative = None
+    content_lines = None
 
-    print(f"Extraindo dados do Markdown consolidado: '{markdown_file_path}'...")
-
-    extracted_docs = []
+    def flush():
+        if file_path_relative is not None and content_lines is not None:
+            return file_path_relative, "".join(content_lines).strip()
+        return None
 
     with open(markdown_file_path, 'r', encoding='utf-8') as f:
-        full_content = f.read()
+        for line in f:
+            if line.startswith(ARQUIVO_MARKER):
+                section = flush()
+                if section:
+                    yield section
+                header = line[len(ARQUIVO_MARKER):].strip()
+                file_path_relative = header if header.endswith('.md') else None
+                content_lines = None # Aguardando a linha separadora "---"
+                continue
+
+            if file_path_relative is None:
+                continue
+            if content_lines is None:
+                if not line.strip():
+                    continue
+                separator_match = SEPARATOR_PATTERN.match(line)
+                if not separator_match:
+                    print(f"Atenção: Separador '---' ausente após '{ARQUIVO_MARKER} {file_path_relative}'. Pulando.")
+                    file_path_relative = None
+                    continue
+                content_lines = [line[separator_match.end():].lstrip()]
+                continue
+            content_lines.append(line)
+
+    section = flush()
+    if section:
+        yield section
+
+def build_doc_record(file_path_relative, raw_doc_content, warn=print):
+    """
+    Monta o registro de um documento (título, slug, conteúdo limpo, caminho e content_hash).
+    Retorna None se o documento não tiver conteúdo efetivo. Avisos são enviados para `warn`.
+    """
+    if not raw_doc_content:
+        warn(f"Atenção: Conteúdo vazio para o arquivo '{file_path_relative}'. Pulando.")
+        return None
 
-    # Regex para dividir por "## Arquivo: <caminho>.md" seguido por 3 ou mais hífens.
-    doc_pattern = re.compile(r'## Arquivo: (.*?\.md)\s*\n*-{3,}\s*\n*(.*?)(?=\n## Arquivo:|\Z)', re.DOTALL)
+    metadata, cleaned_content = extract_metadata_and_clean_content(raw_doc_content)
     
-    matches = doc_pattern.finditer(full_content)
+    doc_title = metadata["title"]
+    doc_slug = metadata["slug"]
 
-    num_processed = 0
+    # Fallback para título e slug se não forem encontrados no frontmatter
+    if not doc_title:
+        doc_title = os.path.basename(file_path_relative).replace('.md', '').replace('-', ' ').replace('_', ' ').strip()
+        warn(f"Atenção: Título não encontrado no frontmatter para '{file_path_relative}'. Usando '{doc_title}'.")
     
-    for match in matches:
-        file_path_relative = match.group(1).strip()
-        raw_doc_content = match.group(2).strip()
+    if not doc_slug:
+        temp_slug_source = doc_title if doc_title else os.path.basename(file_path_relative).replace('.md', '')
+        doc_slug = SLUG_INVALID_CHARS_PATTERN.sub('-', temp_slug_source.lower()).strip('-')
+        warn(f"Atenção: Slug não encontrado no frontmatter para '{file_path_relative}'. Gerando: '{doc_slug}'.")
 
-        if not raw_doc_content:
-            print(f"Atenção: Conteúdo vazio para o arquivo '{file_path_relative}'. Pulando.")
-            continue
+    if not cleaned_content:
+        warn(f"Atenção: Conteúdo efetivo (sem metadados) vazio para o arquivo '{file_path_relative}'. Pulando.")
+        return None
 
-        metadata, cleaned_content = extract_metadata_and_clean_content(raw_doc_content)
-        
-        doc_title = metadata["title"]
-        doc_slug = metadata["slug"]
+    return {
+        "title": doc_title,
+        "slug": doc_slug,
+        "content": cleaned_content, # Conteúdo LIMPO do documento
+        "filepath": file_path_relative,
+        # Hash do título + conteúdo, para detectar documentos alterados na reindexação incremental
+        "content_hash": document_hash(doc_title, cleaned_content),
+    }
 
-        # Fallback para título e slug se não forem encontrados no frontmatter
-        if not doc_title:
-            doc_title = os.path.basename(file_path_relative).replace('.md', '').replace('-', ' ').replace('_', ' ').strip()
-            print(f"Atenção: Título não encontrado no frontmatter para '{file_path_relative}'. Usando '{doc_title}'.")
-        
-        if not doc_slug:
-            temp_slug_source = doc_title if doc_title else os.path.basename(file_path_relative).replace('.md', '')
-            doc_slug = re.sub(r'[^a-z0-9]+', '-', temp_slug_source.lower()).strip('-')
-            print(f"Atenção: Slug não encontrado no frontmatter para '{file_path_relative}'. Gerando: '{doc_slug}'.")
-
-        if not cleaned_content:
-            print(f"Atenção: Conteúdo efetivo (sem metadados) vazio para o arquivo '{file_path_relative}'. Pulando.")
-            continue
-
-        doc_data = {
-            "title": doc_title,
-            "slug": doc_slug,
-            "content": cleaned_content, # Conteúdo LIMPO do documento
-            "filepath": file_path_relative,
-        }
-        extracted_docs.append(doc_data)
-        num_processed += 1
-        if num_processed % 10 == 0:
-            print(f"Extraídos {num_processed} documentos...")
-    
-    if not extracted_docs:
-        print("Nenhum documento extraído com sucesso. Verifique o arquivo de entrada.")
+def _process_section(section, lexical=False):
+    """
+    Processa uma seção (caminho, conteúdo bruto); executado nos workers no modo paralelo.
+    Com `lexical`, também calcula os termos do documento para o índice BM25 (o processo
+    principal só junta os postings).
+    """
+    messages = []
+    doc_data = build_doc_record(*section, warn=messages.append)
+    term_counts = None
+    if lexical and doc_data is not None:
+        # Mesma limpeza do texto embeddado: o BM25 não indexa sintaxe markdown nem URLs de links
+        term_counts = field_term_counts(doc_data["title"], clean_text_for_embedding(doc_data["content"]))
+    return doc_data, term_counts, messages
+
+def iter_extracted_docs(markdown_file_path, workers=1, chunk_size=64, lexical=False):
+    """
+    Gerador com os registros extraídos do markdown consolidado, um documento por vez.
+    Com `workers` > 1, o processamento dos documentos (regex de metadados, limpeza e hash)
+    é distribuído em um pool de processos, em blocos de `chunk_size` documentos. Os
+    resultados e os avisos saem na ordem do arquivo, qualquer que seja o número de workers.
+    Com `lexical`, gera tuplas (registro, termos por campo para o BM25; veja field_term_counts).
+    """
+    sections = iter_markdown_documents(markdown_file_path)
+    process = partial(_process_section, lexical=lexical)
+
+    def emit(results):
+        for doc_data, term_counts, messages in results:
+            for message in messages:
+                print(message)
+            if doc_data is not None:
+                yield (doc_data, term_counts) if lexical else doc_data
+
+    if workers <= 1:
+        yield from emit(map(process, sections))
+        return
+
+    # Envia janelas limitadas de seções para manter a memória constante (Pool.imap consumiria a entrada inteira)
+    window_size = chunk_size * workers * 2
+    with Pool(processes=workers) as pool:
+        while True:
+            window = list(islice(sections, window_size))
+            if not window:
+                break
+            yield from emit(pool.imap(process, window, chunksize=chunk_size))
+
+def load_raw_docs(input_path):
+    """Lê os documentos extraídos, em JSON Lines (.jsonl) ou no JSON legado (lista)."""
+    with open(input_path, 'r', encoding='utf-8') as f:
+        if input_path.endswith('.jsonl'):
+            return [json.loads(line) for line in f if line.strip()]
+        return json.load(f)
+
+def extract_data_from_markdown(markdown_file_path="senhasegura_docs_consolidated.md", output_path="raw_docs.jsonl", workers=1, chunk_size=64,
+                               lexical_index_dir="lexical_index"):
+    """
+    Processa o arquivo markdown consolidado, extrai documentos individuais,
+    seus metadados e conteúdo limpo, gravando-os incrementalmente em JSON Lines
+    (um documento por linha). Se `output_path` terminar em .json, grava a lista JSON legada.
+    Com `workers` > 1, usa um pool de processos (veja iter_extracted_docs).
+    Na mesma passada, monta o índice BM25 (título + conteúdo) em `lexical_index_dir`
+    (vazio ou None para não gerar).
+    """
+    if not os.path.exists(markdown_file_path):
+        print(f"Erro: O arquivo '{markdown_file_path}' não foi encontrado.")
         return False
 
+    print(f"Extraindo dados do Markdown consolidado: '{markdown_file_path}'...")
+
+    as_json_list = output_path.endswith('.json')
+    num_processed = 0
+    tmp_path = output_path + '.tmp'
+    lexical_builder = LexicalIndexBuilder() if lexical_index_dir else None
+
     try:
-        with open(output_json_path, 'w', encoding='utf-8') as f:
-            json.dump(extracted_docs, f, ensure_ascii=False, indent=4)
-        print(f"Extração concluída. Salvou {len(extracted_docs)} documentos em '{output_json_path}'.")
-        return True
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            if as_json_list:
+                f.write("[\n")
+            for item in iter_extracted_docs(markdown_file_path, workers=workers, chunk_size=chunk_size, lexical=lexical_builder is not None):
+                doc_data, term_counts = item if lexical_builder is not None else (item, None)
+                if as_json_list:
+                    f.write((",\n" if num_processed else "") + json.dumps(doc_data, ensure_ascii=False, indent=4))
+                else:
+                    f.write(json.dumps(doc_data, ensure_ascii=False) + "\n")
+                if lexical_builder is not None:
+                    lexical_builder.add_term_counts(doc_data["filepath"], *term_counts)
+                num_processed += 1
+                if num_processed % 10 == 0:
+                    print(f"Extraídos {num_processed} documentos...")
+            if as_json_list:
+                f.write("\n]")
     except Exception as e:
-        print(f"Erro ao salvar o arquivo JSON: {e}")
+        print(f"Erro ao salvar o arquivo de saída: {e}")
+        return False
+
+    if not num_processed:
+        os.remove(tmp_path)
+        print("Nenhum documento extraído com sucesso. Verifique o arquivo de entrada.")
         return False
 
+    os.replace(tmp_path, output_path)
+    print(f"Extração concluída. Salvou {num_processed} documentos em '{output_path}'.")
+
+    if lexical_builder is not None:
+        try:
+            lexical_manifest = lexical_builder.save(lexical_index_dir)
+            print(f"Índice lexical (BM25) salvo em '{lexical_index_dir}': {lexical_manifest['term_count']} termos, {lexical_manifest['posting_count']} postings.")
+        except Exception as e:
+            print(f"Erro ao salvar o índice lexical: {e}")
+            return False
+    return True
+
 if __name__ == "__main__":
-    success = extract_data_from_markdown()
+    parser = argparse.ArgumentParser(description="Extrai os documentos do markdown consolidado para JSON Lines.")
+    parser.add_argument("--input", default="senhasegura_docs_consolidated.md", help="Markdown consolidado (gerado por merge-markdown.py)")
+    parser.add_argument("--output", default="raw_docs.jsonl", help="Arquivo de saída (.jsonl, ou .json para a lista legada)")
+    parser.add_argument("--workers", type=int, default=1, help="Processos para a extração (0 = número de CPUs)")
+    parser.add_argument("--chunk-size", type=int, default=64, help="Documentos enviados a cada worker por vez")
+    parser.add_argument("--lexical-index", default="lexical_index", help="Diretório do índice BM25 (vazio para não gerar)")
+    args = parser.parse_args()
+
+    success = extract_data_from_markdown(args.input, args.output, workers=args.workers or os.cpu_count(), chunk_size=args.chunk_size,
+                                         lexical_index_dir=args.lexical_index)
     if not success:
         print("A extração dos dados do Markdown falhou.")
     else:
-        print("Extração dos dados do Markdown concluída com sucesso.")
\ No newline at end of file
+        print("Extração dos dados do Markdown concluída com sucesso.")
@@ -3,7 +3,14 @@ import json
 import os
 import google.generativeai as genai
 from dotenv import load_dotenv
-import time
+import argparse
+import numpy as np
+from ann_index import ANN_AUTO, ANN_TYPES
+from doc_index import index_exists, load_index, write_index
+from extract_data_from_markdown import load_raw_docs
+from chunking import DEFAULT_CHUNK_CHARS, DEFAULT_CHUNK_OVERLAP, chunk_document
+from text_cleaning import build_chunk_embedding_text, content_hash, document_hash
+from embedding_pipeline import DEFAULT_BATCH_SIZE, DEFAULT_CONCURRENCY, DEFAULT_MAX_RETRIES, embed_texts, make_gemini_embed_fn
 
 # Carrega as variáveis de ambiente do arquivo .env
 load_dotenv()
@@ -15,39 +22,74 @@ if not GOOGLE_API_KEY:
 genai.configure(api_key=GOOGLE_API_KEY)
 EMBEDDING_MODEL = "models/embedding-001"
 
-def clean_text_for_embedding(text):
+def positive_int(value):
+    """Tipo do argparse para inteiros >= 1."""
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"deve ser um inteiro maior ou igual a 1 (recebido: {value})")
+    return number
+
+def load_previous_embeddings(index_dir):
     """
-    Remove caracteres especiais e formatação markdown para texto que será EMBEDDADO.
-    Pode ser mais agressivo aqui, pois é apenas para o embedding de busca.
+    Lê o índice anterior (se existir e tiver sido gerado com o mesmo modelo) e retorna
+    (embeddings_anteriores, linha_por_hash_de_trecho, hashes_por_arquivo) para reaproveitar
+    embeddings de trechos inalterados. Os embeddings continuam mapeados em memória: os vetores
+    reaproveitados só são copiados ao montar a nova matriz (ver assemble_embedding_matrix).
     """
-    import re # Importa re dentro da função para ser autocontido, ou globalmente no topo
-    # Remove links markdown, bold/italic, cabeçalhos, code blocks, blockquotes, listas, tabelas
-    text = re.sub(r'\[.*?\]\(.*?\)|\*\*|__|\*|_|#+|`+|^\s*[-+*]\s*|^>\s*|\|.*?-+\s*\|', '', text, flags=re.MULTILINE)
-    text = re.sub(r'\s+', ' ', text).strip() # Remove múltiplos espaços e quebras de linha
-    text = re.sub(r'\n+', ' ', text).strip() # Substitui múltiplas quebras de linha por um espaço
-    return text
-
-def generate_embedding_with_retry(text_content):
+    if not index_exists(index_dir):
+        return None, {}, {}
+    try:
+        previous_index = load_index(index_dir)
+    except Exception as e:
+        print(f"Atenção: Não foi possível ler o índice anterior em '{index_dir}' ({e}). Todos os documentos serão embeddados.")
+        return None, {}, {}
+    if previous_index.manifest.get("embedding_model") != EMBEDDING_MODEL:
+        print(f"Atenção: Índice anterior gerado com outro modelo ({previous_index.manifest.get('embedding_model')}). Todos os documentos serão embeddados.")
+        previous_index.close()
+        return None, {}, {}
+
+    rows_by_hash = {}
+    for chunk_id, chunk in enumerate(previous_index.chunks):
+        chunk_hash = chunk.get("content_hash")
+        if chunk_hash:
+            rows_by_hash[chunk_hash] = chunk_id
+    hashes_by_filepath = {doc_info.get("filepath"): doc_info.get("content_hash") for doc_info in previous_index.docs}
+    previous_index.close()
+    return previous_index.embeddings, rows_by_hash, hashes_by_filepath
+
+def assemble_embedding_matrix(chunk_count, previous_embeddings, reused_positions, reused_rows, new_positions, new_embeddings):
     """
-    Gera um embedding para o conteúdo de texto, com mecanismo de retry.
+    Matriz (trechos x dimensão) alinhada aos trechos do novo índice: os vetores reaproveitados são
+    copiados do índice anterior com uma única indexação (linhas ordenadas, leitura sequencial do
+    memmap) e os novos preenchem as demais linhas. Linhas sem embedding ficam com NaN.
     """
-    retries = 3
-    for attempt in range(retries):
-        try:
-            response = genai.embed_content(model=EMBEDDING_MODEL, content=text_content)
-            return response['embedding']
-        except Exception as e:
-            print(f"Erro ao gerar embedding (tentativa {attempt+1}/{retries}): {e}")
-            if attempt < retries - 1:
-                time.sleep(2 ** attempt) # Espera exponencial
-            else:
-                return None # Retorna None se todas as retries falharem
-    return None
+    if reused_rows:
+        dim = previous_embeddings.shape[1]
+    else:
+        lengths = [len(vector) for vector in new_embeddings if vector is not None and len(vector)]
+        dim = max(set(lengths), key=lengths.count) if lengths else 0
+    matrix = np.full((chunk_count, dim), np.nan, dtype=np.float32)
+    if reused_rows:
+        order = np.argsort(reused_rows)
+        matrix[np.asarray(reused_positions)[order]] = previous_embeddings[np.asarray(reused_rows)[order]]
+    for position, vector in zip(new_positions, new_embeddings):
+        if vector is not None and len(vector) == dim:
+            matrix[position] = vector
+    return matrix
 
-def generate_embeddings_for_docs(input_json_path="raw_docs.json", output_json_path="processed_docs.json"):
+def generate_embeddings_for_docs(input_json_path="raw_docs.jsonl", output_index_dir="processed_index",
+                                  batch_size=DEFAULT_BATCH_SIZE, concurrency=DEFAULT_CONCURRENCY, qps=None, tpm=None,
+                                  max_retries=DEFAULT_MAX_RETRIES, embed_fn=None, incremental=True,
+                                  chunk_chars=DEFAULT_CHUNK_CHARS, chunk_overlap=DEFAULT_CHUNK_OVERLAP,
+                                  ann=ANN_AUTO, nlist=None, pq_m=None):
     """
-    Lê o JSON com dados de documentos, gera embeddings para cada um,
-    e salva o resultado final com embeddings em um novo JSON.
+    Lê os documentos extraídos (JSON Lines ou JSON legado), divide cada um em trechos por seção
+    (com sobreposição), gera um embedding por trecho (em lotes concorrentes, respeitando os
+    limites de QPS/TPM) e salva o resultado no índice binário.
+    `embed_fn` permite substituir a chamada ao Gemini por uma função local (lista de textos -> lista de vetores).
+    Com `incremental=True`, vetores do índice anterior são reaproveitados para trechos cujo
+    content_hash não mudou; apenas trechos novos ou alterados são embeddados.
+    `ann`, `nlist` e `pq_m` configuram o índice aproximado gravado junto ao índice (ver ann_index.py).
     """
     if not os.path.exists(input_json_path):
         print(f"Erro: O arquivo '{input_json_path}' não foi encontrado. Por favor, execute 'extract_data_from_markdown.py' primeiro.")
@@ -56,8 +98,7 @@ def generate_embeddings_for_docs(input_json_path="raw_docs.json", output_json_pa
     print(f"Gerando embeddings para documentos de '{input_json_path}'...")
 
     try:
-        with open(input_json_path, 'r', encoding='utf-8') as f:
-            raw_docs = json.load(f)
+        raw_docs = load_raw_docs(input_json_path)
     except json.JSONDecodeError as e:
         print(f"Erro ao decodificar JSON de '{input_json_path}': {e}")
         return False
@@ -65,52 +106,107 @@ def generate_embeddings_for_docs(input_json_path="raw_docs.json", output_json_pa
         print(f"Erro inesperado ao carregar '{input_json_path}': {e}")
         return False
 
-    processed_docs = []
-    total_docs = len(raw_docs)
-    
-    for i, doc_data in enumerate(raw_docs):
+    previous_embeddings, rows_by_hash, previous_hashes = load_previous_embeddings(output_index_dir) if incremental else (None, {}, {})
+
+    chunks = []
+    texts_to_embed = []
+    chunks_to_embed = []
+    new_positions = []
+    # Posições (em `chunks`) dos trechos reaproveitados e as linhas correspondentes no índice anterior
+    reused_positions, reused_rows = [], []
+    counts = {"added": 0, "changed": 0, "unchanged": 0, "removed": 0, "chunks_reused": 0}
+    current_filepaths = set()
+
+    for doc_id, doc_data in enumerate(raw_docs):
         doc_title = doc_data.get("title", "Título Desconhecido")
         doc_content = doc_data.get("content", "")
         file_path_relative = doc_data.get("filepath", "N/A")
+        current_filepaths.add(file_path_relative)
 
-        # Para o embedding, usamos o título + uma parte do conteúdo limpo
-        embedding_text_raw = f"{doc_title}. {doc_content[:1024]}" # Limite para evitar exceder tokens
-        
-        embedding_text = clean_text_for_embedding(embedding_text_raw)
-        
-        if not embedding_text.strip():
-            print(f"Atenção: Texto limpo para embedding vazio para o arquivo '{file_path_relative}'. Pulando embedding.")
-            doc_data["embedding"] = None # Marcar como None ou omitir se não houver embedding
-            processed_docs.append(doc_data)
-            continue
-
-        doc_embedding = generate_embedding_with_retry(embedding_text)
-
-        if doc_embedding is not None:
-            doc_data["embedding"] = doc_embedding
-            processed_docs.append(doc_data)
-            if (i + 1) % 10 == 0:
-                print(f"Gerados embeddings para {i + 1}/{total_docs} documentos...")
+        doc_data["content_hash"] = document_hash(doc_title, doc_content)
+        if file_path_relative not in previous_hashes:
+            counts["added"] += 1
+        elif previous_hashes[file_path_relative] != doc_data["content_hash"]:
+            counts["changed"] += 1
         else:
-            print(f"Atenção: Falha ao gerar embedding para o arquivo '{file_path_relative}'. Documento será incluído sem embedding.")
-            doc_data["embedding"] = None # Explicitamente define como None
-            processed_docs.append(doc_data) # Inclui o documento mesmo sem embedding, mas com None
+            counts["unchanged"] += 1
 
-    if not processed_docs:
+        # Trechos por seção; documentos sem seções com texto viram um único trecho com o título
+        doc_chunks = chunk_document(doc_content, chunk_chars, chunk_overlap) or [{"heading": "", "text": doc_content.strip() or doc_title, "position": 0}]
+        for chunk in doc_chunks:
+            embedding_text = build_chunk_embedding_text(doc_title, chunk["heading"], chunk["text"])
+            chunk["doc"] = doc_id
+            chunk["content_hash"] = content_hash(embedding_text)
+            if chunk["content_hash"] in rows_by_hash:
+                reused_positions.append(len(chunks))
+                reused_rows.append(rows_by_hash[chunk["content_hash"]])
+                counts["chunks_reused"] += 1
+            else:
+                texts_to_embed.append(embedding_text)
+                chunks_to_embed.append(chunk)
+                new_positions.append(len(chunks))
+            chunks.append(chunk)
+
+    counts["removed"] = len(set(previous_hashes) - current_filepaths)
+    print(f"Reindexação: {counts['added']} documentos novos, {counts['changed']} alterados, {counts['unchanged']} inalterados, {counts['removed']} removidos; "
+          f"{len(chunks)} trechos, {counts['chunks_reused']} reaproveitados, {len(chunks_to_embed)} a embeddar.")
+
+    def report_progress(done, total):
+        print(f"Gerados embeddings para {done}/{total} trechos...")
+
+    embeddings, stats = embed_texts(texts_to_embed, embed_fn or make_gemini_embed_fn(EMBEDDING_MODEL),
+                                    batch_size=batch_size, concurrency=concurrency, qps=qps, tpm=tpm,
+                                    max_retries=max_retries, progress=report_progress)
+
+    for chunk, chunk_embedding in zip(chunks_to_embed, embeddings):
+        if chunk_embedding is None:
+            print(f"Atenção: Falha ao gerar embedding para um trecho de '{raw_docs[chunk['doc']].get('filepath', 'N/A')}'. O trecho não será indexado.")
+
+    print(f"Estatísticas: {stats['embedded']}/{stats['texts']} embeddings em {stats['elapsed_s']}s "
+          f"({stats['texts_per_s']} trechos/s, ~{stats['tokens_per_s']} tokens/s), "
+          f"{stats['requests']} requisições, {stats['retried_items']} itens reenviados, {stats['failed']} falhas.")
+
+    if not chunks:
         print("Nenhum documento processado com sucesso (sem embeddings ou dados de entrada).")
         return False
 
+    matrix = assemble_embedding_matrix(len(chunks), previous_embeddings, reused_positions, reused_rows, new_positions, embeddings)
+    # Solta o memmap do índice anterior antes de substituir os arquivos
+    previous_embeddings = None
+
     try:
-        with open(output_json_path, 'w', encoding='utf-8') as f:
-            json.dump(processed_docs, f, ensure_ascii=False, indent=4)
-        print(f"Geração de embeddings concluída. Salvou {len(processed_docs)} documentos com embeddings em '{output_json_path}'.")
+        written_docs, written_chunks = write_index(raw_docs, chunks, output_index_dir, embedding_model=EMBEDDING_MODEL,
+                                                   ann=ann, nlist=nlist, pq_m=pq_m, embeddings=matrix)
+        print(f"Geração de embeddings concluída. Salvou {written_docs} documentos ({written_chunks} trechos) no índice '{output_index_dir}'.")
         return True
     except Exception as e:
-        print(f"Erro ao salvar o arquivo JSON: {e}")
+        print(f"Erro ao salvar o índice: {e}")
         return False
 
 if __name__ == "__main__":
-    success = generate_embeddings_for_docs()
+    parser = argparse.ArgumentParser(description="Gera os embeddings dos documentos extraídos e grava o índice binário.")
+    parser.add_argument("--input", default="raw_docs.jsonl", help="Documentos gerados por extract_data_from_markdown.py (.jsonl ou .json)")
+    parser.add_argument("--output-index", default="processed_index", help="Diretório do índice binário")
+    parser.add_argument("--batch-size", type=positive_int, default=DEFAULT_BATCH_SIZE, help="Trechos por requisição de embedding")
+    parser.add_argument("--concurrency", type=positive_int, default=DEFAULT_CONCURRENCY, help="Requisições simultâneas")
+    parser.add_argument("--qps", type=float, default=None, help="Limite de requisições por segundo")
+    parser.add_argument("--tpm", type=float, default=None, help="Limite de tokens por minuto")
+    parser.add_argument("--max-retries", type=int, default=DEFAULT_MAX_RETRIES, help="Tentativas adicionais para itens com falha")
+    parser.add_argument("--full", action="store_true", help="Ignora o índice anterior e embedda todos os documentos")
+    parser.add_argument("--chunk-chars", type=int, default=DEFAULT_CHUNK_CHARS, help="Tamanho máximo (caracteres) de cada trecho")
+    parser.add_argument("--chunk-overlap", type=int, default=DEFAULT_CHUNK_OVERLAP, help="Sobreposição (caracteres) entre trechos consecutivos")
+    parser.add_argument("--ann", choices=ANN_TYPES, default=ANN_AUTO,
+                        help="Índice aproximado: auto (IVF a partir de 20000 trechos), none, ivf ou ivfpq")
+    parser.add_argument("--nlist", type=int, default=None, help="Listas do IVF (padrão: ~4*sqrt(trechos))")
+    parser.add_argument("--pq-m", type=int, default=None, help="Subespaços da quantização de produto (ivfpq; deve dividir a dimensão)")
+    args = parser.parse_args()
+
+    success = generate_embeddings_for_docs(args.input, args.output_index,
+                                           batch_size=args.batch_size, concurrency=args.concurrency,
+                                           qps=args.qps, tpm=args.tpm, max_retries=args.max_retries,
+                                           incremental=not args.full, chunk_chars=args.chunk_chars,
+                                           chunk_overlap=args.chunk_overlap, ann=args.ann, nlist=args.nlist,
+                                           pq_m=args.pq_m)
     if not success:
         print("A geração de embeddings falhou.")
     else:
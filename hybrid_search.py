@@ -0,0 +1,147 @@
+# hybrid_search.py
+"""
+Recuperação híbrida: busca vetorial (doc_index.py) + BM25 (lexical_index.py), fundidas por
+reciprocal rank fusion, e busca apenas lexical para quando o embedding da consulta não está
+disponível (API de embeddings fora do ar ou lenta).
+
+Os dois índices são alinhados pelo caminho (filepath) dos documentos.
+"""
+import logging
+import math
+
+import numpy as np
+
+from doc_index import DEFAULT_PASSAGES_PER_DOC
+from lexical_index import reciprocal_rank_fusion, tokenize
+
+# Profundidade de cada lista antes da fusão, em múltiplos de top_k
+FUSION_DEPTH = 4
+
+RETRIEVAL_VECTOR = "vector"
+RETRIEVAL_HYBRID = "hybrid"
+RETRIEVAL_LEXICAL = "lexical"
+
+
+class HybridRetriever:
+    """Recupera documentos (com os trechos para o prompt) a partir do índice vetorial e, se houver, do lexical."""
+
+    def __init__(self, doc_index, lexical_index=None, fusion_depth=FUSION_DEPTH):
+        self.doc_index = doc_index
+        self.lexical_index = lexical_index
+        self.fusion_depth = fusion_depth
+        self.doc_ids = self._align_doc_ids() if lexical_index is not None else None
+
+    @property
+    def has_lexical(self):
+        return self.lexical_index is not None
+
+    @property
+    def mode(self):
+        return RETRIEVAL_HYBRID if self.has_lexical else RETRIEVAL_VECTOR
+
+    def _align_doc_ids(self):
+        """Documento do índice vetorial (-1 se ausente) de cada documento do índice lexical."""
+        doc_id_by_key = {}
+        for doc_id, doc_info in enumerate(self.doc_index.docs):
+            doc_id_by_key.setdefault(doc_info.get('filepath'), doc_id)
+        doc_ids = np.array([doc_id_by_key.get(key, -1) for key in self.lexical_index.doc_keys], dtype=np.int64)
+        missing = int((doc_ids < 0).sum())
+        if missing:
+            logging.warning(f"{missing} documento(s) do índice lexical não estão no índice vetorial e serão ignorados. "
+                            f"Gere os dois índices a partir do mesmo raw_docs.jsonl.")
+        return doc_ids
+
+    def lexical_ranking(self, query, top_k):
+        """Documentos (ids do índice vetorial) e scores BM25, em ordem decrescente."""
+        ranked = []
+        for lexical_id, score in self.lexical_index.search(query, top_k):
+            doc_id = int(self.doc_ids[lexical_id])
+            if doc_id >= 0:
+                ranked.append((doc_id, score))
+        return ranked
+
+    def search(self, query, query_embedding, top_k=5, passages_per_doc=DEFAULT_PASSAGES_PER_DOC, nprobe=None):
+        """
+        Retorna os top_k documentos como lista de tuplas (similaridade, doc_info). Com índice
+        lexical, a ordem é a da fusão (RRF) das duas buscas; a similaridade continua sendo o
+        cosseno do melhor trecho, e os trechos de cada documento são os mais similares à consulta.
+        """
+        if not self.has_lexical or not query:
+            return self.doc_index.search(query_embedding, top_k, passages_per_doc, nprobe=nprobe)
+        query_vector = self.doc_index.normalize_query(query_embedding)
+        if query_vector is None:
+            return []
+        vector_ranked = self.doc_index.rank_documents(query_vector, top_k * self.fusion_depth, passages_per_doc, nprobe)
+        return self.fuse(query, query_vector, vector_ranked, top_k, passages_per_doc)
+
+    def fuse(self, query, query_vector, vector_ranked, top_k, passages_per_doc=DEFAULT_PASSAGES_PER_DOC):
+        """Funde o ranking vetorial (tuplas de rank_documents) com o BM25 e materializa os top_k documentos."""
+        lexical_ranked = self.lexical_ranking(query, top_k * self.fusion_depth)
+        fused = reciprocal_rank_fusion([[doc_id for doc_id, _, _ in vector_ranked], [doc_id for doc_id, _ in lexical_ranked]])
+
+        vector_hits = {doc_id: (score, hits) for doc_id, score, hits in vector_ranked}
+        results = []
+        for doc_id, _ in fused[:top_k]:
+            if doc_id in vector_hits:
+                score, hits = vector_hits[doc_id]
+            else:
+                # Documento encontrado só pelo BM25: trechos escolhidos pela similaridade com a consulta
+                score, hits = self.doc_index.best_chunks(doc_id, query_vector=query_vector, passages_per_doc=passages_per_doc)
+            results.append((score, self.doc_index.document_with_passages(doc_id, hits)))
+        return results
+
+    def search_batch(self, queries, query_embeddings, top_k=5, passages_per_doc=DEFAULT_PASSAGES_PER_DOC):
+        """
+        Busca em lote: os rankings vetoriais de todas as consultas com embedding saem de produtos
+        matriz-matriz (DocumentIndex.rank_documents_batch). Consultas sem embedding usam a busca
+        lexical, se houver índice lexical.
+        Retorna uma lista alinhada a `queries` de tuplas (documentos, informacoes_da_recuperacao),
+        ou (None, None) para consultas que não puderam ser atendidas.
+        """
+        results = [(None, None)] * len(queries)
+        with_vector = []
+        for i, query_embedding in enumerate(query_embeddings):
+            query_vector = self.doc_index.normalize_query(query_embedding) if query_embedding is not None else None
+            if query_vector is not None:
+                with_vector.append((i, query_vector))
+            elif self.has_lexical:
+                results[i] = (self.search_lexical(queries[i], top_k, passages_per_doc), {"mode": RETRIEVAL_LEXICAL, "fallback": True})
+
+        if with_vector:
+            depth = top_k * self.fusion_depth if self.has_lexical else top_k
+            query_matrix = np.stack([query_vector for _, query_vector in with_vector])
+            ranked_lists = self.doc_index.rank_documents_batch(query_matrix, depth, passages_per_doc)
+            for (i, query_vector), vector_ranked in zip(with_vector, ranked_lists):
+                if self.has_lexical:
+                    docs = self.fuse(queries[i], query_vector, vector_ranked, top_k, passages_per_doc)
+                else:
+                    docs = [(score, self.doc_index.document_with_passages(doc_id, hits)) for doc_id, score, hits in vector_ranked]
+                results[i] = (docs, {"mode": self.mode, "fallback": False})
+        return results
+
+    def search_lexical(self, query, top_k=5, passages_per_doc=DEFAULT_PASSAGES_PER_DOC):
+        """
+        Busca apenas lexical, sem embedding da consulta. Retorna (similaridade, doc_info), onde a
+        similaridade é o score BM25 relativo ao do primeiro documento e os trechos são os que mais
+        contêm os termos da consulta.
+        """
+        if not self.has_lexical:
+            return []
+        ranked = self.lexical_ranking(query, top_k)
+        if not ranked:
+            return []
+        terms = set(self.lexical_index.query_terms(query))
+
+        def chunk_scorer(chunk):
+            counts = {}
+            for term in tokenize(f"{chunk.get('heading', '')} {chunk['text']}"):
+                if term in terms:
+                    counts[term] = counts.get(term, 0) + 1
+            return sum(1 + math.log(count) for count in counts.values())
+
+        top_score = ranked[0][1]
+        results = []
+        for doc_id, score in ranked:
+            _, hits = self.doc_index.best_chunks(doc_id, chunk_scorer=chunk_scorer, passages_per_doc=passages_per_doc)
+            results.append((score / top_score, self.doc_index.document_with_passages(doc_id, hits)))
+        return results
@@ -0,0 +1,181 @@
+# index_reload.py
+"""
+Recarga do índice da documentação sem reiniciar os workers.
+
+Cada geração do índice (vetorial ou lexical) é gravada em um subdiretório próprio,
+<diretório do índice>/<versão>/, que não é mais alterado depois de pronto. A geração ativa é
+indicada pelo arquivo CURRENT (o nome do subdiretório), trocado atomicamente com os.replace
+quando a nova geração está completa: um leitor resolve CURRENT uma vez e lê todos os arquivos
+da mesma geração, nunca uma mistura de duas. Diretórios sem CURRENT (formato anterior, com os
+arquivos direto no diretório do índice) continuam sendo lidos.
+
+O índice ativo é um IndexSnapshot imutável (índice vetorial + recuperação híbrida + versão).
+Um novo índice é carregado fora do caminho das requisições (thread de verificação ou rota
+administrativa) e entra em uso com uma única atribuição de referência; as requisições em
+andamento continuam com o snapshot que obtiveram no início. Os arquivos do snapshot antigo
+permanecem abertos (memmap e descritores) até a última requisição que o usa terminar; as
+gerações anteriores só são apagadas depois de KEEP_GENERATIONS novas publicações.
+
+A detecção de mudanças compara o caminho (que inclui a versão) e o mtime/tamanho dos manifests.
+"""
+import logging
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+
+# Arquivo com o nome da geração ativa, no diretório do índice
+CURRENT_FILE = "CURRENT"
+# Gerações mantidas em disco (a ativa e as anteriores, ainda abertas por workers que não recarregaram)
+KEEP_GENERATIONS = 3
+GENERATION_NAME_PATTERN = re.compile(r'^\d{8}T\d{6}-[0-9a-f]{8}$')
+
+
+def new_index_version():
+    """Identificador de uma geração do índice, gravado no manifest (ex.: 20250101T120000-1a2b3c4d)."""
+    return f"{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+
+
+def resolve_index_dir(index_dir):
+    """Diretório da geração ativa do índice (CURRENT), ou o próprio `index_dir` no formato sem gerações."""
+    try:
+        with open(os.path.join(index_dir, CURRENT_FILE), 'r', encoding='utf-8') as f:
+            generation = f.read().strip()
+    except FileNotFoundError:
+        return index_dir
+    if not GENERATION_NAME_PATTERN.match(generation):
+        raise ValueError(f"Arquivo {CURRENT_FILE} inválido em '{index_dir}': {generation!r}.")
+    return os.path.join(index_dir, generation)
+
+
+def new_generation(index_dir):
+    """Cria o diretório de uma nova geração do índice. Retorna (versão, diretório)."""
+    version = new_index_version()
+    generation_dir = os.path.join(index_dir, version)
+    os.makedirs(generation_dir)
+    return version, generation_dir
+
+
+def publish_generation(index_dir, version, manifest_file):
+    """
+    Torna `version` a geração ativa (troca atômica de CURRENT) e apaga as gerações completas
+    (com `manifest_file`, gravado por último) mais antigas que as KEEP_GENERATIONS mais recentes.
+    """
+    current_tmp = os.path.join(index_dir, f"{CURRENT_FILE}.{version}.tmp")
+    with open(current_tmp, 'w', encoding='utf-8') as f:
+        f.write(version + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(current_tmp, os.path.join(index_dir, CURRENT_FILE))
+
+    # Ordem de conclusão (mtime do manifest): a versão só tem resolução de segundos. Gerações sem
+    # manifest são gravações em andamento (de outro processo) e não são tocadas.
+    completed = []
+    for name in os.listdir(index_dir):
+        if GENERATION_NAME_PATTERN.match(name) and name != version:
+            try:
+                completed.append((os.stat(os.path.join(index_dir, name, manifest_file)).st_mtime_ns, name))
+            except OSError:
+                continue
+    completed.sort()
+    for _, name in completed[:max(0, len(completed) - (KEEP_GENERATIONS - 1))]:
+        try:
+            shutil.rmtree(os.path.join(index_dir, name))
+        except OSError as e:
+            # Ex.: Windows, com os arquivos ainda mapeados por um worker; fica para a próxima publicação
+            logging.warning(f"Não foi possível apagar a geração antiga '{name}' do índice '{index_dir}': {e}")
+
+
+def discard_generation(generation_dir):
+    """Remove uma geração que não chegou a ser publicada (gravação com erro)."""
+    shutil.rmtree(generation_dir, ignore_errors=True)
+
+
+def manifest_version(manifest, path):
+    """Versão declarada no manifest; índices anteriores ao campo usam a data de criação ou o mtime do arquivo."""
+    version = manifest.get("index_version") or manifest.get("created_at")
+    if version:
+        return str(version)
+    return time.strftime('%Y%m%dT%H%M%S', time.localtime(os.path.getmtime(path)))
+
+
+def file_fingerprint(paths):
+    """(caminho, mtime_ns, tamanho) de cada arquivo; None para arquivos ausentes."""
+    fingerprint = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            fingerprint.append((path, stat.st_mtime_ns, stat.st_size))
+        except FileNotFoundError:
+            fingerprint.append((path, None, None))
+    return tuple(fingerprint)
+
+
+class IndexSnapshot:
+    """Estado do índice usado por uma requisição do início ao fim. Não é alterado depois de criado."""
+
+    def __init__(self, doc_index, retriever, version, lexical_version=None, source=None, fingerprint=None):
+        self.doc_index = doc_index
+        self.retriever = retriever
+        self.version = version
+        self.lexical_version = lexical_version
+        self.source = source
+        self.fingerprint = fingerprint
+        self.loaded_at = time.time()
+
+    def __len__(self):
+        return len(self.doc_index)
+
+    def describe(self):
+        return {
+            "version": self.version,
+            "lexical_version": self.lexical_version,
+            "source": self.source,
+            "retrieval_mode": self.retriever.mode,
+            "docs": len(self.doc_index),
+            "chunks": self.doc_index.chunk_count,
+            "ann": (self.doc_index.manifest.get("ann") or {}).get("type"),
+            "loaded_at": time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(self.loaded_at)),
+        }
+
+
+class IndexWatcher:
+    """
+    Thread daemon que chama `check_fn()` a cada `interval` segundos. Exceções são registradas
+    no log (uma vez por mensagem distinta) e não interrompem a verificação.
+    """
+
+    def __init__(self, check_fn, interval):
+        self.check_fn = check_fn
+        self.interval = interval
+        self.last_check = None
+        self.last_error = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="index-watcher", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.check_fn()
+                self.last_error = None
+            except Exception as e:
+                if str(e) != self.last_error:
+                    logging.error(f"Erro ao verificar/recarregar o índice da documentação: {e}")
+                self.last_error = str(e)
+            self.last_check = time.time()
+
+    def status(self):
+        return {
+            "interval_s": self.interval,
+            "last_check": time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(self.last_check)) if self.last_check else None,
+            "last_error": self.last_error,
+        }
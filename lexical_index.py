@@ -0,0 +1,236 @@
+# lexical_index.py
+"""
+Índice invertido BM25 sobre o título e o conteúdo dos documentos extraídos.
+
+Complementa a busca vetorial em consultas com termos exatos (nomes de produto, flags de
+CLI, códigos de erro) e permite responder sem o embedding da consulta (busca apenas lexical).
+
+Formato em disco (uma geração por subdiretório do índice lexical, <diretório>/<versão>/, com a
+geração ativa indicada pelo arquivo CURRENT; gravado por extract_data_from_markdown.py):
+  - bm25_terms.json: vocabulário ordenado; o termo i tem a lista de postings i.
+  - bm25_postings.offsets.npy: início (int64, n_termos + 1) da lista de cada termo.
+  - bm25_postings.docs.npy / bm25_postings.tfs.npy: documento (uint32) e frequência do termo
+    (uint16) de cada posting, em ordem crescente de documento dentro de cada lista.
+  - bm25_doc_lengths.npy: tamanho (em termos) de cada documento.
+  - bm25_doc_keys.json: caminho (filepath) de cada documento, usado para alinhar com o índice vetorial.
+  - bm25_manifest.json: versão do formato, versão (geração) do índice, quantidades, tamanho médio
+    e parâmetros do BM25.
+"""
+import json
+import math
+import os
+import re
+import time
+import unicodedata
+from array import array
+from collections import Counter
+
+import numpy as np
+
+from index_reload import discard_generation, new_generation, publish_generation, resolve_index_dir
+
+LEXICAL_FORMAT_VERSION = 1
+TERMS_FILE = "bm25_terms.json"
+POSTINGS_OFFSETS_FILE = "bm25_postings.offsets.npy"
+POSTINGS_DOCS_FILE = "bm25_postings.docs.npy"
+POSTINGS_TFS_FILE = "bm25_postings.tfs.npy"
+DOC_LENGTHS_FILE = "bm25_doc_lengths.npy"
+DOC_KEYS_FILE = "bm25_doc_keys.json"
+LEXICAL_MANIFEST_FILE = "bm25_manifest.json"
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Os termos do título contam como se aparecessem TITLE_WEIGHT vezes
+TITLE_WEIGHT = 3
+# Constante da reciprocal rank fusion (valor usual da literatura)
+RRF_K = 60
+
+# Palavras com pontuação interna (ERR-1042, --log-level, config.yaml, v4.0) formam um termo composto,
+# indexado junto com as suas partes
+TOKEN_PATTERN = re.compile(r'\w+(?:[.\-/:]\w+)*')
+TOKEN_PART_PATTERN = re.compile(r'[.\-/:_]')
+COMBINING_MARKS_PATTERN = re.compile(r'[\u0300-\u036f]')
+MAX_TF = np.iinfo(np.uint16).max
+
+
+def fold_text(text):
+    """Caixa e acentos ignorados ("Configuração" e "configuracao" geram o mesmo termo)."""
+    text = text.casefold()
+    if text.isascii():
+        return text
+    return COMBINING_MARKS_PATTERN.sub('', unicodedata.normalize('NFKD', text))
+
+
+def tokenize(text):
+    """Termos do texto: palavras e termos compostos (com as suas partes), sem acentos e em caixa baixa."""
+    terms = []
+    for token in TOKEN_PATTERN.findall(fold_text(text)):
+        terms.append(token)
+        parts = TOKEN_PART_PATTERN.split(token)
+        if len(parts) > 1:
+            terms.extend(part for part in parts if part)
+    return terms
+
+
+def field_term_counts(title, content):
+    """Frequência dos termos por campo, (título, conteúdo); pode ser calculada fora do processo do builder."""
+    return Counter(tokenize(title)), Counter(tokenize(content))
+
+
+class LexicalIndexBuilder:
+    """Acumula os postings documento a documento (na ordem da extração) e grava o índice."""
+
+    def __init__(self):
+        self.doc_keys = []
+        self.doc_lengths = array('I')
+        self._postings = {}
+
+    def add_document(self, doc_key, title, content):
+        self.add_term_counts(doc_key, *field_term_counts(title, content))
+
+    def add_term_counts(self, doc_key, title_counts, content_counts):
+        """Adiciona um documento já tokenizado (veja field_term_counts): apenas junta os postings."""
+        doc_id = len(self.doc_keys)
+        counts = Counter(content_counts)
+        for term, tf in title_counts.items():
+            counts[term] += TITLE_WEIGHT * tf
+        for term, tf in counts.items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = (array('I'), array('H'))
+            postings[0].append(doc_id)
+            postings[1].append(min(tf, MAX_TF))
+        self.doc_keys.append(doc_key)
+        self.doc_lengths.append(sum(counts.values()))
+
+    def save(self, index_dir):
+        """Grava o índice em uma nova geração de `index_dir` e a publica (ver index_reload.py)."""
+        os.makedirs(index_dir, exist_ok=True)
+        version, generation_dir = new_generation(index_dir)
+        try:
+            manifest = self._write(generation_dir, version)
+        except BaseException:
+            discard_generation(generation_dir)
+            raise
+        publish_generation(index_dir, version, LEXICAL_MANIFEST_FILE)
+        return manifest
+
+    def _write(self, generation_dir, version):
+        terms = sorted(self._postings)
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(self._postings[term][0]) for term in terms])
+        docs = np.empty(offsets[-1], dtype=np.uint32)
+        tfs = np.empty(offsets[-1], dtype=np.uint16)
+        for i, term in enumerate(terms):
+            term_docs, term_tfs = self._postings[term]
+            docs[offsets[i]:offsets[i + 1]] = np.frombuffer(term_docs, dtype=np.uint32)
+            tfs[offsets[i]:offsets[i + 1]] = np.frombuffer(term_tfs, dtype=np.uint16)
+        doc_lengths = np.frombuffer(self.doc_lengths, dtype=np.uint32) if self.doc_lengths else np.zeros(0, dtype=np.uint32)
+
+        arrays = {POSTINGS_OFFSETS_FILE: offsets, POSTINGS_DOCS_FILE: docs, POSTINGS_TFS_FILE: tfs, DOC_LENGTHS_FILE: doc_lengths}
+        for name, values in arrays.items():
+            with open(os.path.join(generation_dir, name), 'wb') as f:
+                np.save(f, values)
+        for name, values in ((TERMS_FILE, terms), (DOC_KEYS_FILE, self.doc_keys)):
+            with open(os.path.join(generation_dir, name), 'w', encoding='utf-8') as f:
+                json.dump(values, f, ensure_ascii=False)
+
+        manifest = {
+            "format_version": LEXICAL_FORMAT_VERSION,
+            "doc_count": len(self.doc_keys),
+            "term_count": len(terms),
+            "posting_count": int(offsets[-1]),
+            "avg_doc_length": float(doc_lengths.mean()) if len(doc_lengths) else 0.0,
+            "k1": BM25_K1,
+            "b": BM25_B,
+            "title_weight": TITLE_WEIGHT,
+            "index_version": version,
+            "created_at": time.strftime('%Y-%m-%dT%H:%M:%S'),
+        }
+        with open(os.path.join(generation_dir, LEXICAL_MANIFEST_FILE), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=4)
+        return manifest
+
+
+class LexicalIndex:
+    """Busca BM25 sobre o índice gravado por LexicalIndexBuilder (postings mapeados em memória)."""
+
+    def __init__(self, terms, offsets, docs, tfs, doc_lengths, doc_keys, manifest):
+        self.term_ids = {term: i for i, term in enumerate(terms)}
+        self.offsets = offsets
+        self.docs = docs
+        self.tfs = tfs
+        self.doc_lengths = doc_lengths
+        self.doc_keys = doc_keys
+        self.manifest = manifest
+        self.k1 = manifest.get("k1", BM25_K1)
+        self.b = manifest.get("b", BM25_B)
+        avg_doc_length = manifest.get("avg_doc_length") or 1.0
+        # Parte do denominador do BM25 que depende só do documento: k1 * (1 - b + b * |d| / avgdl)
+        self._length_norm = (self.k1 * (1 - self.b + self.b * np.asarray(doc_lengths, dtype=np.float32) / avg_doc_length)).astype(np.float32)
+
+    def __len__(self):
+        return len(self.doc_keys)
+
+    def query_terms(self, query):
+        """Termos da consulta presentes no vocabulário (sem repetição)."""
+        return [term for term in dict.fromkeys(tokenize(query)) if term in self.term_ids]
+
+    def search(self, query, top_k=10):
+        """Retorna até top_k tuplas (doc_id_lexical, score_bm25) em ordem decrescente de score."""
+        terms = self.query_terms(query)
+        if not terms or top_k <= 0 or not len(self):
+            return []
+        n = len(self)
+        scores = np.zeros(n, dtype=np.float32)
+        for term in terms:
+            term_id = self.term_ids[term]
+            start, end = int(self.offsets[term_id]), int(self.offsets[term_id + 1])
+            docs = np.asarray(self.docs[start:end])
+            tfs = np.asarray(self.tfs[start:end], dtype=np.float32)
+            df = end - start
+            idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+            # Cada documento aparece uma única vez por lista: indexação direta em vez de np.add.at
+            scores[docs] += idf * tfs * (self.k1 + 1) / (tfs + self._length_norm[docs])
+
+        matched = np.flatnonzero(scores)
+        if len(matched) > top_k:
+            matched = matched[np.argpartition(-scores[matched], top_k - 1)[:top_k]]
+        matched = matched[np.argsort(-scores[matched], kind='stable')]
+        return [(int(doc_id), float(scores[doc_id])) for doc_id in matched]
+
+
+def lexical_index_exists(index_dir):
+    return os.path.exists(os.path.join(resolve_index_dir(index_dir), LEXICAL_MANIFEST_FILE))
+
+
+def load_lexical_index(index_dir):
+    """Abre a geração ativa do índice lexical de `index_dir` (ou o diretório de uma geração)."""
+    index_dir = resolve_index_dir(index_dir)
+    with open(os.path.join(index_dir, LEXICAL_MANIFEST_FILE), 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    if manifest.get("format_version") != LEXICAL_FORMAT_VERSION:
+        raise ValueError(f"Versão de formato do índice lexical não suportada: {manifest.get('format_version')}. "
+                         f"Execute 'extract_data_from_markdown.py' novamente.")
+    with open(os.path.join(index_dir, TERMS_FILE), 'r', encoding='utf-8') as f:
+        terms = json.load(f)
+    with open(os.path.join(index_dir, DOC_KEYS_FILE), 'r', encoding='utf-8') as f:
+        doc_keys = json.load(f)
+    offsets = np.load(os.path.join(index_dir, POSTINGS_OFFSETS_FILE), mmap_mode='r')
+    docs = np.load(os.path.join(index_dir, POSTINGS_DOCS_FILE), mmap_mode='r')
+    tfs = np.load(os.path.join(index_dir, POSTINGS_TFS_FILE), mmap_mode='r')
+    doc_lengths = np.load(os.path.join(index_dir, DOC_LENGTHS_FILE))
+    return LexicalIndex(terms, offsets, docs, tfs, doc_lengths, doc_keys, manifest)
+
+
+def reciprocal_rank_fusion(rankings, k=RRF_K):
+    """
+    Funde listas ordenadas de chaves (a melhor primeiro) pela reciprocal rank fusion:
+    score(chave) = soma de 1 / (k + posição) nas listas em que aparece.
+    Retorna [(chave, score)] em ordem decrescente; empates mantêm a ordem da primeira aparição.
+    """
+    fused = {}
+    for ranking in rankings:
+        for rank, key in enumerate(ranking, start=1):
+            fused[key] = fused.get(key, 0.0) + 1.0 / (k + rank)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
@@ -1,83 +1,267 @@
+# merge-markdown.py
+"""
+Consolida todos os arquivos .md de um diretório (recursivamente) em um único arquivo Markdown,
+no formato lido por extract_data_from_markdown.py.
+
+O primeiro bloco de cada arquivo é lido em paralelo por um pool de threads (em ordem, com uma
+janela limitada de leituras adiantadas); arquivos maiores que um bloco seguem sendo copiados, a
+partir dali, em blocos de tamanho fixo. Um arquivo com erro de leitura não entra na saída. Linhas e
+caracteres são contados durante a escrita. A saída é gravada num arquivo temporário e só
+substitui a anterior no final.
+
+Um manifest (caminho relativo -> mtime/tamanho de cada arquivo) é gravado ao lado da saída:
+se nenhum arquivo mudou e a saída continua a mesma, a consolidação é pulada.
+
+Uso:
+    python merge-markdown.py caminho/para/docs/en --output senhasegura_docs_consolidated.md
+"""
+import argparse
+import json
 import os
-import glob
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
-def consolidate_markdown_files(input_directory, output_file):
+DEFAULT_OUTPUT = "senhasegura_docs_consolidated.md"
+DEFAULT_BUFFER_SIZE = 1024 * 1024
+MANIFEST_SUFFIX = ".manifest.json"
+MANIFEST_FORMAT_VERSION = 1
+CONSOLIDATED_HEADER = "# Documentação Consolidada - Segura\n\n---\n\n"
+
+
+def default_workers():
+    return min(32, (os.cpu_count() or 1) + 4)
+
+
+def find_markdown_files(root):
+    """
+    Arquivos .md sob `root` como tuplas (caminho, caminho_relativo, mtime_ns, tamanho),
+    ordenadas pelo caminho completo (mesma ordem da versão com rglob).
+    """
+    files = []
+    pending = [root]
+    while pending:
+        directory = pending.pop()
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    pending.append(entry.path)
+                elif os.path.normcase(entry.name).endswith('.md') and entry.is_file():
+                    stat = entry.stat()
+                    path = Path(entry.path)
+                    files.append((path, str(path.relative_to(root)), stat.st_mtime_ns, stat.st_size))
+    files.sort(key=lambda item: str(item[0]))
+    return files
+
+
+def default_manifest_path(output_file):
+    return str(output_file) + MANIFEST_SUFFIX
+
+
+def load_manifest(manifest_path):
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def is_up_to_date(manifest, input_directory, output_file, files):
+    """True se o manifest descreve exatamente os mesmos arquivos de entrada e a saída não foi alterada."""
+    if not manifest or manifest.get("format_version") != MANIFEST_FORMAT_VERSION:
+        return False
+    if manifest.get("input_dir") != os.path.abspath(input_directory):
+        return False
+    try:
+        output_stat = os.stat(output_file)
+    except FileNotFoundError:
+        return False
+    if [output_stat.st_mtime_ns, output_stat.st_size] != manifest.get("output"):
+        return False
+    return manifest.get("files") == {relative_path: [mtime_ns, size] for _, relative_path, mtime_ns, size in files}
+
+
+def read_first_block(path, buffer_size):
+    """
+    Lê o primeiro bloco do arquivo. Retorna (conteúdo, None) se o arquivo couber em um bloco; para
+    arquivos maiores, (primeiro_bloco, arquivo_aberto): a escrita continua a leitura de onde parou.
+    """
+    f = open(path, 'r', encoding='utf-8')
+    try:
+        block = f.read(buffer_size)
+    except BaseException:
+        f.close()
+        raise
+    # read(n) em modo texto só devolve menos de n caracteres no fim do arquivo
+    if len(block) < buffer_size:
+        f.close()
+        return block, None
+    return block, f
+
+
+def read_ahead(executor, files, buffer_size, window):
+    """Gera (arquivo, future da leitura) em ordem, com no máximo `window` leituras em andamento."""
+    queue = deque()
+    for item in files:
+        queue.append((item, executor.submit(read_first_block, item[0], buffer_size)))
+        if len(queue) >= window:
+            yield queue.popleft()
+    while queue:
+        yield queue.popleft()
+
+
+class CountingWriter:
+    """Escreve no arquivo de saída contando caracteres e quebras de linha."""
+
+    def __init__(self, f):
+        self.f = f
+        self.chars = 0
+        self.newlines = 0
+
+    def write(self, text):
+        self.f.write(text)
+        self.chars += len(text)
+        self.newlines += text.count('\n')
+
+    def mark(self):
+        """Posição atual (arquivo e contadores), para desfazer a escrita de uma seção com rollback."""
+        return self.f.tell(), self.chars, self.newlines
+
+    def rollback(self, mark):
+        position, self.chars, self.newlines = mark
+        self.f.seek(position)
+        self.f.truncate()
+
+
+def consolidate_markdown_files(input_directory, output_file, workers=None, buffer_size=DEFAULT_BUFFER_SIZE,
+                               manifest_path=None, force=False, verbose=False):
     """
     Consolida todos os arquivos .md de um diretório em um único arquivo.
-    
+
     Args:
         input_directory (str): Caminho para o diretório com os arquivos .md
         output_file (str): Nome do arquivo de saída consolidado
+        workers (int): Threads de leitura (padrão: min(32, CPUs + 4))
+        buffer_size (int): Tamanho dos blocos de cópia, em caracteres
+        manifest_path (str): Manifest de mtime/tamanho (padrão: saída + ".manifest.json")
+        force (bool): Consolida mesmo que nada tenha mudado
+
+    Returns:
+        dict com as estatísticas ou None se nada foi gerado.
     """
-    
-    # Caminho completo do diretório
     docs_path = Path(input_directory)
-    
-    if not docs_path.exists():
+
+    if not docs_path.is_dir():
         print(f"Erro: O diretório '{input_directory}' não foi encontrado.")
-        return
-    
-    # Busca todos os arquivos .md recursivamente
-    md_files = list(docs_path.rglob('*.md'))
-    
+        return None
+
+    md_files = find_markdown_files(docs_path)
+
     if not md_files:
         print("Nenhum arquivo .md encontrado no diretório especificado.")
-        return
-    
+        return None
+
     print(f"Encontrados {len(md_files)} arquivos Markdown.")
-    
-    # Ordena os arquivos por caminho para manter consistência
-    md_files.sort(key=lambda x: str(x))
-    
-    with open(output_file, 'w', encoding='utf-8') as consolidated_file:
+
+    manifest_path = manifest_path or default_manifest_path(output_file)
+    manifest = load_manifest(manifest_path)
+    if not force and is_up_to_date(manifest, input_directory, output_file, md_files):
+        stats = manifest.get("stats", {})
+        print(f"Nenhum arquivo mudou desde a última consolidação; '{output_file}' mantido (use --force para refazer).")
+        return stats
+
+    workers = max(1, workers or default_workers())
+    started = time.monotonic()
+    tmp_path = f"{output_file}.tmp"
+    processed, errors = 0, 0
+    failed = set()
+    with open(tmp_path, 'w', encoding='utf-8', newline='\n', buffering=buffer_size) as f, \
+            ThreadPoolExecutor(max_workers=workers) as executor:
+        out = CountingWriter(f)
         # Cabeçalho do documento consolidado
-        consolidated_file.write("# Documentação Consolidada - Segura\n\n")
-        consolidated_file.write("---\n\n")
-        
-        for md_file in md_files:
+        out.write(CONSOLIDATED_HEADER)
+
+        for (md_file, relative_path, _, _), future in read_ahead(executor, md_files, buffer_size, workers * 4):
+            # Separador e título da seção
+            section_header = f"\n\n## Arquivo: {relative_path}\n\n---\n\n"
             try:
-                # Caminho relativo para melhor organização
-                relative_path = md_file.relative_to(docs_path)
-                
-                # Adiciona separador e título da seção
-                consolidated_file.write(f"\n\n## Arquivo: {relative_path}\n\n")
-                consolidated_file.write("---\n\n")
-                
-                # Lê e adiciona o conteúdo do arquivo
-                with open(md_file, 'r', encoding='utf-8') as current_file:
-                    content = current_file.read()
-                    consolidated_file.write(content)
-                    consolidated_file.write("\n\n")
-                
-                print(f"Processado: {relative_path}")
-                
+                content, remaining = future.result()
+                if remaining is None:
+                    out.write(section_header)
+                    out.write(content)
+                else:
+                    # Arquivo maior que um bloco: continua de onde a leitura antecipada parou, em blocos de
+                    # tamanho fixo; um erro no meio do arquivo desfaz a seção inteira (sem corpo parcial)
+                    mark = out.mark()
+                    try:
+                        with remaining:
+                            out.write(section_header)
+                            out.write(content)
+                            while True:
+                                block = remaining.read(buffer_size)
+                                if not block:
+                                    break
+                                out.write(block)
+                    except Exception:
+                        out.rollback(mark)
+                        raise
+                out.write("\n\n")
+                processed += 1
+                if verbose:
+                    print(f"Processado: {relative_path}")
             except Exception as e:
+                errors += 1
+                failed.add(relative_path)
                 print(f"Erro ao processar {md_file}: {str(e)}")
-    
-    print(f"\nConsolidação concluída! Arquivo salvo como: {output_file}")
-    
-    # Estatísticas do arquivo gerado
-    with open(output_file, 'r', encoding='utf-8') as f:
-        lines = len(f.readlines())
-        f.seek(0)
-        chars = len(f.read())
-    
+
+    os.replace(tmp_path, output_file)
+    # Toda quebra de linha da saída termina uma linha (a saída sempre termina com "\n")
+    stats = {"files": processed, "errors": errors, "lines": out.newlines, "chars": out.chars}
+    output_stat = os.stat(output_file)
+    new_manifest = {
+        "format_version": MANIFEST_FORMAT_VERSION,
+        "created_at": time.strftime('%Y-%m-%dT%H:%M:%S'),
+        "input_dir": os.path.abspath(input_directory),
+        "output": [output_stat.st_mtime_ns, output_stat.st_size],
+        "stats": stats,
+        # Arquivos com erro ficam fora do manifest: a próxima execução não é pulada e tenta de novo
+        "files": {relative_path: [mtime_ns, size] for _, relative_path, mtime_ns, size in md_files if relative_path not in failed},
+    }
+    manifest_tmp = f"{manifest_path}.tmp"
+    with open(manifest_tmp, 'w', encoding='utf-8') as f:
+        json.dump(new_manifest, f, ensure_ascii=False)
+    os.replace(manifest_tmp, manifest_path)
+
+    print(f"\nConsolidação concluída em {time.monotonic() - started:.2f}s! Arquivo salvo como: {output_file}")
     print(f"Estatísticas do arquivo consolidado:")
-    print(f"- Linhas: {lines:,}")
-    print(f"- Caracteres: {chars:,}")
+    print(f"- Arquivos: {processed:,}" + (f" ({errors:,} com erro)" if errors else ""))
+    print(f"- Linhas: {stats['lines']:,}")
+    print(f"- Caracteres: {stats['chars']:,}")
+    return stats
+
 
 def main():
-    # Configuração dos caminhos
-    input_dir = r"C:\Users\PauloGuilhermePilott\Documents\Ferramentas\gartner\senhasegura_docs_repo\4.0\en"
-    output_file = "senhasegura_docs_consolidated.md"
-    
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input_dir", help="Diretório com os arquivos .md (percorrido recursivamente)")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="Arquivo Markdown consolidado")
+    parser.add_argument("--workers", type=int, default=None, help="Threads de leitura (padrão: min(32, CPUs + 4))")
+    parser.add_argument("--buffer-size", type=int, default=DEFAULT_BUFFER_SIZE, help="Tamanho dos blocos de cópia (caracteres)")
+    parser.add_argument("--manifest", default=None, help="Manifest de mtime/tamanho dos arquivos (padrão: <output>.manifest.json)")
+    parser.add_argument("--force", action="store_true", help="Consolida mesmo que nenhum arquivo tenha mudado")
+    parser.add_argument("--verbose", action="store_true", help="Mostra cada arquivo processado")
+    args = parser.parse_args()
+
     print("Iniciando consolidação da documentação Senhasegura...")
-    print(f"Diretório de origem: {input_dir}")
-    print(f"Arquivo de destino: {output_file}")
+    print(f"Diretório de origem: {args.input_dir}")
+    print(f"Arquivo de destino: {args.output}")
     print("-" * 50)
-    
-    consolidate_markdown_files(input_dir, output_file)
+
+    stats = consolidate_markdown_files(args.input_dir, args.output, workers=args.workers, buffer_size=max(1, args.buffer_size),
+                                       manifest_path=args.manifest, force=args.force, verbose=args.verbose)
+    if stats is None:
+        raise SystemExit(1)
+
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
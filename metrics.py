@@ -0,0 +1,271 @@
+# metrics.py
+"""
+Métricas de latência por etapa e de tokens, expostas no formato texto do Prometheus
+(GET /metrics), sem dependências externas.
+
+Cada requisição tem um RequestTimer (id da requisição + tempo de cada etapa), disponível
+para o código da requisição por uma variável de contexto (funciona em threads e no asyncio).
+As etapas são medidas com `with stage("embedding"):` e alimentam sempre o histograma
+coverage_stage_seconds; quando há um RequestTimer ativo, também o detalhamento da requisição.
+
+As métricas são por processo: com vários workers do gunicorn, cada coleta de /metrics vê
+apenas o worker que a atendeu.
+"""
+import contextvars
+import functools
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0)
+TOKEN_BUCKETS = (64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384, 32768)
+
+
+def _format_labels(labelnames, values, extra=None):
+    pairs = list(zip(labelnames, values)) + (extra or [])
+    if not pairs:
+        return ""
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value):
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Histogram:
+    """Histograma cumulativo com rótulos (thread-safe)."""
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["counts"][i] += 1
+                    break
+            series["sum"] += value
+            series["count"] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series_items = [(key, dict(series, counts=list(series["counts"]))) for key, series in sorted(self._series.items())]
+        for key, series in series_items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, series["counts"]):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, [('le', _format_value(bound))])} {cumulative}")
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, [('le', '+Inf')])} {series['count']}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {series['sum']}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {series['count']}")
+        return lines
+
+
+class Counter:
+    """Contador com rótulos (thread-safe)."""
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = sorted(self._values.items())
+        lines.extend(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in values)
+        return lines
+
+
+class Gauge:
+    """Valor instantâneo com rótulos (thread-safe)."""
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def set(self, value, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def replace(self, value, **labels):
+        """Mantém apenas a série com estes rótulos (métricas do tipo *_info, cujos rótulos mudam)."""
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values = {key: value}
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge"]
+        with self._lock:
+            values = sorted(self._values.items())
+        lines.extend(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in values)
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics = []
+
+    def histogram(self, *args, **kwargs):
+        metric = Histogram(*args, **kwargs)
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, *args, **kwargs):
+        metric = Counter(*args, **kwargs)
+        self.metrics.append(metric)
+        return metric
+
+    def gauge(self, *args, **kwargs):
+        metric = Gauge(*args, **kwargs)
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+REQUEST_SECONDS = REGISTRY.histogram("coverage_request_seconds", "Duração das requisições (s), por rota e status HTTP.", ("route", "status"))
+STAGE_SECONDS = REGISTRY.histogram("coverage_stage_seconds", "Duração (s) de cada etapa da análise de cobertura.", ("stage",))
+PROMPT_TOKENS = REGISTRY.histogram("coverage_prompt_tokens", "Tokens do prompt enviado ao modelo generativo.", buckets=TOKEN_BUCKETS)
+RESPONSE_TOKENS = REGISTRY.histogram("coverage_response_tokens", "Tokens da resposta do modelo generativo.", buckets=TOKEN_BUCKETS)
+STAGE_ERRORS = REGISTRY.counter("coverage_stage_errors_total", "Exceções por etapa da análise de cobertura.", ("stage",))
+UPSTREAM_QUEUE_SECONDS = REGISTRY.histogram("coverage_upstream_queue_seconds", "Espera (s) por uma vaga para chamar o Gemini (controle de admissão), por operação.", ("operation",))
+UPSTREAM_CALLS = REGISTRY.counter("coverage_upstream_calls_total", "Chamadas ao Gemini por operação e resultado (ok, error, coalesced, rejected, circuit_open).", ("operation", "outcome"))
+UPSTREAM_INFLIGHT = REGISTRY.gauge("coverage_upstream_inflight", "Chamadas ao Gemini em andamento, por operação.", ("operation",))
+INDEX_INFO = REGISTRY.gauge("coverage_index_info", "Versão do índice ativo.", ("version", "lexical_version"))
+INDEX_DOCS = REGISTRY.gauge("coverage_index_docs", "Documentos no índice ativo.")
+UPSTREAM_CIRCUIT_OPEN = REGISTRY.gauge("coverage_upstream_circuit_open", "1 se o circuit breaker da operação está aberto (ou em teste), 0 se fechado.", ("operation",))
+
+_current_timer = contextvars.ContextVar("request_timer", default=None)
+
+
+class RequestTimer:
+    """Tempos (acumulados por etapa) e tokens de uma requisição."""
+
+    def __init__(self, request_id=None):
+        self.request_id = request_id or uuid.uuid4().hex[:12]
+        self.started = time.perf_counter()
+        self.stages = {}
+        self.tokens = {}
+        self._lock = threading.Lock()
+
+    def add(self, stage, seconds):
+        with self._lock:
+            self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def add_tokens(self, kind, count):
+        with self._lock:
+            self.tokens[kind] = self.tokens.get(kind, 0) + count
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def breakdown(self):
+        with self._lock:
+            stages = {stage: round(seconds * 1000, 2) for stage, seconds in self.stages.items()}
+            tokens = dict(self.tokens)
+        return {"request_id": self.request_id, "total_ms": round(self.elapsed() * 1000, 2), "stages": stages, "tokens": tokens}
+
+    def summary(self):
+        """Texto curto com os tempos por etapa, para o log."""
+        return ", ".join(f"{stage} {ms:.0f} ms" for stage, ms in self.breakdown()["stages"].items()) or "sem etapas medidas"
+
+
+def start_request(request_id=None):
+    """Cria o RequestTimer da requisição e o torna o atual no contexto em execução."""
+    timer = RequestTimer(request_id)
+    _current_timer.set(timer)
+    return timer
+
+
+def current_timer():
+    return _current_timer.get()
+
+
+def clear_request():
+    _current_timer.set(None)
+
+
+def observe_stage(name, seconds):
+    STAGE_SECONDS.observe(seconds, stage=name)
+    timer = _current_timer.get()
+    if timer is not None:
+        timer.add(name, seconds)
+
+
+@contextmanager
+def stage(name):
+    """Mede a duração do bloco como a etapa `name` (exceções são contadas e propagadas)."""
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        STAGE_ERRORS.inc(stage=name)
+        raise
+    finally:
+        observe_stage(name, time.perf_counter() - started)
+
+
+def timed(name):
+    """Decorador: mede cada chamada da função como a etapa `name`."""
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record_tokens(prompt_tokens=None, response_tokens=None):
+    """Registra os tokens de uma chamada ao modelo generativo (histogramas e requisição atual)."""
+    timer = _current_timer.get()
+    if prompt_tokens is not None:
+        PROMPT_TOKENS.observe(prompt_tokens)
+    if response_tokens is not None:
+        RESPONSE_TOKENS.observe(response_tokens)
+    if timer is not None:
+        if prompt_tokens is not None:
+            timer.add_tokens("prompt", prompt_tokens)
+        if response_tokens is not None:
+            timer.add_tokens("response", response_tokens)
+
+
+def observe_request(route, status, seconds):
+    REQUEST_SECONDS.observe(seconds, route=route, status=status)
@@ -0,0 +1,89 @@
+# prompt_context.py
+"""
+Montagem do contexto do prompt de análise de cobertura dentro de um orçamento de tokens.
+
+Os documentos entram em ordem de relevância. Quando o orçamento acaba, os documentos de
+menor relevância são resumidos (apenas o trecho mais similar, truncado se preciso) ou
+descartados, e o relatório indica quantos documentos foram recuperados e incluídos.
+"""
+from text_cleaning import estimate_tokens
+
+DEFAULT_CONTEXT_TOKEN_BUDGET = 6000
+# Abaixo disso não vale a pena incluir um documento truncado
+MIN_DOC_TOKENS = 64
+TRUNCATION_MARK = " [...]"
+
+
+def format_passages(passages):
+    """Junta os trechos de um documento, cada um precedido pela sua seção."""
+    return "\n[...]\n".join(f"({passage['heading']})\n{passage['text']}" if passage.get('heading') else passage['text'] for passage in passages)
+
+
+def doc_header(doc):
+    return f"Título: {doc['title']}\nSlug: {doc.get('slug', 'N/A')}\nCaminho do Arquivo: {doc.get('filepath', 'N/A')}\nTrechos relevantes:\n"
+
+
+def doc_body(doc, passages=None):
+    """Texto do documento que entra no prompt: os trechos recuperados (ou o conteúdo, em índices sem trechos)."""
+    passages = doc.get('passages') if passages is None else passages
+    if not passages:
+        return doc.get('content', '')
+    return format_passages(passages)
+
+
+def truncate_to_tokens(text, max_tokens):
+    """Corta o texto para caber em max_tokens (estimados), em limite de palavra."""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    max_chars = max(0, max_tokens * 4 - len(TRUNCATION_MARK))
+    cut = text[:max_chars]
+    space = cut.rfind(" ")
+    if space > max_chars // 2:
+        cut = cut[:space]
+    return cut + TRUNCATION_MARK
+
+
+def build_context(relevant_docs_with_similarity, token_budget=DEFAULT_CONTEXT_TOKEN_BUDGET):
+    """
+    Monta o contexto do prompt preenchendo o orçamento por relevância.
+    Retorna (context_str, documentos_incluidos, relatorio), onde documentos_incluidos é uma lista de
+    (similaridade, doc, texto_incluido, modo) com modo "full", "summary" ou "truncated".
+    """
+    parts = []
+    included = []
+    remaining = token_budget
+    for sim, doc in relevant_docs_with_similarity:
+        header = doc_header(doc)
+        body = doc_body(doc)
+        cost = estimate_tokens(header + body) + 1
+        mode = "full"
+
+        if cost > remaining:
+            # Resumo extrativo: apenas o trecho mais similar do documento
+            passages = doc.get('passages') or []
+            if len(passages) > 1:
+                body = doc_body(doc, [max(passages, key=lambda passage: passage.get('score', 0))])
+                mode = "summary"
+            available = remaining - estimate_tokens(header) - 1
+            if available < MIN_DOC_TOKENS:
+                continue
+            if estimate_tokens(body) > available:
+                body = truncate_to_tokens(body, available)
+                mode = "truncated"
+            cost = estimate_tokens(header + body) + 1
+
+        parts.append(f"{header}{body}\n\n")
+        included.append((sim, doc, body, mode))
+        remaining -= cost
+
+    context_str = "".join(parts)
+    report = {
+        "context_token_budget": token_budget,
+        "context_tokens": estimate_tokens(context_str) if context_str else 0,
+        "retrieved_docs": len(relevant_docs_with_similarity),
+        "included_docs": len(included),
+        "summarized_docs": sum(1 for *_, mode in included if mode == "summary"),
+        "truncated_docs": sum(1 for *_, mode in included if mode == "truncated"),
+        "dropped_docs": len(relevant_docs_with_similarity) - len(included),
+    }
+    return context_str, included, report
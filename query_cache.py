@@ -0,0 +1,218 @@
+# query_cache.py
+"""
+Caches do app Flask.
+
+- QueryEmbeddingCache: embeddings de consultas, com camada em memória LRU + TTL
+  (cachetools.TTLCache) e, opcionalmente, uma camada persistente em SQLite, que sobrevive
+  a reinícios e é compartilhada entre os workers do gunicorn.
+- ResponseCache: respostas do modelo generativo para análises de cobertura repetidas.
+
+As chaves partem da consulta normalizada (caixa e espaços).
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+
+import numpy as np
+from cachetools import TTLCache
+
+WHITESPACE_PATTERN = re.compile(r'\s+')
+# Fração do TTL após a qual uma leitura no SQLite atualiza accessed_at (a ordem de descarte é aproximada,
+# mas as leituras compartilhadas entre workers quase nunca viram transações de escrita)
+ACCESS_REFRESH_FRACTION = 0.1
+
+
+def normalize_query(query):
+    """Normaliza a consulta para uso como chave: espaços colapsados e caixa ignorada."""
+    return WHITESPACE_PATTERN.sub(' ', query).strip().casefold()
+
+
+class QueryEmbeddingCache:
+    """
+    Cache de embeddings com LRU + TTL em memória e persistência opcional em SQLite.
+    Os embeddings são armazenados como float32. É seguro para uso entre threads.
+    """
+
+    def __init__(self, maxsize=1024, ttl=86400, sqlite_path=None, sqlite_max_entries=100000):
+        self.ttl = ttl
+        self.sqlite_path = sqlite_path
+        self.sqlite_max_entries = sqlite_max_entries
+        self._memory = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._writes = 0
+        self.hits = 0
+        self.sqlite_hits = 0
+        self.misses = 0
+        if sqlite_path:
+            try:
+                self._connection()
+            except sqlite3.Error as e:
+                logging.warning(f"Erro ao abrir o cache de embeddings em SQLite '{sqlite_path}': {e}")
+
+    def _connection(self):
+        """Uma conexão SQLite por thread (conexões não devem ser compartilhadas entre threads)."""
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            directory = os.path.dirname(self.sqlite_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(self.sqlite_path, timeout=5, isolation_level=None)
+            # WAL permite leituras concorrentes de vários processos enquanto um deles escreve
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS query_embeddings ("
+                " key TEXT PRIMARY KEY, embedding BLOB NOT NULL,"
+                " created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            self._local.connection = connection
+        return connection
+
+    @staticmethod
+    def make_key(query, namespace=""):
+        return f"{namespace}\x00{normalize_query(query)}" if namespace else normalize_query(query)
+
+    def get(self, query, namespace=""):
+        key = self.make_key(query, namespace)
+        with self._lock:
+            vector = self._memory.get(key)
+            if vector is not None:
+                self.hits += 1
+                return vector
+
+        vector = self._sqlite_get(key) if self.sqlite_path else None
+        with self._lock:
+            if vector is not None:
+                self.hits += 1
+                self.sqlite_hits += 1
+                self._memory[key] = vector
+            else:
+                self.misses += 1
+        return vector
+
+    def set(self, query, vector, namespace=""):
+        key = self.make_key(query, namespace)
+        vector = np.asarray(vector, dtype=np.float32)
+        with self._lock:
+            self._memory[key] = vector
+            self._writes += 1
+            prune = self._writes % 100 == 0
+        if self.sqlite_path:
+            self._sqlite_set(key, vector, prune)
+
+    def get_or_compute(self, query, compute_fn, namespace=""):
+        """
+        Retorna o embedding em cache ou calcula com `compute_fn(query)` e armazena.
+        Resultados None (falha na geração) não são armazenados.
+        """
+        vector = self.get(query, namespace)
+        if vector is not None:
+            return vector
+        vector = compute_fn(query)
+        if vector is not None:
+            self.set(query, vector, namespace)
+        return vector
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "sqlite_hits": self.sqlite_hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+                "size": len(self._memory),
+                "maxsize": self._memory.maxsize,
+                "ttl": self.ttl,
+                "persistent": bool(self.sqlite_path),
+            }
+
+    def _sqlite_get(self, key):
+        try:
+            connection = self._connection()
+            row = connection.execute(
+                "SELECT embedding, created_at, accessed_at FROM query_embeddings WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            now = time.time()
+            if now - row[1] > self.ttl:
+                # Entradas expiradas são removidas pela limpeza periódica em _sqlite_set
+                return None
+            if now - row[2] > self.ttl * ACCESS_REFRESH_FRACTION:
+                connection.execute("UPDATE query_embeddings SET accessed_at = ? WHERE key = ?", (now, key))
+            return np.frombuffer(row[0], dtype=np.float32).copy()
+        except sqlite3.Error as e:
+            # A camada persistente é apenas uma otimização: falhas viram cache miss
+            logging.warning(f"Erro ao ler o cache de embeddings em SQLite: {e}")
+            return None
+
+    def _sqlite_set(self, key, vector, prune=False):
+        try:
+            connection = self._connection()
+            now = time.time()
+            connection.execute(
+                "INSERT OR REPLACE INTO query_embeddings (key, embedding, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, vector.tobytes(), now, now),
+            )
+            if prune:
+                connection.execute("DELETE FROM query_embeddings WHERE created_at < ?", (now - self.ttl,))
+                connection.execute(
+                    "DELETE FROM query_embeddings WHERE key IN ("
+                    " SELECT key FROM query_embeddings ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                    (self.sqlite_max_entries,),
+                )
+        except sqlite3.Error as e:
+            logging.warning(f"Erro ao gravar o cache de embeddings em SQLite: {e}")
+
+
+def analysis_cache_key(query, doc_fingerprints, model, temperature):
+    """
+    Chave do cache de análises: consulta normalizada, documentos recuperados em ordem
+    (id + hash do conteúdo), modelo e temperatura. Como os hashes fazem parte da chave,
+    uma reindexação que altere qualquer um dos documentos invalida a entrada automaticamente.
+    """
+    payload = json.dumps([normalize_query(query), list(doc_fingerprints), model, temperature], ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """Cache em memória (LRU + TTL) das respostas do modelo generativo, com contadores de hit/miss."""
+
+    def __init__(self, maxsize=256, ttl=86400):
+        self.ttl = ttl
+        self._memory = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            value = self._memory.get(key)
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._memory[key] = value
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+                "size": len(self._memory),
+                "maxsize": self._memory.maxsize,
+                "ttl": self.ttl,
+            }
@@ -0,0 +1,353 @@
+# upstream.py
+"""
+Camada compartilhada de acesso ao Gemini (embeddings e geração) usada pelo app Flask e pelo
+pipeline ASGI:
+
+  - instâncias de GenerativeModel de longa duração (uma por modelo, criadas na primeira chamada);
+  - coalescência (single-flight): chamadas idênticas simultâneas (mesmo modelo e texto, ou mesmo
+    prompt e temperatura) compartilham uma única requisição ao serviço;
+  - circuit breaker por operação: após `failure_threshold` falhas seguidas, as chamadas falham
+    imediatamente (CircuitOpenError) por `reset_timeout` segundos; depois disso uma única chamada
+    de teste decide se o circuito fecha ou abre de novo;
+  - controle de admissão: no máximo `max_inflight` chamadas simultâneas por processo (um limite
+    para as threads e outro para o loop de eventos); a espera por uma vaga é medida
+    (coverage_upstream_queue_seconds) e, passado `queue_timeout`, a chamada é recusada (UpstreamBusy).
+
+O módulo genai é injetado no construtor, de modo que a camada pode ser exercitada com um cliente
+falso (ex.: bench/stub_genai.py) sem acesso à rede.
+"""
+import asyncio
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+
+from metrics import UPSTREAM_CALLS, UPSTREAM_CIRCUIT_OPEN, UPSTREAM_INFLIGHT, UPSTREAM_QUEUE_SECONDS, observe_stage
+
+OPERATION_EMBED = "embed"
+OPERATION_GENERATE = "generate"
+
+CIRCUIT_CLOSED = "closed"
+CIRCUIT_OPEN = "open"
+CIRCUIT_HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """O circuit breaker da operação está aberto: a chamada não foi enviada ao serviço."""
+
+
+class UpstreamBusy(Exception):
+    """Não houve vaga para chamar o serviço dentro do tempo limite da fila de admissão."""
+
+
+class CircuitBreaker:
+    """Circuit breaker por contagem de falhas seguidas (thread-safe)."""
+
+    def __init__(self, name, failure_threshold=3, reset_timeout=30.0):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.state = CIRCUIT_CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+        UPSTREAM_CIRCUIT_OPEN.set(0, operation=name)
+
+    def _set_state(self, state):
+        self.state = state
+        UPSTREAM_CIRCUIT_OPEN.set(0 if state == CIRCUIT_CLOSED else 1, operation=self.name)
+
+    def is_open(self):
+        """True enquanto as chamadas são recusadas sem teste (aberto e dentro de reset_timeout)."""
+        with self._lock:
+            return self.state == CIRCUIT_OPEN and time.monotonic() - self.opened_at < self.reset_timeout
+
+    def allow_request(self):
+        """Decide se uma chamada pode ser enviada; no estado de teste, apenas uma por vez."""
+        with self._lock:
+            if self.state == CIRCUIT_CLOSED:
+                return True
+            if self.state == CIRCUIT_OPEN:
+                if time.monotonic() - self.opened_at < self.reset_timeout:
+                    return False
+                self._set_state(CIRCUIT_HALF_OPEN)
+            if self._probe_in_flight:
+                return False
+            self._probe_in_flight = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self._probe_in_flight = False
+            if self.state != CIRCUIT_CLOSED:
+                self._set_state(CIRCUIT_CLOSED)
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probe_in_flight = False
+            if self.state == CIRCUIT_HALF_OPEN or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+                self._set_state(CIRCUIT_OPEN)
+
+    def release(self):
+        """Chamada interrompida sem resultado (ex.: cliente desconectou): libera o teste sem contar falha."""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def status(self):
+        with self._lock:
+            retry_in = max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at)) if self.state == CIRCUIT_OPEN else 0.0
+            return {"state": self.state, "consecutive_failures": self.failures, "retry_in_s": round(retry_in, 1)}
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Coalescência de chamadas idênticas simultâneas entre threads."""
+
+    def __init__(self):
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        """Executa `fn()` ou aguarda a execução em andamento com a mesma chave. Retorna (resultado, compartilhado)."""
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result, True
+        try:
+            flight.result = fn()
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+        return flight.result, False
+
+
+class AsyncSingleFlight:
+    """
+    Coalescência de chamadas idênticas simultâneas no loop de eventos. A chamada roda numa task
+    própria: o cancelamento (ou timeout) de quem aguarda não a interrompe para os demais.
+    """
+
+    def __init__(self):
+        self._tasks = {}
+
+    async def do(self, key, coroutine_fn):
+        """Aguarda `coroutine_fn()` ou a execução em andamento com a mesma chave. Retorna (resultado, compartilhado)."""
+        key = (id(asyncio.get_running_loop()), key)
+        task = self._tasks.get(key)
+        shared = task is not None
+        if task is None:
+            task = asyncio.ensure_future(coroutine_fn())
+            self._tasks[key] = task
+            task.add_done_callback(lambda done, key=key: self._forget(key, done))
+        return await asyncio.shield(task), shared
+
+    def _forget(self, key, task):
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+        if not task.cancelled():
+            task.exception()  # marca a exceção como lida mesmo que ninguém mais aguarde a task
+
+
+class AdmissionControl:
+    """Limite de chamadas simultâneas ao serviço, com tempo de fila medido e espera máxima."""
+
+    def __init__(self, max_inflight, queue_timeout=None, async_max_inflight=None):
+        self.max_inflight = max(1, max_inflight)
+        self.async_max_inflight = max(1, async_max_inflight or max_inflight)
+        self.queue_timeout = queue_timeout
+        self._semaphore = threading.BoundedSemaphore(self.max_inflight)
+        self._async_semaphores = {}
+
+    def _admitted(self, operation, waited):
+        UPSTREAM_QUEUE_SECONDS.observe(waited, operation=operation)
+        observe_stage("upstream_queue", waited)
+        UPSTREAM_INFLIGHT.inc(operation=operation)
+
+    def _rejected(self, operation, waited):
+        UPSTREAM_QUEUE_SECONDS.observe(waited, operation=operation)
+        UPSTREAM_CALLS.inc(operation=operation, outcome="rejected")
+        raise UpstreamBusy(f"Nenhuma vaga para chamar o serviço ({operation}) em {self.queue_timeout}s.")
+
+    @contextmanager
+    def slot(self, operation):
+        started = time.perf_counter()
+        if not self._semaphore.acquire(timeout=self.queue_timeout):
+            self._rejected(operation, time.perf_counter() - started)
+        self._admitted(operation, time.perf_counter() - started)
+        try:
+            yield
+        finally:
+            UPSTREAM_INFLIGHT.dec(operation=operation)
+            self._semaphore.release()
+
+    @asynccontextmanager
+    async def slot_async(self, operation):
+        loop = asyncio.get_running_loop()
+        semaphore = self._async_semaphores.get(loop)
+        if semaphore is None:
+            semaphore = self._async_semaphores[loop] = asyncio.Semaphore(self.async_max_inflight)
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(semaphore.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self._rejected(operation, time.perf_counter() - started)
+        self._admitted(operation, time.perf_counter() - started)
+        try:
+            yield
+        finally:
+            UPSTREAM_INFLIGHT.dec(operation=operation)
+            semaphore.release()
+
+
+class UpstreamClient:
+    """Cliente do Gemini compartilhado pelo processo (ver a descrição do módulo)."""
+
+    def __init__(self, genai_module, embedding_model, generative_model, max_inflight=32, async_max_inflight=None,
+                 queue_timeout=30.0, failure_threshold=3, embed_reset_timeout=30.0, generate_reset_timeout=30.0):
+        self.genai = genai_module
+        self.embedding_model = embedding_model
+        self.generative_model = generative_model
+        self.admission = AdmissionControl(max_inflight, queue_timeout, async_max_inflight)
+        self.breakers = {
+            OPERATION_EMBED: CircuitBreaker(OPERATION_EMBED, failure_threshold, embed_reset_timeout),
+            OPERATION_GENERATE: CircuitBreaker(OPERATION_GENERATE, failure_threshold, generate_reset_timeout),
+        }
+        self._flights = SingleFlight()
+        self._async_flights = AsyncSingleFlight()
+        self._models = {}
+        self._models_lock = threading.Lock()
+
+    def model(self, model_name=None):
+        """GenerativeModel reutilizado entre as requisições (um por nome de modelo)."""
+        model_name = model_name or self.generative_model
+        model = self._models.get(model_name)
+        if model is None:
+            with self._models_lock:
+                model = self._models.get(model_name)
+                if model is None:
+                    model = self._models[model_name] = self.genai.GenerativeModel(model_name)
+        return model
+
+    def reset(self):
+        """Descarta os modelos criados (ex.: depois de substituir o módulo genai por um stub)."""
+        with self._models_lock:
+            self._models = {}
+
+    def generation_config(self, temperature):
+        return self.genai.types.GenerationConfig(temperature=temperature)
+
+    def _check_circuit(self, operation):
+        if not self.breakers[operation].allow_request():
+            UPSTREAM_CALLS.inc(operation=operation, outcome="circuit_open")
+            raise CircuitOpenError(f"Circuit breaker aberto para '{operation}': chamada não enviada ao serviço.")
+
+    def _finish(self, operation, error):
+        breaker = self.breakers[operation]
+        if error is None:
+            breaker.record_success()
+            UPSTREAM_CALLS.inc(operation=operation, outcome="ok")
+        elif isinstance(error, Exception) and not isinstance(error, UpstreamBusy):
+            breaker.record_failure()
+            UPSTREAM_CALLS.inc(operation=operation, outcome="error")
+        else:
+            # Fila cheia ou chamada interrompida (ex.: cliente desconectou): não é falha do serviço
+            breaker.release()
+
+    @contextmanager
+    def guarded(self, operation):
+        """Circuit breaker + controle de admissão em volta de uma chamada síncrona (inclusive em streaming)."""
+        self._check_circuit(operation)
+        try:
+            with self.admission.slot(operation):
+                yield
+        except BaseException as e:
+            self._finish(operation, e)
+            raise
+        self._finish(operation, None)
+
+    @asynccontextmanager
+    async def guarded_async(self, operation):
+        self._check_circuit(operation)
+        try:
+            async with self.admission.slot_async(operation):
+                yield
+        except BaseException as e:
+            self._finish(operation, e)
+            raise
+        self._finish(operation, None)
+
+    def _coalesced(self, operation, shared):
+        if shared:
+            UPSTREAM_CALLS.inc(operation=operation, outcome="coalesced")
+
+    def embed(self, text, timeout=None):
+        """Embedding de um texto; chamadas simultâneas com o mesmo texto compartilham a requisição."""
+        def call():
+            with self.guarded(OPERATION_EMBED):
+                request_options = {"timeout": timeout} if timeout else None
+                return self.genai.embed_content(model=self.embedding_model, content=text, request_options=request_options)['embedding']
+        vector, shared = self._flights.do((OPERATION_EMBED, self.embedding_model, text), call)
+        self._coalesced(OPERATION_EMBED, shared)
+        return vector
+
+    def embed_batch(self, texts):
+        """Embeddings de uma lista de textos em uma chamada (função de embedding para embedding_pipeline.embed_texts)."""
+        with self.guarded(OPERATION_EMBED):
+            return self.genai.embed_content(model=self.embedding_model, content=list(texts))['embedding']
+
+    def generate(self, prompt, temperature):
+        """
+        Gera a resposta do modelo para o prompt. Retorna (resposta, compartilhada): com
+        compartilhada=True, a resposta veio de uma chamada idêntica feita por outra requisição.
+        """
+        def call():
+            with self.guarded(OPERATION_GENERATE):
+                return self.model().generate_content(prompt, generation_config=self.generation_config(temperature))
+        response, shared = self._flights.do((OPERATION_GENERATE, self.generative_model, temperature, prompt), call)
+        self._coalesced(OPERATION_GENERATE, shared)
+        return response, shared
+
+    async def embed_async(self, text, timeout=None):
+        async def call():
+            async with self.guarded_async(OPERATION_EMBED):
+                response = await asyncio.wait_for(self.genai.embed_content_async(model=self.embedding_model, content=text), timeout)
+            return response['embedding']
+        vector, shared = await self._async_flights.do((OPERATION_EMBED, self.embedding_model, text), call)
+        self._coalesced(OPERATION_EMBED, shared)
+        return vector
+
+    async def generate_async(self, prompt, temperature, timeout=None):
+        async def call():
+            async with self.guarded_async(OPERATION_GENERATE):
+                return await asyncio.wait_for(
+                    self.model().generate_content_async(prompt, generation_config=self.generation_config(temperature)), timeout)
+        response, shared = await self._async_flights.do((OPERATION_GENERATE, self.generative_model, temperature, prompt), call)
+        self._coalesced(OPERATION_GENERATE, shared)
+        return response, shared
+
+    def status(self):
+        return {
+            "max_inflight": self.admission.max_inflight,
+            "async_max_inflight": self.admission.async_max_inflight,
+            "queue_timeout_s": self.admission.queue_timeout,
+            "circuits": {operation: breaker.status() for operation, breaker in self.breakers.items()},
+        }